@@ -6,8 +6,10 @@
 #   clic en "Analizar video". El resto de interacciones NO reprocesan.
 # - Usa rutas ABSOLUTAS ancladas al root del repo para evitar problemas al
 #   ejecutar desde distintos directorios.
-# - Escribe el video anotado en data/output/annotated_videos/resultado.mp4 y lo
-#   reproduce leyendo en BYTES (st.video con bytes es más robusto que con path).
+# - El análisis corre en segundo plano (core/executor.py): el script sólo
+#   consulta el progreso, se puede cancelar y sobrevive a recargas (?job=...).
+#   Varias sesiones a la vez: cada análisis escribe en su propio directorio
+#   data/output/sessions/<job_id>/ y los que excedan el límite esperan en cola.
 # - Muestra los eventos en una tabla con encabezados en español, sin exponer
 #   rutas internas de evidencia.
 # - Permite seleccionar un evento y ver su evidencia (recorte o frame completo).
@@ -25,8 +27,14 @@ from typing import Tuple, Optional
 import pandas as pd
 import streamlit as st
 
-# Importa el pipeline de tu core
-from core.pipeline import Pipeline
+# Ejecutor de análisis en segundo plano (el pipeline corre fuera de este script)
+from core.executor import AnalysisExecutor, FINISHED
+from core.utils.config import load_config
+from core.utils.telemetry import setup_logging
+from core.utils.evidence_store import read_evidence
+
+# Logging con niveles (basicConfig no hace nada en los reruns de Streamlit)
+setup_logging()
 
 
 # ============================
@@ -45,6 +53,18 @@ def P(*parts: str) -> str:
     return str(ROOT.joinpath(*parts))
 
 
+def _abs_evidence_path(path) -> str:
+    """Normaliza a ruta ABSOLUTA una ruta de evidencia del CSV ('' si no hay)."""
+    if not isinstance(path, str) or not path:
+        return ""
+    return path if os.path.isabs(path) else P(path)
+
+
+# Miniaturas mostradas sobre el selector de eventos
+MAX_THUMBNAILS = 24
+THUMBNAIL_WIDTH = 96
+
+
 # ============================
 #  STATE / HELPERS UI
 # ============================
@@ -60,6 +80,9 @@ def _init_session() -> None:
         "out_video_path": None,          # ruta del video anotado resultante (ABSOLUTA)
         "events_df": pd.DataFrame(),     # dataframe completo (incluye rutas internas)
         "params": {"imgsz": 640, "conf": 0.35},  # parámetros de inferencia usados
+        "job_id": None,                  # análisis en segundo plano de esta sesión
+        "job_state": None,               # estado final del job (done/cancelled/failed)
+        "job_error": None,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -78,6 +101,50 @@ def _save_uploaded_video(uploaded_file) -> Tuple[str, str]:
         return tmp.name, md5
 
 
+def _progress_fraction(upd: dict) -> float:
+    """
+    Fracción [0, 1] de avance a partir de un update de iter_process_video().
+    Si el contenedor no informa el total de frames, se queda en 0.
+    """
+    total = upd.get("total_frames") or 0
+    if total <= 0:
+        return 0.0
+    return min(1.0, upd["frame_idx"] / total)
+
+
+def _progress_text(upd: dict) -> str:
+    """Texto de la barra de progreso: frame actual, FPS de proceso y ETA."""
+    total = upd.get("total_frames") or 0
+    txt = f"Frame {upd['frame_idx']}" + (f"/{total}" if total else "")
+    txt += f"  •  {upd.get('processing_fps', 0.0):.1f} FPS"
+    eta = upd.get("eta_seconds")
+    if eta is not None:
+        txt += f"  •  ETA {int(eta // 60)}:{int(eta % 60):02d}"
+    return txt
+
+
+def _load_job_results(snap: dict) -> None:
+    """Pasa a la sesión el resultado de un job terminado (video, métricas y CSV)."""
+    res = snap.get("result") or {}
+    st.session_state["processed"] = True
+    st.session_state["job_state"] = snap["state"]
+    st.session_state["job_error"] = snap.get("error")
+    st.session_state["out_video_path"] = res.get("out_path_final")
+    # Guarda métricas de duración y FPS de procesamiento para mostrar en la GUI
+    st.session_state["processing_seconds"] = float(res.get("processing_seconds") or 0.0)
+    st.session_state["processing_fps"] = float(res.get("processing_fps") or 0.0)
+
+    # CSV (encabezados en español) del directorio del job
+    csv_path = res.get("csv_path") or os.path.join(snap["output_dir"], "events.csv")
+    if os.path.exists(csv_path):
+        df = pd.read_csv(csv_path)
+        # Limpia posibles columnas índice
+        df = df.loc[:, ~df.columns.str.contains(r"^Unnamed", case=False)]
+    else:
+        df = pd.DataFrame()
+    st.session_state["events_df"] = df
+
+
 def _build_df_view_es(df: pd.DataFrame) -> pd.DataFrame:
     """
     Crea un DataFrame "visible" en español, SIN rutas internas.
@@ -113,6 +180,7 @@ def _build_df_view_es(df: pd.DataFrame) -> pd.DataFrame:
         "tipo_infraccion": "Tipo de infracción",
         "tiempo_seg": "Tiempo (seg)",
         "id_objeto": "ID objeto",
+        "placa": "Placa",
     }
     df.rename(columns=rename_map, inplace=True)
 
@@ -122,6 +190,7 @@ def _build_df_view_es(df: pd.DataFrame) -> pd.DataFrame:
         "Tipo de infracción",
         "Tiempo (seg)",
         "ID objeto",
+        "Placa",
         "x1",
         "y1",
         "x2",
@@ -130,6 +199,15 @@ def _build_df_view_es(df: pd.DataFrame) -> pd.DataFrame:
     return df[[c for c in cols_visibles if c in df.columns]]
 
 
+@st.cache_resource
+def _get_executor(sessions_dir: str, max_concurrent: int, keep_finished: int) -> AnalysisExecutor:
+    """
+    Ejecutor ÚNICO por proceso de Streamlit, compartido por todas las
+    sesiones: así el límite de análisis simultáneos es global.
+    """
+    return AnalysisExecutor(sessions_dir, max_concurrent=max_concurrent, keep_finished=keep_finished)
+
+
 # ============================
 #  APP
 # ============================
@@ -168,6 +246,12 @@ run_clicked = st.button("Analizar video", type="primary", width='stretch')
 
 # Config de escena (usa ruta ABSOLUTA)
 scene_cfg = P("app", "config", "scenes", "demo_intersection.yaml")
+gui_cfg = load_config(scene_cfg).get("gui") or {}
+executor = _get_executor(
+    P(gui_cfg.get("sessions_dir", "data/output/sessions")),
+    gui_cfg.get("max_concurrent_jobs", 1),
+    gui_cfg.get("keep_finished_jobs", 20),
+)
 
 # ============================
 #  LÓGICA DE EJECUCIÓN
@@ -186,37 +270,56 @@ if run_clicked:
         st.session_state["params"]["imgsz"] = imgsz
         st.session_state["params"]["conf"] = conf
 
-        # 3) Preparar salida (limpieza se delega al pipeline con clean_previous=True)
-        out_dir = P("data", "output", "annotated_videos")
-        os.makedirs(out_dir, exist_ok=True)
-        out_path = os.path.join(out_dir, "resultado.mp4")
-
-        # 4) Ejecutar pipeline
-        pipe = Pipeline(scene_cfg, yolo_imgsz=imgsz, yolo_conf=conf)
-        with st.spinner("Procesando video..."):
-            # Ajuste de nombres de parámetros según tu definición real
-            
-            res = pipe.process_video(in_path, out_path, clean_previous=True)
-            st.session_state["processed"]    = True
-            st.session_state["out_video_path"] = res.get("out_path_final", out_path)
-            # Guarda métricas de duración y FPS de procesamiento para mostrar en la GUI
-            st.session_state["processing_seconds"] = float(res.get("processing_seconds") or 0.0)
-            st.session_state["processing_fps"] = float(res.get("processing_fps") or 0.0)
-
-
-        # 5) Guardar resultados en sesión
-        st.session_state["processed"] = True
-        st.session_state["out_video_path"] = out_path
-
-        # 6) Cargar CSV (encabezados en español) desde ruta ABSOLUTA
-        csv_path = P("data", "output", "events.csv")
-        if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path)
-            # Limpia posibles columnas índice
-            df = df.loc[:, ~df.columns.str.contains(r"^Unnamed", case=False)]
+        # 3) Encolar el análisis en el ejecutor compartido: no bloquea este
+        #    script y escribe en un directorio propio del job. El job_id queda
+        #    en la sesión y en la URL (?job=...) para recuperarlo al recargar.
+        job_id = executor.submit(scene_cfg, in_path, yolo_imgsz=imgsz, yolo_conf=conf)
+        st.session_state["job_id"] = job_id
+        st.session_state["processed"] = False
+        st.session_state["events_df"] = pd.DataFrame()
+        st.query_params["job"] = job_id
+
+# Recarga del navegador: recupera el job desde la URL
+if st.session_state["job_id"] is None and st.query_params.get("job"):
+    st.session_state["job_id"] = st.query_params["job"]
+
+
+@st.fragment(run_every=gui_cfg.get("poll_seconds", 1.0))
+def _job_panel() -> None:
+    """
+    Sondea el job en curso: cola, barra de progreso, tabla incremental y
+    botón de cancelar. Al terminar carga los resultados y relanza la app.
+    """
+    job_id = st.session_state["job_id"]
+    snap = executor.status(job_id)
+    if snap is None:
+        st.session_state["job_id"] = None
+        st.query_params.pop("job", None)
+        st.info("El análisis ya no está disponible (expiró o se reinició el servidor).")
+        return
+    if snap["state"] in FINISHED:
+        _load_job_results(snap)
+        st.rerun(scope="app")
+
+    if snap["state"] == "queued":
+        st.info(f"Análisis en cola (posición {snap['queue_position']}); "
+                f"se ejecutan hasta {executor.max_concurrent} a la vez.")
+    else:
+        upd = snap["progress"]
+        if upd:
+            st.progress(_progress_fraction(upd), text=_progress_text(upd))
         else:
-            df = pd.DataFrame()
-        st.session_state["events_df"] = df
+            st.progress(0.0, text="Procesando video...")
+        if snap["events"]:
+            st.dataframe(_build_df_view_es(pd.DataFrame(snap["events"])), width='stretch')
+    if snap["cancel_requested"]:
+        st.caption("Cancelando…")
+    elif st.button("Cancelar análisis", key=f"cancel_{job_id}"):
+        executor.cancel(job_id)
+
+
+if st.session_state["job_id"] and not st.session_state["processed"]:
+    _job_panel()
 
 # ============================
 #  RENDER (NO PROCESA)
@@ -229,7 +332,10 @@ if st.session_state["processed"]:
     out_path = st.session_state["out_video_path"]
     if out_path and os.path.exists(out_path) and os.path.getsize(out_path) > 0:
 
-        st.success("¡Análisis completado! Reproduciendo salida…")
+        if st.session_state["job_state"] == "cancelled":
+            st.warning("Análisis cancelado: se muestran los resultados parciales.")
+        else:
+            st.success("¡Análisis completado! Reproduciendo salida…")
         # Muestra duración y FPS aproximado de procesamiento (medido en el pipeline)
         secs = float(st.session_state.get("processing_seconds") or 0.0)
         pfps = float(st.session_state.get("processing_fps") or 0.0)
@@ -240,6 +346,8 @@ if st.session_state["processed"]:
             st.video(out_path)
         except Exception as e:
             st.info("No se encontró el video anotado.")
+    elif st.session_state["job_state"] == "failed":
+        st.error(f"El análisis falló: {st.session_state['job_error']}")
     else:
         st.info("No se encontró el video anotado. Vuelve a ejecutar el análisis.")
 
@@ -260,6 +368,15 @@ if st.session_state["processed"]:
             "overspeed": "Exceso de velocidad",
         }
 
+        # Miniaturas (ligeras) de los primeros eventos para ubicar rápido cada uno
+        thumbs = []
+        for idx, row in df.head(MAX_THUMBNAILS).iterrows():
+            data = read_evidence(_abs_evidence_path(row.get("ruta_miniatura", "")))
+            if data:
+                thumbs.append((idx, data))
+        if thumbs:
+            st.image([d for _, d in thumbs], caption=[str(i) for i, _ in thumbs], width=THUMBNAIL_WIDTH)
+
         # Lista legible (índice estable)
         opciones = []
         for idx, row in df.iterrows():
@@ -274,23 +391,23 @@ if st.session_state["processed"]:
 
         row = None if df.empty else df.iloc[selected_idx]
         if row is not None:
-            ruta_recorte = row.get("ruta_recorte", "")
-            ruta_imagen = row.get("ruta_imagen", "")
-
-            # Normaliza a rutas ABSOLUTAS si vinieran relativas
-            if isinstance(ruta_recorte, str) and ruta_recorte and not os.path.isabs(ruta_recorte):
-                ruta_recorte = P(ruta_recorte)
-            if isinstance(ruta_imagen, str) and ruta_imagen and not os.path.isabs(ruta_imagen):
-                ruta_imagen = P(ruta_imagen)
+            # Bytes del recorte / frame (archivo suelto o dentro de evidence.pack)
+            recorte = read_evidence(_abs_evidence_path(row.get("ruta_recorte", "")))
+            imagen = read_evidence(_abs_evidence_path(row.get("ruta_imagen", "")))
 
             # Muestra recorte si existe; si no, el frame completo
-            if isinstance(ruta_recorte, str) and ruta_recorte and os.path.exists(ruta_recorte):
-                st.image(ruta_recorte, caption="Recorte (evidencia)", width='stretch')
-            elif isinstance(ruta_imagen, str) and ruta_imagen and os.path.exists(ruta_imagen):
-                st.image(ruta_imagen, caption="Frame completo (evidencia)", width='stretch')
+            if recorte:
+                st.image(recorte, caption="Recorte (evidencia)", width='stretch')
+            elif imagen:
+                st.image(imagen, caption="Frame completo (evidencia)", width='stretch')
             else:
                 st.info("No se encontró la imagen de evidencia en disco.")
 
+            # Clip de video alrededor del evento (si se habilitó `clips:` en la escena)
+            ruta_clip = _abs_evidence_path(row.get("ruta_clip", ""))
+            if ruta_clip and os.path.exists(ruta_clip) and os.path.getsize(ruta_clip) > 0:
+                st.video(ruta_clip)
+
     # Descargar CSV (mantenemos el contenido original; si quieres renombrar encabezados
     # también en el CSV descargado, cambia a df_view y asegúrate de conservar tipos/formatos).
     if not df_view.empty:
@@ -301,5 +418,5 @@ if st.session_state["processed"]:
             mime="text/csv",
             width='stretch',
         )
-else:
+elif not st.session_state["job_id"]:
     st.info("Sube un video y presiona **Analizar video** para iniciar el procesamiento.")
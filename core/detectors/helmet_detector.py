@@ -5,10 +5,13 @@ Uso esperado:
 - Selecciona GPU automáticamente si está disponible.
 """
 
+import logging
 from ultralytics import YOLO
 import os
 import torch
 
+log = logging.getLogger(__name__)
+
 
 class HelmetDetector:
     def __init__(self, model_path="models/helmet/helmet_yolo.pt", imgsz=768, conf=0.30, device=None):
@@ -32,9 +35,9 @@ class HelmetDetector:
                 name = torch.cuda.get_device_name(0)
             except Exception:
                 name = 'CUDA'
-            print(f"[HelmetDetector] Usando GPU: {name}")
+            log.info(f"Usando GPU: {name}")
         else:
-            print("[HelmetDetector] Usando CPU para inferencia")
+            log.info("Usando CPU para inferencia")
 
     def infer(self, frame):
         """Devuelve detecciones {bbox, conf, label='helmet'} filtrando por clase 'helmet'."""
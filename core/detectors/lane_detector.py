@@ -1,9 +1,23 @@
 import cv2
 import numpy as np
 
+from core.utils.buffer_pool import BufferPool
+
+
+def _roi_mask(shape):
+    # ROI: parte baja de la imagen
+    h, w = shape
+    mask = np.zeros((h, w), dtype=np.uint8)
+    roi = np.array([[(0,h*0.6), (w,h*0.6), (w,h), (0,h)]], dtype=np.int32)
+    cv2.fillPoly(mask, roi, 255)
+    return mask
+
+
 class SimpleLaneDetector:
-    def __init__(self):
-        pass
+    def __init__(self, pool=None):
+        # Intermedios (gris, blur, bordes) reutilizados entre frames y
+        # máscara ROI calculada una vez por resolución
+        self.pool = pool or BufferPool()
 
     def infer(self, frame):
         """
@@ -14,24 +28,21 @@ class SimpleLaneDetector:
         }
         """
         h, w = frame.shape[:2]
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (5,5), 0)
-        edges = cv2.Canny(blur, 50, 150)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.pool.get("lane_gray", (h, w)))
+        blur = cv2.GaussianBlur(gray, (5,5), 0, dst=self.pool.get("lane_blur", (h, w)))
+        edges = cv2.Canny(blur, 50, 150, edges=self.pool.get("lane_edges", (h, w)))
 
-        # ROI: parte baja de la imagen
-        mask = np.zeros_like(edges)
-        roi = np.array([[(0,h*0.6), (w,h*0.6), (w,h), (0,h)]], dtype=np.int32)
-        cv2.fillPoly(mask, roi, 255)
-        masked = cv2.bitwise_and(edges, mask)
+        mask = self.pool.static("lane_roi", (h, w), _roi_mask)
+        masked = cv2.bitwise_and(edges, mask, dst=edges)
 
         lines = cv2.HoughLinesP(masked, 1, np.pi/180, threshold=120, minLineLength=80, maxLineGap=50)
         out_lines = []
         if lines is not None:
-            for l in lines:
-                x1,y1,x2,y2 = l[0]
+            # (N,1,4) o (N,4) según la versión de OpenCV
+            for x1,y1,x2,y2 in lines.reshape(-1, 4).tolist():
                 out_lines.append(([x1,y1],[x2,y2]))
 
         # Línea central naive (vertical en el centro)
         center_line = ([w//2, int(h*0.3)], [w//2, h-10])
 
-        return {"lines": out_lines, "center_line": center_line}
\ No newline at end of file
+        return {"lines": out_lines, "center_line": center_line}
@@ -0,0 +1,87 @@
+"""Reconocedores de placas (OCR) para recortes de vehículos.
+
+Backends opcionales (sólo se importan si se usan):
+- EasyOCR   (`pip install easyocr`)
+- PaddleOCR (`pip install paddleocr`; API 2.x `ocr()` o 3.x `predict()`)
+
+Interfaz común: recognize(crop_bgr) -> (texto, confianza). El texto se
+normaliza a mayúsculas y alfanuméricos; ("", 0.0) si no se lee nada.
+Cualquier objeto con ese método sirve (p.ej. un stub en pruebas).
+"""
+
+import logging
+import re
+
+import cv2
+
+log = logging.getLogger(__name__)
+
+PLATE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+def normalize_plate(text):
+    return re.sub(r"[^A-Z0-9]", "", str(text).upper())
+
+
+def _join_fragments(frags):
+    """[(x, texto, conf)] -> (texto concatenado de izquierda a derecha, confianza media)."""
+    frags = [(x, normalize_plate(t), c) for x, t, c in frags if normalize_plate(t)]
+    if not frags:
+        return "", 0.0
+    frags.sort(key=lambda f: f[0])
+    return "".join(t for _, t, _ in frags), sum(c for _, _, c in frags) / len(frags)
+
+
+class EasyOCRPlateRecognizer:
+    def __init__(self, languages=("en",), gpu=None):
+        import easyocr  # dependencia opcional
+        if gpu is None:
+            import torch
+            gpu = torch.cuda.is_available()
+        self.reader = easyocr.Reader(list(languages), gpu=gpu, verbose=False)
+
+    def recognize(self, crop):
+        res = self.reader.readtext(crop, allowlist=PLATE_CHARS, detail=1)
+        return _join_fragments([(min(p[0] for p in box), text, float(conf)) for box, text, conf in res])
+
+
+class PaddleOCRPlateRecognizer:
+    def __init__(self, lang="en"):
+        from paddleocr import PaddleOCR  # dependencia opcional
+        self.ocr = PaddleOCR(lang=lang)
+
+    def recognize(self, crop):
+        if hasattr(self.ocr, "predict"):
+            # PaddleOCR 3.x: resultados con rec_texts / rec_scores / rec_polys
+            frags = []
+            for r in self.ocr.predict(crop):
+                for poly, text, conf in zip(r["rec_polys"], r["rec_texts"], r["rec_scores"]):
+                    frags.append((float(min(p[0] for p in poly)), text, float(conf)))
+            return _join_fragments(frags)
+        # PaddleOCR 2.x: [[ [box, (texto, conf)], ... ]]
+        res = self.ocr.ocr(crop, cls=False) or []
+        lines = (res[0] or []) if res else []
+        return _join_fragments([(min(p[0] for p in box), text, float(conf)) for box, (text, conf) in lines])
+
+
+def make_plate_recognizer(pcfg):
+    """Reconocedor según la sección `plates:` del YAML; None si está deshabilitado o no disponible."""
+    pcfg = pcfg or {}
+    if not pcfg.get("enabled"):
+        return None
+    backend = pcfg.get("backend", "easyocr")
+    try:
+        if backend == "paddleocr":
+            return PaddleOCRPlateRecognizer(lang=pcfg.get("lang", "en"))
+        return EasyOCRPlateRecognizer(languages=pcfg.get("languages", ["en"]))
+    except ImportError:
+        log.warning(f"Backend OCR '{backend}' no instalado; lectura de placas desactivada")
+    except Exception as e:
+        log.error(f"No se pudo iniciar el OCR '{backend}': {e}")
+    return None
+
+
+def sharpness(img):
+    """Nitidez (varianza del Laplaciano en gris): mayor = más enfocado."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
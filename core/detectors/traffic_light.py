@@ -0,0 +1,53 @@
+"""Estado del semáforo a partir de las cajas 'traffic light' del detector base.
+
+No usa un modelo adicional: recorta cada semáforo detectado y cuenta píxeles
+saturados y brillantes en los rangos HSV de rojo, amarillo y verde. El color
+dominante del semáforo más grande es el estado de la escena.
+"""
+
+import cv2
+import numpy as np
+
+# Rangos HSV (OpenCV: H en [0, 180]). El rojo cruza el 0.
+_RANGES = {
+    "red": [((0, 100, 120), (10, 255, 255)), ((160, 100, 120), (180, 255, 255))],
+    "yellow": [((15, 100, 120), (35, 255, 255))],
+    "green": [((40, 80, 120), (95, 255, 255))],
+}
+
+
+class TrafficLightClassifier:
+    def __init__(self, min_ratio=0.04):
+        # Fracción mínima de píxeles del color para considerarlo encendido
+        self.min_ratio = min_ratio
+
+    def _classify_crop(self, crop):
+        hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+        total = max(1, crop.shape[0] * crop.shape[1])
+        best, best_ratio = "unknown", self.min_ratio
+        for color, ranges in _RANGES.items():
+            count = sum(int(cv2.countNonZero(cv2.inRange(hsv, lo, hi))) for lo, hi in ranges)
+            if count / total >= best_ratio:
+                best, best_ratio = color, count / total
+        return best
+
+    def infer(self, frame, detections):
+        """
+        Devuelve {"state": "red"|"yellow"|"green"|"unknown", "boxes": [...]}
+        usando las detecciones 'traffic light' del frame.
+        """
+        lights = [d for d in detections if d["label"] == "traffic light"]
+        if not lights or frame is None:
+            return {"state": "unknown", "boxes": []}
+        h, w = frame.shape[:2]
+        lights.sort(key=lambda d: (d["bbox"][2] - d["bbox"][0]) * (d["bbox"][3] - d["bbox"][1]), reverse=True)
+        for d in lights:
+            x1, y1, x2, y2 = map(int, d["bbox"])
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(w, x2), min(h, y2)
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            state = self._classify_crop(frame[y1:y2, x1:x2])
+            if state != "unknown":
+                return {"state": state, "boxes": [d["bbox"] for d in lights]}
+        return {"state": "unknown", "boxes": [d["bbox"] for d in lights]}
@@ -1,6 +1,9 @@
+import logging
 from ultralytics import YOLO
 import torch
 
+log = logging.getLogger(__name__)
+
 CLASS_NAMES = {
     0: 'person', 2: 'car', 3: 'motorbike', 5: 'bus', 7: 'truck', 9: 'traffic light'
 }
@@ -27,17 +30,32 @@ class YoloDetector:
                 dev_name = torch.cuda.get_device_name(0)
             except Exception:
                 dev_name = 'CUDA'
-            print(f"[YoloDetector] Usando GPU: {dev_name}")
+            log.info(f"Usando GPU: {dev_name}")
         else:
-            print("[YoloDetector] Usando CPU para inferencia")
+            log.info("Usando CPU para inferencia")
 
-    def infer(self, frame):
+    def infer(self, frame, imgsz=None, conf=None):
         """Ejecuta inferencia y devuelve lista de dicts {bbox, conf, label}."""
+        return self.infer_batch([frame], imgsz=imgsz, conf=conf)[0]
+
+    def infer_batch(self, frames, imgsz=None, conf=None):
+        """
+        Inferencia en lote: una sola llamada al modelo para varios frames (p.ej.
+        uno por cámara). Devuelve una lista de detecciones por frame, en orden.
+        imgsz/conf por llamada (None = los del constructor): un detector
+        compartido entre pipelines no guarda los ajustes de ninguno.
+        """
+        if not frames:
+            return []
         # Pasa el dispositivo explícitamente a Ultralytics (0 para CUDA, 'cpu' para CPU)
         dev_arg = 0 if str(self.device).startswith('cuda') else 'cpu'
-        res = self.model.predict(
-            frame, imgsz=self.imgsz, conf=self.conf, device=dev_arg, stream=False, verbose=False
-        )[0]
+        results = self.model.predict(
+            list(frames), imgsz=imgsz or self.imgsz, conf=conf or self.conf, device=dev_arg, stream=False, verbose=False
+        )
+        return [self._parse(res) for res in results]
+
+    @staticmethod
+    def _parse(res):
         dets = []
         if res.boxes is None: return dets
         for b, c, cls in zip(res.boxes.xyxy.cpu().numpy(),
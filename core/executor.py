@@ -0,0 +1,154 @@
+# -----------------------------------------------------------------------------
+# Ejecutor local de análisis en segundo plano (lo usa la GUI de Streamlit).
+#
+# - submit() encola un análisis y devuelve un job_id al instante; el análisis
+#   corre en un hilo del pool, fuera del hilo del script de Streamlit.
+# - Como mucho `max_concurrent` análisis a la vez; el resto queda "queued".
+# - Cada job escribe en su propio directorio (<base_dir>/<job_id>/), así que
+#   varias sesiones no se pisan el video anotado ni el events.csv.
+# - status(job_id) es una foto del estado (progreso, eventos nuevos, resultado)
+#   que la GUI consulta periódicamente; sobrevive a recargas del navegador
+#   mientras el job_id siga en session_state (o en la URL).
+# - cancel(job_id) usa la cancelación cooperativa de iter_process_video().
+# -----------------------------------------------------------------------------
+
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# Estados de un job
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = "queued", "running", "done", "cancelled", "failed"
+FINISHED = (DONE, CANCELLED, FAILED)
+
+
+class AnalysisExecutor:
+    def __init__(self, base_dir, max_concurrent=1, keep_finished=20, pipeline_factory=None):
+        """
+        base_dir: raíz de los directorios de salida por job.
+        keep_finished: jobs terminados que se conservan (los más antiguos se
+        olvidan y se borra su directorio).
+        pipeline_factory(scene, output_dir, **params) -> Pipeline; por defecto
+        core.pipeline.Pipeline (import diferido: crear el ejecutor no carga modelos).
+        """
+        self.base_dir = base_dir
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.keep_finished = int(keep_finished)
+        self.pipeline_factory = pipeline_factory
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, scene, in_path, yolo_imgsz=None, yolo_conf=None):
+        """Encola el análisis de `in_path` con la escena `scene`; devuelve el job_id."""
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "state": QUEUED,
+            "scene": scene,
+            "in_path": in_path,
+            "params": {"yolo_imgsz": yolo_imgsz, "yolo_conf": yolo_conf},
+            "output_dir": os.path.join(self.base_dir, job_id),
+            "submitted_at": time.time(),
+            "progress": None,      # último update "progress" de iter_process_video
+            "events": [],          # eventos acumulados (filas del CSV como dicts)
+            "result": None,        # update "done" (sin el DataFrame)
+            "error": None,
+            "cancel_event": threading.Event(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        self._pool.submit(self._run, job)
+        log.info(f"Job {job_id} encolado ({self.active_count()} activos/en cola)")
+        return job_id
+
+    def _make_pipeline(self, job):
+        if self.pipeline_factory is not None:
+            return self.pipeline_factory(job["scene"], job["output_dir"], **job["params"])
+        from core.pipeline import Pipeline
+        return Pipeline(job["scene"], output_dir=job["output_dir"], **job["params"])
+
+    def _run(self, job):
+        if job["cancel_event"].is_set():
+            self._finish(job, CANCELLED)
+            return
+        with self._lock:
+            job["state"] = RUNNING
+            job["started_at"] = time.time()
+        try:
+            os.makedirs(job["output_dir"], exist_ok=True)
+            pipe = self._make_pipeline(job)
+            out_path = os.path.join(job["output_dir"], "resultado.mp4")
+            for upd in pipe.iter_process_video(job["in_path"], out_path, clean_previous=True,
+                                               cancel_event=job["cancel_event"]):
+                with self._lock:
+                    if upd["type"] == "done":
+                        job["result"] = {k: v for k, v in upd.items() if k != "events_df"}
+                        job["result"]["csv_path"] = os.path.join(job["output_dir"], "events.csv")
+                    else:
+                        job["progress"] = {k: v for k, v in upd.items() if k != "new_events"}
+                        job["events"].extend(upd["new_events"])
+            self._finish(job, CANCELLED if job["cancel_event"].is_set() else DONE)
+        except Exception as e:
+            log.error(f"Job {job['id']} falló: {e}")
+            job["error"] = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job, state):
+        with self._lock:
+            job["state"] = state
+            job["finished_at"] = time.time()
+            self._forget_old()
+        log.info(f"Job {job['id']}: {state}")
+
+    def _forget_old(self):
+        # Con el lock tomado: descarta los jobs terminados más antiguos
+        finished = sorted((j for j in self._jobs.values() if j["state"] in FINISHED),
+                          key=lambda j: j["finished_at"])
+        for j in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[j["id"]]
+            shutil.rmtree(j["output_dir"], ignore_errors=True)
+
+    def status(self, job_id):
+        """
+        Foto del job: {"id", "state", "queue_position", "progress", "events",
+        "result", "error", "output_dir"}; None si el job no existe (o se olvidó).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snap = {k: v for k, v in job.items() if k != "cancel_event"}
+            snap["events"] = list(job["events"])
+            snap["cancel_requested"] = job["cancel_event"].is_set()
+            snap["queue_position"] = None
+            if job["state"] == QUEUED:
+                queued = sorted((j for j in self._jobs.values() if j["state"] == QUEUED),
+                                key=lambda j: j["submitted_at"])
+                snap["queue_position"] = [j["id"] for j in queued].index(job_id) + 1
+            return snap
+
+    def cancel(self, job_id):
+        """Pide cancelar el job (en cola: no llega a empezar; en curso: se detiene en el siguiente frame)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["state"] in FINISHED:
+                return False
+            job["cancel_event"].set()
+            return True
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j["state"] in (QUEUED, RUNNING))
+
+    def shutdown(self, cancel_running=True):
+        if cancel_running:
+            with self._lock:
+                for j in self._jobs.values():
+                    j["cancel_event"].set()
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,163 @@
+# -----------------------------------------------------------------------------
+# Cola de trabajos duradera en SQLite para repartir videos entre varias
+# máquinas (o procesos) worker. La base puede vivir en un sistema de archivos
+# compartido: todas las transiciones son transacciones cortas con
+# BEGIN IMMEDIATE y no se usa WAL (no funciona sobre NFS/SMB).
+#
+# Ciclo de un trabajo:
+#   queued --lease()--> leased --complete()--> done
+#                         |  \--fail()-------> queued (reintento con espera) | failed
+#                         \--lease vencido (worker caído)--> lo toma otro worker
+#
+# Un lease dura `lease_seconds`; el worker lo renueva con heartbeat(). Si el
+# worker muere, el lease vence y el trabajo vuelve a repartirse (cuenta como
+# intento). Tras `max_attempts` intentos el trabajo queda en failed.
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import sqlite3
+import time
+
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    video         TEXT NOT NULL,
+    scene         TEXT NOT NULL,
+    output_dir    TEXT,
+    status        TEXT NOT NULL DEFAULT 'queued',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL DEFAULT 3,
+    available_at  REAL NOT NULL,
+    worker        TEXT,
+    lease_expires REAL,
+    heartbeat_at  REAL,
+    created_at    REAL NOT NULL,
+    started_at    REAL,
+    finished_at   REAL,
+    error         TEXT,
+    result        TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, available_at);
+"""
+
+
+class JobQueue:
+    def __init__(self, db_path, timeout=30.0):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # isolation_level=None: transacciones explícitas (BEGIN IMMEDIATE)
+        self._db = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def _tx(self):
+        # Toma el lock de escritura al empezar: dos workers no pueden leer el
+        # mismo trabajo libre y arrendarlo a la vez
+        self._db.execute("BEGIN IMMEDIATE")
+        return self._db
+
+    def enqueue(self, video, scene, output_dir=None, max_attempts=3):
+        """Añade un video a la cola; devuelve el id del trabajo."""
+        now = time.time()
+        cur = self._db.execute(
+            "INSERT INTO jobs (video, scene, output_dir, max_attempts, available_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(video), os.path.abspath(scene), output_dir, int(max_attempts), now, now))
+        return cur.lastrowid
+
+    def lease(self, worker, lease_seconds=120.0):
+        """
+        Arrienda el siguiente trabajo disponible (en cola, o con lease vencido)
+        y devuelve su fila como dict; None si no hay ninguno.
+        """
+        now = time.time()
+        db = self._tx()
+        try:
+            # Leases vencidos sin más intentos: fallan definitivamente
+            db.execute("UPDATE jobs SET status=?, finished_at=?, error='lease vencido (worker sin heartbeat)' "
+                       "WHERE status=? AND lease_expires < ? AND attempts >= max_attempts",
+                       (FAILED, now, LEASED, now))
+            row = db.execute(
+                "SELECT * FROM jobs WHERE (status=? AND available_at <= ?) OR (status=? AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1", (QUEUED, now, LEASED, now)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute("UPDATE jobs SET status=?, worker=?, attempts=attempts+1, lease_expires=?, "
+                       "heartbeat_at=?, started_at=? WHERE id=?",
+                       (LEASED, worker, now + lease_seconds, now, now, row["id"]))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        job = dict(row)
+        job.update(status=LEASED, worker=worker, attempts=row["attempts"] + 1)
+        return job
+
+    def heartbeat(self, job_id, worker, lease_seconds=120.0):
+        """Renueva el lease. False si el trabajo ya no es de este worker (lease perdido)."""
+        now = time.time()
+        cur = self._db.execute("UPDATE jobs SET lease_expires=?, heartbeat_at=? "
+                               "WHERE id=? AND worker=? AND status=?",
+                               (now + lease_seconds, now, job_id, worker, LEASED))
+        return cur.rowcount == 1
+
+    def complete(self, job_id, worker, result=None):
+        cur = self._db.execute("UPDATE jobs SET status=?, finished_at=?, result=?, error=NULL "
+                               "WHERE id=? AND worker=? AND status=?",
+                               (DONE, time.time(), json.dumps(result or {}), job_id, worker, LEASED))
+        return cur.rowcount == 1
+
+    def fail(self, job_id, worker, error, retry_delay=30.0):
+        """Error en el trabajo: vuelve a la cola tras `retry_delay` s o queda failed sin más intentos."""
+        now = time.time()
+        db = self._tx()
+        try:
+            row = db.execute("SELECT attempts, max_attempts FROM jobs WHERE id=? AND worker=? AND status=?",
+                             (job_id, worker, LEASED)).fetchone()
+            if row is not None:
+                if row["attempts"] < row["max_attempts"]:
+                    db.execute("UPDATE jobs SET status=?, available_at=?, worker=NULL, lease_expires=NULL, "
+                               "error=? WHERE id=?", (QUEUED, now + retry_delay, str(error), job_id))
+                else:
+                    db.execute("UPDATE jobs SET status=?, finished_at=?, error=? WHERE id=?",
+                               (FAILED, now, str(error), job_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def retry_failed(self):
+        """Devuelve a la cola los trabajos failed (con intentos reiniciados)."""
+        return self._db.execute("UPDATE jobs SET status=?, attempts=0, available_at=?, worker=NULL "
+                                "WHERE status=?", (QUEUED, time.time(), FAILED)).rowcount
+
+    def next_available_at(self):
+        """
+        Instante (time.time()) en que podría haber trabajo que arrendar: el
+        menor available_at en cola o lease_expires arrendado. None si no queda
+        ningún trabajo pendiente (todos done/failed).
+        """
+        row = self._db.execute(
+            "SELECT MIN(CASE WHEN status=? THEN available_at ELSE lease_expires END) AS t "
+            "FROM jobs WHERE status IN (?, ?)", (QUEUED, QUEUED, LEASED)).fetchone()
+        return row["t"]
+
+    def counts(self):
+        """{estado: número de trabajos}."""
+        rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def jobs(self, status=None, limit=100):
+        """Filas más recientes (opcionalmente de un estado) como dicts."""
+        if status:
+            rows = self._db.execute("SELECT * FROM jobs WHERE status=? ORDER BY id DESC LIMIT ?", (status, limit))
+        else:
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        return [dict(r) for r in rows.fetchall()]
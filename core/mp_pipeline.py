@@ -0,0 +1,209 @@
+# -----------------------------------------------------------------------------
+# Pipeline multi-proceso con traspaso de frames sin copia (memoria compartida).
+#
+#   proceso principal  -> decodifica cada frame DIRECTAMENTE en un slot del
+#                         SharedFrameRing (cap.read(image=vista_del_slot))
+#   proceso detector   -> YOLO sobre el slot; envía sólo las detecciones
+#   proceso reglas     -> tracker + reglas + overlays (Pipeline.process_frame
+#                         con base_dets) dibujando sobre el mismo slot
+#   proceso escritor   -> VideoWriter del frame anotado (reescalado aquí si
+#                         `output.scale` < 1; frames omitidos según frame_step)
+#
+# Por las colas sólo viajan (slot, frame_idx, ts, detecciones). Cada slot se
+# adquiere con 3 referencias (detector, reglas, escritor) y vuelve a la cola
+# de libres cuando la última etapa lo suelta. Con `slots` se acota la memoria
+# y el desfase máximo entre etapas.
+#
+# No soporta checkpoints ni clips: usar Pipeline.process_video para eso.
+# -----------------------------------------------------------------------------
+
+import multiprocessing
+import os
+import queue
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from core.utils.shm_ring import SharedFrameRing
+from core.utils.telemetry import Telemetry, start_from_config as start_telemetry
+from core.utils.video_io import open_video_reader, open_video_writer, release_safely, frame_timestamp, reader_options, scaled_size
+
+_CONSUMERS = 3  # detector, reglas, escritor
+
+
+def _scene_cfg(scene, yolo_imgsz, yolo_conf):
+    from core.pipeline import _load_config
+    cfg = _load_config(scene)
+    if yolo_imgsz: cfg["yolo"]["imgsz"] = yolo_imgsz
+    if yolo_conf:  cfg["yolo"]["conf"]  = yolo_conf
+    return cfg
+
+
+def _detector_stage(scene, yolo_imgsz, yolo_conf, ring, in_q, out_q):
+    from core.detectors.yolo_detector import YoloDetector
+    cfg = _scene_cfg(scene, yolo_imgsz, yolo_conf)
+    detector = YoloDetector(model_path=cfg["models"]["yolo_path"],
+                            imgsz=cfg["yolo"]["imgsz"], conf=cfg["yolo"]["conf"])
+    try:
+        while (msg := in_q.get()) is not None:
+            slot, frame_idx, ts = msg
+            dets = detector.infer(ring.view(slot))
+            ring.release(slot)
+            out_q.put((slot, frame_idx, ts, dets))
+    finally:
+        out_q.put(None)
+        ring.close()
+
+
+def _rules_stage(scene, yolo_imgsz, yolo_conf, output_dir, fps, ring, in_q, out_q, result_q):
+    from core.pipeline import Pipeline, load_models, _clean_previous_outputs
+    cfg = _scene_cfg(scene, yolo_imgsz, yolo_conf)
+    # Sólo el modelo de casco vive aquí (entrada bajo demanda de la regla)
+    pipe = Pipeline(scene, yolo_imgsz=yolo_imgsz, yolo_conf=yolo_conf, output_dir=output_dir,
+                    models=load_models(cfg, with_detector=False))
+    # Los overlays se dibujan en sitio sobre el slot a resolución completa;
+    # el escritor reescala si hace falta
+    step, pipe.output_scale = pipe.output_step, 1.0
+    _clean_previous_outputs(pipe.cfg["video"]["output_dir"], pipe.cfg["video"]["evidence_dir"])
+    pipe.logger.close()
+    pipe.logger = pipe._make_logger()
+    frames = 0
+    try:
+        while (msg := in_q.get()) is not None:
+            slot, frame_idx, ts, dets = msg
+            pipe.process_frame(ring.view(slot), frame_idx, ts, fps, base_dets=dets,
+                               render=frame_idx % step == 0)
+            frames += 1
+            out_q.put((slot, frame_idx, ts))
+            ring.release(slot)
+    finally:
+        out_q.put(None)
+        pipe.logger.close()
+        result_q.put(("rules", {"frames": frames, "csv_path": pipe.logger.csv_path}))
+        ring.close()
+
+
+def _writer_stage(out_path, fps, size, step, ring, in_q, result_q):
+    writer, out_path_final = open_video_writer(out_path, fps, size)
+    resized = None
+    frames = 0
+    try:
+        while (msg := in_q.get()) is not None:
+            slot, frame_idx = msg[0], msg[1]
+            if frame_idx % step == 0:
+                frame = ring.view(slot)
+                if (frame.shape[1], frame.shape[0]) != size:
+                    frame = resized = cv2.resize(frame, size, dst=resized, interpolation=cv2.INTER_AREA)
+                writer.write(frame)
+                frames += 1
+            ring.release(slot)
+    finally:
+        release_safely(None, writer)
+        result_q.put(("writer", {"frames": frames, "out_path_final": out_path_final}))
+        ring.close()
+
+
+def _queue_depths(depths):
+    # qsize() no existe en todas las plataformas (macOS): esas colas se omiten
+    out = []
+    for name, depth in depths.items():
+        try:
+            out.append(("queue_depth", "gauge", {"queue": name}, depth()))
+        except NotImplementedError:
+            pass
+    return out
+
+
+def process_video_multiprocess(scene_config_path, in_path, out_path, output_dir=None, slots=8,
+                               yolo_imgsz=None, yolo_conf=None, cancel_event=None):
+    """
+    Igual que Pipeline.process_video() pero repartiendo detección, reglas y
+    escritura en procesos que comparten los frames por memoria compartida.
+    Devuelve {"events_df", "out_path_final", "processing_seconds", "processing_fps"}.
+    """
+    t0 = time.perf_counter()
+    scene_cfg = _scene_cfg(scene_config_path, None, None)
+    cap, w, h, fps = open_video_reader(in_path, **reader_options(scene_cfg))
+    ctx = multiprocessing.get_context("spawn")
+    ring = SharedFrameRing(slots, (h, w, 3), dtype=np.uint8, ctx=ctx)
+    q_det, q_rules, q_write = ctx.Queue(slots), ctx.Queue(slots), ctx.Queue(slots)
+    q_res = ctx.Queue()
+    output_dir = output_dir or scene_cfg["video"]["output_dir"]
+    ocfg = scene_cfg.get("output") or {}
+    step = max(1, int(ocfg.get("frame_step", 1)))
+    out_size = scaled_size((w, h), float(ocfg.get("scale", 1.0)))
+    procs = [
+        ctx.Process(target=_detector_stage, name="detector",
+                    args=(scene_config_path, yolo_imgsz, yolo_conf, ring, q_det, q_rules)),
+        ctx.Process(target=_rules_stage, name="rules",
+                    args=(scene_config_path, yolo_imgsz, yolo_conf, output_dir, fps, ring, q_rules, q_write, q_res)),
+        ctx.Process(target=_writer_stage, name="writer",
+                    args=(out_path, fps / step, out_size, step, ring, q_write, q_res)),
+    ]
+    for p in procs:
+        p.start()
+
+    # Telemetría del proceso principal: decodificación, espera de slot libre
+    # (presión de las etapas siguientes) y profundidad de las colas
+    tcfg = scene_cfg.get("telemetry") or {}
+    tel = Telemetry(f"mp:{os.path.basename(os.path.normpath(output_dir))}",
+                    json_log_seconds=tcfg.get("json_log_seconds", 30))
+    tel.add_collector(lambda: _queue_depths({"detector": q_det.qsize, "rules": q_rules.qsize,
+                                             "writer": q_write.qsize, "free_slots": ring.free_slots}))
+    start_telemetry(tcfg)
+
+    frame_idx = 0
+    results = {}
+    try:
+        while not (cancel_event is not None and cancel_event.is_set()):
+            # Espera un slot libre; si alguna etapa murió, no bloquear para siempre
+            t_wait = time.perf_counter()
+            try:
+                slot = ring.acquire(_CONSUMERS, timeout=1.0)
+            except queue.Empty:
+                if not all(p.is_alive() for p in procs):
+                    raise RuntimeError("Una etapa del pipeline multi-proceso terminó inesperadamente")
+                continue
+            t_decode = time.perf_counter()
+            tel.stage("slot_wait", t_decode - t_wait)
+            dst = ring.view(slot)
+            ok, img = cap.read(dst)
+            if ok and img is not None and not np.shares_memory(img, dst):
+                dst[...] = img  # el backend no pudo decodificar en sitio
+            if not ok:
+                for _ in range(_CONSUMERS):
+                    ring.release(slot)
+                break
+            frame_idx += 1
+            tel.stage("decode", time.perf_counter() - t_decode)
+            tel.frame()
+            tel.maybe_log()
+            q_det.put((slot, frame_idx, frame_timestamp(cap, frame_idx, fps)))
+        q_det.put(None)
+        while len(results) < 2 and any(p.is_alive() for p in procs):
+            try:
+                name, info = q_res.get(timeout=1.0)
+                results[name] = info
+            except queue.Empty:
+                continue
+        for p in procs:
+            p.join()
+    finally:
+        release_safely(cap)
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        ring.close()
+
+    csv_path = results.get("rules", {}).get("csv_path") or os.path.join(output_dir, "events.csv")
+    df = pd.read_csv(csv_path) if os.path.exists(csv_path) else pd.DataFrame()
+    secs = max(1e-9, time.perf_counter() - t0)
+    return {
+        "events_df": df,
+        "out_path_final": results.get("writer", {}).get("out_path_final"),
+        "processing_seconds": secs,
+        "processing_fps": frame_idx / secs,
+        "frames": frame_idx,
+    }
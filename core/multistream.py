@@ -0,0 +1,178 @@
+# -----------------------------------------------------------------------------
+# Varias cámaras en un solo proceso con UN detector compartido.
+#
+# Cada stream tiene su propio Pipeline (YAML de escena, tracker, reglas y
+# logger con directorio de salida propio), pero todos reciben la MISMA
+# instancia de YoloDetector/HelmetDetector (ver load_models()). En cada tick:
+#   1) se lee el frame actual de cada stream activo,
+#   2) se hace UNA inferencia YOLO en lote con todos esos frames,
+#   3) las detecciones se reparten al tracker/reglas de cada stream
+#      (Pipeline.process_frame con base_dets) y se escribe su video anotado.
+# La memoria de modelos no crece al añadir cámaras y el lote aprovecha mejor
+# cada llamada al modelo.
+# -----------------------------------------------------------------------------
+
+import logging
+import os
+import time
+
+from core.pipeline import Pipeline, load_models, _load_config, _clean_previous_outputs
+from core.utils.video_io import open_video_reader, open_video_writer, release_safely, frame_timestamp, reader_options
+from core.utils.telemetry import Telemetry, start_from_config as start_telemetry
+
+log = logging.getLogger(__name__)
+
+
+class MultiStreamRunner:
+    def __init__(self, streams, output_dir="data/output/streams", yolo_imgsz=None, yolo_conf=None):
+        """
+        streams: lista de dicts {"name", "scene", "source"} (opcional "out_path").
+        El detector compartido se carga con la config de la primera escena;
+        imgsz/conf se pasan por stream en cada inferencia (overrides
+        yolo_imgsz / yolo_conf para todos).
+        """
+        if not streams:
+            raise ValueError("MultiStreamRunner requiere al menos un stream")
+        base_cfg = _load_config(streams[0]["scene"])
+        if yolo_imgsz: base_cfg["yolo"]["imgsz"] = yolo_imgsz
+        if yolo_conf:  base_cfg["yolo"]["conf"]  = yolo_conf
+        self.models = load_models(base_cfg)
+        self.detector = self.models["detector"]
+        # Inferencia en lote compartida; cada Pipeline mide sus propias etapas
+        self.telemetry = Telemetry("multistream", json_log_seconds=0)
+        self._telemetry_cfg = base_cfg.get("telemetry")
+
+        self.streams = []
+        for i, spec in enumerate(streams):
+            name = spec.get("name") or f"cam{i}"
+            out_dir = os.path.join(output_dir, name)
+            self.streams.append({
+                "name": name,
+                "source": spec["source"],
+                "out_path": spec.get("out_path") or os.path.join(out_dir, "annotated.mp4"),
+                "pipe": Pipeline(spec["scene"], yolo_imgsz=yolo_imgsz, yolo_conf=yolo_conf,
+                                 output_dir=out_dir, models=self.models),
+            })
+        log.info(f"{len(self.streams)} streams con detector compartido")
+
+    def run(self, cancel_event=None, clean_previous=True):
+        """Versión bloqueante de iter_run(); devuelve el resumen final."""
+        result = {}
+        for update in self.iter_run(cancel_event=cancel_event, clean_previous=clean_previous):
+            if update["type"] == "done":
+                result = update
+        return result
+
+    def iter_run(self, cancel_event=None, progress_every=50, clean_previous=True):
+        """
+        Generador: produce {"type": "progress", "tick", "active", "processing_fps",
+        "new_events": {stream: [...]}} y un {"type": "done", "streams": {...}} final.
+        """
+        t0 = time.perf_counter()
+        start_telemetry(self._telemetry_cfg)
+        opened = []
+        try:
+            for s in self.streams:
+                pipe = s["pipe"]
+                if clean_previous:
+                    _clean_previous_outputs(pipe.cfg["video"]["output_dir"], pipe.cfg["video"]["evidence_dir"])
+                    pipe.logger.close()
+                    pipe.logger = pipe._make_logger()
+                pipe.logger.drain_new_events()
+                cap, w, h, fps = open_video_reader(s["source"], **reader_options(pipe.cfg))
+                pipe.scene.rasterize((w, h))
+                pipe.start_scene_watch()
+                s.update(cap=cap, writer=None, fps=fps, w=w, h=h, frame_idx=0, done=False)
+                opened.append(s)
+                os.makedirs(os.path.dirname(s["out_path"]) or ".", exist_ok=True)
+                s["writer"], s["out_path_final"] = open_video_writer(s["out_path"], *pipe.output_geometry(fps, (w, h)))
+
+            tick, frames_total, cancelled = 0, 0, False
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+                # 1) Frame actual de cada stream activo
+                batch = []
+                for s in opened:
+                    if s["done"]:
+                        continue
+                    ok, frame = s["cap"].read(s["pipe"].buffers.get("decode", (s["h"], s["w"], 3)))
+                    if not ok:
+                        s["done"] = True
+                        continue
+                    s["frame_idx"] += 1
+                    batch.append((s, frame))
+                if not batch:
+                    break
+                tick += 1
+                frames_total += len(batch)
+
+                # 2) Inferencia en lote: una llamada por cada (imgsz, conf) distinto
+                #    (normalmente una sola); cada stream conserva sus propios
+                #    ajustes (escena recargada, control de calidad)
+                t_det = time.perf_counter()
+                groups = {}
+                for i, (s, _) in enumerate(batch):
+                    groups.setdefault((s["pipe"].yolo_imgsz, s["pipe"].yolo_conf), []).append(i)
+                dets_per_frame = [None] * len(batch)
+                for (imgsz, conf), idxs in groups.items():
+                    dets = self.detector.infer_batch([batch[i][1] for i in idxs], imgsz=imgsz, conf=conf)
+                    for i, d in zip(idxs, dets):
+                        dets_per_frame[i] = d
+                self.telemetry.stage("detect_batch", time.perf_counter() - t_det)
+                self.telemetry.frame()
+
+                # 3) Tracker/reglas/overlays de cada stream con sus detecciones
+                new_events = {}
+                for (s, frame), dets in zip(batch, dets_per_frame):
+                    ts = frame_timestamp(s["cap"], s["frame_idx"], s["fps"])
+                    pipe = s["pipe"]
+                    write = s["frame_idx"] % pipe.output_step == 0
+                    pipe.process_frame(frame, s["frame_idx"], ts, s["fps"], base_dets=dets, render=write)
+                    if write:
+                        s["writer"].write(pipe.annotated)
+                    pipe.telemetry.maybe_log()
+                    pipe.poll_scene()
+                    if evs := pipe.logger.drain_new_events():
+                        new_events[s["name"]] = evs
+
+                if new_events or tick % max(1, progress_every) == 0:
+                    elapsed = max(1e-9, time.perf_counter() - t0)
+                    yield {
+                        "type": "progress",
+                        "tick": tick,
+                        "active": len(batch),
+                        "processing_fps": frames_total / elapsed,
+                        "new_events": new_events,
+                    }
+
+            # Eventos con evidencia aún pendiente al terminar los streams
+            new_events = {}
+            for s in opened:
+                s["pipe"].logger.flush_evidence()
+                if evs := s["pipe"].logger.drain_new_events():
+                    new_events[s["name"]] = evs
+            if new_events:
+                yield {"type": "progress", "tick": tick, "active": 0,
+                       "processing_fps": frames_total / max(1e-9, time.perf_counter() - t0),
+                       "new_events": new_events}
+
+            elapsed = max(1e-9, time.perf_counter() - t0)
+            yield {
+                "type": "done",
+                "processing_seconds": elapsed,
+                "processing_fps": frames_total / elapsed,
+                "cancelled": cancelled,
+                "streams": {
+                    s["name"]: {
+                        "frames": s["frame_idx"],
+                        "out_path_final": s["out_path_final"],
+                        "events_csv": s["pipe"].logger.csv_path,
+                    } for s in opened
+                },
+            }
+        finally:
+            for s in opened:
+                s["pipe"].logger.close()
+                release_safely(s.get("cap"), s.get("writer"))
@@ -0,0 +1,234 @@
+# -----------------------------------------------------------------------------
+# Procesamiento paralelo de UN video largo por segmentos de tiempo.
+#
+#   1) Se divide [0, duración) en N segmentos contiguos.
+#   2) Cada proceso worker crea su propio Pipeline y procesa
+#      [inicio - overlap, fin): los primeros `overlap` segundos son de
+#      calentamiento (tracker y reglas acumulan estado, p.ej. el cruce de la
+#      línea A de velocidad o la persistencia de casco/carril) pero sus eventos
+#      no se registran; ese tramo ya lo cubre el segmento anterior.
+#   3) Costuras: en el tramo solapado ambos segmentos ven los mismos frames, así
+#      que sus tracks se emparejan por IoU para traducir los IDs locales de cada
+#      segmento a IDs globales.
+#   4) Los CSV de cada segmento se fusionan en <output_dir>/events.csv,
+#      eliminando duplicados (mismo tipo + mismo ID global cerca de la costura).
+# -----------------------------------------------------------------------------
+
+import logging
+import csv
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from core.utils.events import CSV_COLUMNS
+from core.utils.video_io import open_video_reader, reader_options, video_frame_count, release_safely
+
+log = logging.getLogger(__name__)
+
+
+def _bbox_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def plan_segments(duration_s, workers, overlap_s, start_s=0.0, end_s=None):
+    """
+    Divide [start_s, end_s) en `workers` segmentos. Devuelve una lista de dicts
+    con 'index', 'start_s', 'end_s' y 'warmup_s' (inicio real de proceso).
+    duration_s=None si el contenedor no informa la duración: entonces end_s
+    es obligatorio y se usa tal cual. ValueError si la ventana está vacía.
+    """
+    if end_s is None:
+        if duration_s is None:
+            raise ValueError("el video no informa su duración: indique el segundo final (--end)")
+        end_s = duration_s
+    elif duration_s is not None:
+        end_s = min(end_s, duration_s)
+    span = end_s - start_s
+    if span <= 0:
+        raise ValueError(f"ventana vacía: [{start_s:.1f}s, {end_s:.1f}s)")
+    n = max(1, min(workers, math.ceil(span / max(1e-9, 2 * overlap_s)) if overlap_s > 0 else workers))
+    step = span / n
+    segs = []
+    for i in range(n):
+        s0 = start_s + i * step
+        s1 = end_s if i == n - 1 else start_s + (i + 1) * step
+        segs.append({"index": i, "start_s": s0, "end_s": s1,
+                     "warmup_s": max(start_s, s0 - overlap_s) if i > 0 else s0})
+    return segs
+
+
+def _run_segment(job):
+    """Worker (proceso aparte): procesa un segmento y registra los tracks de las costuras."""
+    # Import diferido: cada proceso carga sus propios modelos
+    from core.pipeline import Pipeline
+
+    seg = job["segment"]
+    head = (seg["warmup_s"], seg["start_s"])               # solapado con el segmento anterior
+    tail = (seg["end_s"] - job["overlap_s"], seg["end_s"])  # solapado con el siguiente
+    seam_tracks = {"head": {}, "tail": {}}
+
+    def on_tracks(frame_idx, ts, tracks):
+        for key, (t0, t1) in (("head", head), ("tail", tail)):
+            if t0 <= ts < t1:
+                seam_tracks[key][frame_idx] = [(str(t["id"]), t["label"], list(t["bbox"])) for t in tracks]
+
+    pipe = Pipeline(job["scene"], yolo_imgsz=job.get("yolo_imgsz"), yolo_conf=job.get("yolo_conf"),
+                    output_dir=job["output_dir"])
+    res = pipe.process_video(
+        job["in_path"], job["out_path"], clean_previous=True,
+        start_s=seg["warmup_s"], end_s=seg["end_s"],
+        events_from_s=seg["start_s"], on_tracks=on_tracks,
+    )
+    return {
+        "segment": seg,
+        "csv_path": pipe.logger.csv_path,
+        "out_path_final": res.get("out_path_final"),
+        "frames": res.get("frames", 0),
+        "processing_seconds": res.get("processing_seconds", 0.0),
+        "seam_tracks": seam_tracks,
+    }
+
+
+def _match_seam(prev_tail, next_head, iou_thr=0.5):
+    """
+    Empareja IDs del segmento anterior (tail) con los del siguiente (head) en
+    los frames comunes. Sólo cuenta la mitad final del solape, cuando el
+    tracker del segmento nuevo ya confirmó sus tracks. Devuelve {id_next: id_prev}.
+    """
+    common = sorted(set(prev_tail) & set(next_head))
+    common = common[len(common) // 2:]
+    votes = {}
+    for fidx in common:
+        used = set()
+        for nid, nlabel, nbox in next_head[fidx]:
+            best, best_iou = None, iou_thr
+            for pid, plabel, pbox in prev_tail[fidx]:
+                if plabel != nlabel or pid in used:
+                    continue
+                iou = _bbox_iou(nbox, pbox)
+                if iou >= best_iou:
+                    best, best_iou = pid, iou
+            if best is not None:
+                used.add(best)
+                votes[(nid, best)] = votes.get((nid, best), 0) + 1
+    # Asignación por mayoría: cada id se usa una vez, empezando por los más votados
+    mapping, taken = {}, set()
+    for (nid, pid), _ in sorted(votes.items(), key=lambda kv: -kv[1]):
+        if nid not in mapping and pid not in taken:
+            mapping[nid] = pid
+            taken.add(pid)
+    return mapping
+
+
+def merge_segment_events(results, out_csv, dedupe_window_s):
+    """Fusiona los CSV de los segmentos con IDs globales y sin duplicados en costuras."""
+    results = sorted(results, key=lambda r: r["segment"]["index"])
+    global_ids, next_gid = {}, 1
+
+    def gid(seg_idx, local_id):
+        nonlocal next_gid
+        key = (seg_idx, str(local_id))
+        if key not in global_ids:
+            global_ids[key] = next_gid
+            next_gid += 1
+        return global_ids[key]
+
+    frames = []
+    for k, r in enumerate(results):
+        i = r["segment"]["index"]
+        if k > 0:
+            prev = results[k - 1]
+            for nid, pid in _match_seam(prev["seam_tracks"]["tail"], r["seam_tracks"]["head"]).items():
+                global_ids[(i, nid)] = gid(prev["segment"]["index"], pid)
+        # Reservar IDs para todos los tracks vistos en las costuras (orden estable)
+        for fidx in sorted(r["seam_tracks"]["head"]):
+            for tid, _, _ in r["seam_tracks"]["head"][fidx]:
+                gid(i, tid)
+        if not os.path.exists(r["csv_path"]):
+            continue
+        df = pd.read_csv(r["csv_path"], dtype={"id_objeto": str})
+        if df.empty:
+            continue
+        df = df[df["tiempo_seg"] >= r["segment"]["start_s"] - 1e-6]
+        df["id_objeto"] = [gid(i, t) for t in df["id_objeto"]]
+        df["segmento"] = i
+        frames.append(df)
+
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CSV_COLUMNS + ["segmento"])
+    merged = merged.sort_values("tiempo_seg", kind="stable")
+    keep, last_seen = [], {}
+    for row in merged.itertuples(index=False):
+        key = (row.tipo_infraccion, row.id_objeto)
+        prev = last_seen.get(key)
+        # Mismo infractor reportado por el segmento vecino justo en la costura
+        dup = prev is not None and prev[1] != row.segmento and row.tiempo_seg - prev[0] <= dedupe_window_s
+        keep.append(not dup)
+        if not dup:
+            last_seen[key] = (row.tiempo_seg, row.segmento)
+    merged = merged[keep].drop(columns=["segmento"])
+    merged.to_csv(out_csv, index=False, columns=CSV_COLUMNS, quoting=csv.QUOTE_MINIMAL)
+    return pd.read_csv(out_csv)
+
+
+def process_video_parallel(scene_config_path, in_path, out_path, output_dir=None,
+                           workers=None, overlap_s=5.0, start_s=0.0, end_s=None,
+                           yolo_imgsz=None, yolo_conf=None, dedupe_window_s=None):
+    """
+    Procesa `in_path` en paralelo por segmentos de tiempo (un proceso por
+    segmento). Cada segmento escribe en <output_dir>/segments/seg_XXX/ y su
+    propio video anotado '<salida>_segXXX.<ext>'. Devuelve un dict análogo a
+    Pipeline.process_video() con 'events_df' (fusionado) y 'segments'.
+    """
+    from core.pipeline import _load_config
+
+    cfg = _load_config(scene_config_path)
+    output_dir = output_dir or cfg["video"]["output_dir"]
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    cap, _, _, fps = open_video_reader(in_path, **reader_options(cfg))
+    n_frames = video_frame_count(cap)
+    release_safely(cap)
+    # Sin número de frames (0 = desconocido) la duración no se inventa
+    duration_s = n_frames / fps if n_frames and fps > 0 else None
+
+    segs = plan_segments(duration_s, workers, overlap_s, start_s=start_s or 0.0, end_s=end_s)
+    base, ext = os.path.splitext(out_path)
+    jobs = [{
+        "segment": seg,
+        "scene": scene_config_path,
+        "in_path": in_path,
+        "out_path": f"{base}_seg{seg['index']:03d}{ext}",
+        "output_dir": os.path.join(output_dir, "segments", f"seg_{seg['index']:03d}"),
+        "overlap_s": overlap_s,
+        "yolo_imgsz": yolo_imgsz,
+        "yolo_conf": yolo_conf,
+    } for seg in segs]
+    log.info(f"{len(jobs)} segmentos de ~{(segs[0]['end_s'] - segs[0]['start_s']):.1f}s "
+             f"(solape {overlap_s:.1f}s) en {min(workers, len(jobs))} procesos")
+
+    t0 = time.perf_counter()
+    # 'spawn': CUDA y algunos backends de video no son seguros tras fork()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=ctx) as ex:
+        results = list(ex.map(_run_segment, jobs))
+
+    os.makedirs(output_dir, exist_ok=True)
+    out_csv = os.path.join(output_dir, "events.csv")
+    window = overlap_s + 3.0 if dedupe_window_s is None else dedupe_window_s
+    df = merge_segment_events(results, out_csv, window)
+    secs = max(1e-9, time.perf_counter() - t0)
+    frames = sum(r["frames"] - int(round(r["segment"]["warmup_s"] * fps)) for r in results)
+    return {
+        "events_df": df,
+        "out_path_final": [r["out_path_final"] for r in results],
+        "processing_seconds": secs,
+        "processing_fps": frames / secs,
+        "segments": [{k: v for k, v in r.items() if k != "seam_tracks"} for r in results],
+    }
@@ -4,37 +4,44 @@
 #   2) Abrir escritor (VideoWriter) del video anotado de salida
 #   3) Por cada frame: detección YOLO -> tracking -> reglas -> overlays -> write
 #   4) Las reglas que detectan infracciones llaman a EventLogger.log(), el cual
-#      guarda una captura del frame completo y un recorte (crop) del objeto.
+#      guarda una captura del frame completo (una vez por frame) y un recorte
+#      (crop) del objeto con su miniatura; con evidence.best_frame, desde el
+#      mejor frame del track (escritura diferida, ver evidence_select.py).
 #   5) Al final, se devuelve la ruta final del video anotado y los eventos leídos
 #      desde el CSV generado.
 # -----------------------------------------------------------------------------
 
 import contextlib
-import yaml, os, shutil
+import logging
+import os, shutil
 import time
 import pandas as pd
 
-from core.utils.video_io import open_video_reader, open_video_writer, release_safely
+from core.utils.video_io import (open_video_reader, open_video_writer, release_safely, video_frame_count,
+                                 seek_frame, frame_timestamp, reader_options, scaled_size)
+from core.utils.config import load_config as _load_config, deep_merge
+from core.utils.scene import Scene, SceneWatcher
+from core.utils.trajectory import TrajectoryStore, homography_from_config
+from core.utils.track_sink import TrackSink
+from core.utils.buffer_pool import BufferPool
+from core.utils.checkpoint import checkpoint_path, video_fingerprint, save_checkpoint, load_checkpoint, remove_checkpoint
 from core.utils.events import EventLogger
-from core.utils.drawing import draw_box, draw_line, draw_hud
+from core.utils.clip_buffer import ClipRecorder
+from core.utils.recording import RecordingWriter, RECORDED_INPUTS
+from core.utils.plate_stage import PlateOCRStage
+from core.utils.drawing import OverlayRenderer
+from core.utils.quality import QualityController
+from core.utils.telemetry import Telemetry, start_from_config as start_telemetry
 from core.detectors.yolo_detector import YoloDetector
 from core.detectors.helmet_detector import HelmetDetector
 from core.detectors.lane_detector import SimpleLaneDetector
+from core.detectors.traffic_light import TrafficLightClassifier
+from core.detectors.plate_ocr import make_plate_recognizer
 from core.trackers.deepsort_wrapper import DeepSortWrapper
-from core.rules.helmet import HelmetRule
-from core.rules.speed import SpeedRule
-from core.rules.lane_invasion import LaneInvasionRule
-from core.utils.model_io import ensure_local_model
-
-def _load_config(path):
-    with open(path, 'r') as f:
-        cfg = yaml.safe_load(f)
-    if "include" in cfg:
-        with open(cfg["include"], 'r') as f:
-            base = yaml.safe_load(f)
-        base.update({k:v for k,v in cfg.items() if k!="include"})
-        cfg = base
-    return cfg
+from core.rules.registry import FrameInputs, build_rules
+from core.utils.model_store import ModelStore
+
+log = logging.getLogger(__name__)
 
 # Borrar recursos previos
 def _clean_previous_outputs(output_dir: str, evidence_dir: str):
@@ -45,89 +52,420 @@ def _clean_previous_outputs(output_dir: str, evidence_dir: str):
     with contextlib.suppress(Exception):
         if os.path.exists(evidence_dir):
             shutil.rmtree(evidence_dir)
+    with contextlib.suppress(Exception):
+        remove_checkpoint(checkpoint_path(output_dir))
+    with contextlib.suppress(Exception):
+        shutil.rmtree(os.path.join(output_dir, "tracks"))
     os.makedirs(evidence_dir, exist_ok=True)
 
+def _resume_output_path(out_path, start_frame):
+    """El video anotado no se puede anexar: al reanudar se escribe una parte nueva."""
+    base, ext = os.path.splitext(out_path)
+    return f"{base}_resume{start_frame}{ext}"
+
+def _progress_update(frame_idx, total_frames, t0, new_events, start_frame=0):
+    """Construye el dict de progreso que produce Pipeline.iter_process_video()."""
+    elapsed = max(1e-9, time.perf_counter() - t0)
+    proc_fps = (frame_idx - start_frame) / elapsed
+    eta = None
+    if total_frames and proc_fps > 0:
+        eta = max(0.0, (total_frames - frame_idx) / proc_fps)
+    return {
+        "type": "progress",
+        "frame_idx": frame_idx,
+        "total_frames": total_frames,
+        "processing_fps": proc_fps,
+        "eta_seconds": eta,
+        "new_events": new_events,
+    }
+
+def _lap(telemetry, stage, t):
+    # Registra la duración de una etapa desde `t` y devuelve el nuevo instante
+    now = time.perf_counter()
+    telemetry.stage(stage, now - t)
+    return now
+
+
+def load_models(cfg, with_detector=True):
+    """
+    Carga el detector base, (si hay modelo) el de casco y (si `plates.enabled`)
+    el OCR de placas según la config. Devuelve {"detector", "helmet_detector",
+    "plate_recognizer"}; varios Pipeline pueden compartirlo.
+    Con with_detector=False el detector base queda en None (la detección se
+    hace en otro proceso, ver core/mp_pipeline.py).
+    """
+    # Pesos del detector base y del de casco (opcional) con el almacén de
+    # modelos (core/utils/model_store.py): descarga reanudable y verificada de
+    # los que falten, en paralelo; los ya verificados sólo cuestan un stat().
+    # Casco: preferimos no bloquear; si no hay modelo, lo registramos claro.
+    mcfg = cfg["models"]
+    store = ModelStore.from_config(mcfg)
+    h_path = mcfg.get("helmet_path") or os.environ.get("HELMET_MODEL_PATH")
+    h_url = mcfg.get("helmet_url") or os.environ.get("HELMET_MODEL_URL")
+    wanted = []
+    if h_path:
+        wanted.append(store.register(h_path, mirrors=[h_url], kind="helmet"))
+    if with_detector:
+        # Sin entrada ni mirrors, Ultralytics resuelve el detector base por su cuenta
+        wanted.append(store.register(mcfg["yolo_path"]))
+    store.ensure_many([n for n in wanted if store.manifest[n].get("mirrors")])
+    if h_path and not os.path.exists(h_path):
+        # Otro modelo de casco del manifiesto ya descargado (p. ej. con scripts/download_models.py)
+        h_path = store.first_ready("helmet")
+    log.info(f"Ruta modelo casco resuelta: {h_path or 'Ninguna'}")
+
+    detector = YoloDetector(
+        model_path=mcfg["yolo_path"],
+        imgsz=cfg["yolo"]["imgsz"],
+        conf=cfg["yolo"]["conf"]
+    ) if with_detector else None
+
+    # Instancia detector de casco si el archivo existe finalmente
+    if h_path and os.path.exists(h_path):
+        try:
+            log.info(f"Cargando modelo de casco desde: {h_path}")
+            hcfg = cfg.get("helmet", {})
+            helmet_imgsz = hcfg.get("imgsz", cfg["yolo"]["imgsz"])  # permitir imgsz distinto para casco
+            helmet_conf  = hcfg.get("conf", 0.30)
+            log.info(f"Modelo de casco: {h_path}")
+            helmet_detector = HelmetDetector(
+                model_path=h_path,
+                imgsz=helmet_imgsz,
+                conf=helmet_conf,
+            )
+        except Exception as e:
+            log.error(f"Error cargando modelo de casco: {e}")
+            helmet_detector = None
+    else:
+        log.warning("Modelo de casco no encontrado. Coloca un .pt en models/helmet o configura HELMET_MODEL_URL.")
+        helmet_detector = None
+
+    return {"detector": detector, "helmet_detector": helmet_detector,
+            "plate_recognizer": make_plate_recognizer(cfg.get("plates"))}
+
 class Pipeline:
-    def __init__(self, scene_config_path, yolo_imgsz=None, yolo_conf=None):
-        self.cfg = _load_config(scene_config_path)
-        # Overrides de la UI
-        if yolo_imgsz: self.cfg["yolo"]["imgsz"] = yolo_imgsz
-        if yolo_conf:  self.cfg["yolo"]["conf"]  = yolo_conf
-
-        # Modelos
-        self.detector = YoloDetector(
-            model_path=self.cfg["models"]["yolo_path"],
-            imgsz=self.cfg["yolo"]["imgsz"],
-            conf=self.cfg["yolo"]["conf"]
-        )
-        # Helmet (opcional): resolver ruta del modelo de casco y descargar si falta.
-        # Reglas: preferimos no bloquear; si no hay modelo, lo registramos claro.
-        def _resolve_helmet_path(cfg_models) -> str | None:
-            # 1) Config / Env
-            path = cfg_models.get("helmet_path") or os.environ.get("HELMET_MODEL_PATH")
-            if path and os.path.exists(path):
-                return path
-            # 2) Buscar cualquier .pt en models/helmet
-            base_dir = os.path.join(os.getcwd(), "models", "helmet")
-            with contextlib.suppress(Exception):
-                if os.path.isdir(base_dir):
-                    for name in os.listdir(base_dir):
-                        if name.lower().endswith(".pt"):
-                            return os.path.join(base_dir, name)
-            # 3) Devolver lo que haya (aunque no exista) para permitir descarga
-            return path
-
-        h_url  = self.cfg["models"].get("helmet_url") or os.environ.get("HELMET_MODEL_URL")
-        h_path = _resolve_helmet_path(self.cfg["models"])
-        print(f"[Pipeline] Ruta modelo casco resuelta: {h_path or 'Ninguna'}")
-        if h_path and (not os.path.exists(h_path)) and h_url:
-            try:
-                ensure_local_model(h_path, h_url)
-            except Exception as e:
-                print(f"[Pipeline] No se pudo descargar el modelo de casco: {e}")
-
-        # Instancia detector de casco si el archivo existe finalmente
-        if h_path and os.path.exists(h_path):
-            try:
-                print(f"[Pipeline] Cargando modelo de casco desde: {h_path}")
-                hcfg = self.cfg.get("helmet", {})
-                helmet_imgsz = hcfg.get("imgsz", self.cfg["yolo"]["imgsz"])  # permitir imgsz distinto para casco
-                helmet_conf  = hcfg.get("conf", 0.30)
-                print(f"[Pipeline] Modelo de casco: {h_path}")
-                self.helmet_detector = HelmetDetector(
-                    model_path=h_path,
-                    imgsz=helmet_imgsz,
-                    conf=helmet_conf,
-                )
-            except Exception as e:
-                print(f"[Pipeline] Error cargando modelo de casco: {e}")
-                self.helmet_detector = None
-        else:
-            print("[Pipeline] Modelo de casco no encontrado. Coloca un .pt en models/helmet o configura HELMET_MODEL_URL.")
-            self.helmet_detector = None
+    def __init__(self, scene_config_path, yolo_imgsz=None, yolo_conf=None, output_dir=None, models=None):
+        self.scene_path = scene_config_path
+        # Overrides de la UI y directorio de salida propio (segmentos paralelos,
+        # sesiones de la GUI...); se vuelven a aplicar al recargar la escena
+        self._overrides = {"yolo": {}, "video": {}}
+        if yolo_imgsz: self._overrides["yolo"]["imgsz"] = yolo_imgsz
+        if yolo_conf:  self._overrides["yolo"]["conf"]  = yolo_conf
+        if output_dir:
+            self._overrides["video"] = {"output_dir": output_dir,
+                                        "evidence_dir": os.path.join(output_dir, "evidence")}
+        self.cfg = deep_merge(_load_config(scene_config_path), self._overrides)
+        # Geometría compilada (NumPy, polígonos rasterizados al abrir el video)
+        self.scene = Scene(self.cfg)
+        self.scene_watcher = None
+
+        # Modelos (compartibles entre pipelines, ver core/multistream.py)
+        models = models or load_models(self.cfg)
+        self.detector = models["detector"]
+        self.helmet_detector = models["helmet_detector"]
+        # imgsz/conf propios de este pipeline, pasados en cada inferencia: el
+        # detector puede ser compartido (multistream) y no se modifica
+        self.yolo_imgsz = self.cfg["yolo"]["imgsz"]
+        self.yolo_conf = self.cfg["yolo"]["conf"]
+        # OCR de placas (opcional; cualquier objeto con recognize(crop) -> (texto, conf))
+        self.plate_recognizer = models.get("plate_recognizer")
+
+        # Buffers reutilizables entre frames (decodificación, intermedios de carriles)
+        self.buffers = BufferPool()
 
         # Lanes (MVP sencillo; luego puedes integrar UFLD sin tocar el resto)
-        self.lane_detector = SimpleLaneDetector()
+        self.lane_detector = SimpleLaneDetector(pool=self.buffers)
 
-        # Tracker
-        self.tracker = DeepSortWrapper(max_age=15)
+        # Tracker (embedding de apariencia en lote y reutilizado, sección `tracker:`)
+        self.tracker = DeepSortWrapper.from_config(self.cfg.get("tracker"), max_age=15)
 
-        # Reglas activas
-        self.rules = []
-        # Activa regla de casco solo si hay modelo listo (evita falsos positivos)
-        if self.cfg["rules"].get("helmet") and self.helmet_detector is not None:
-            print("[Pipeline] Regla de casco ACTIVADA")
-            self.rules.append(HelmetRule(self.cfg))
-        else:
-            if self.cfg["rules"].get("helmet"):
-                print("[Pipeline] Regla de casco DESACTIVADA (no hay modelo)")
-        if self.cfg["rules"].get("speed"):         self.rules.append(SpeedRule(self.cfg))
-        if self.cfg["rules"].get("lane_invasion"): self.rules.append(LaneInvasionRule(self.cfg))
+        # Trayectorias recientes por track (ring buffers NumPy, memoria acotada)
+        tcfg = self.cfg.get("trajectory") or {}
+        self.trajectories = TrajectoryStore(capacity=tcfg.get("capacity", 32),
+                                            max_tracks=tcfg.get("max_tracks", 256))
+
+        # Semáforo (color por HSV sobre las cajas 'traffic light' del detector base)
+        self.traffic_light = TrafficLightClassifier()
+
+        # Entradas por frame bajo demanda para las reglas (ver core/rules/registry.py).
+        # 'tracks' y 'detections' siempre están; el resto sólo se calcula si
+        # alguna regla lo pide en ese frame.
+        self.input_providers = {
+            "lane_info": self._input_lane_info,
+            "traffic_light": self._input_traffic_light,
+            "trajectories": self._input_trajectories,
+        }
+        # Casco sólo si hay modelo listo (sin él la regla queda desactivada)
+        if self.helmet_detector is not None:
+            self.input_providers["helmet_dets"] = self._input_helmet_dets
+
+        # Reglas activas según la sección `rules:` del YAML
+        self.rules = build_rules(self.cfg, {"tracks", "detections", *self.input_providers}, scene=self.scene)
+
+        # Video anotado: resolución/fps de salida y overlays con geometría
+        # precalculada (el renderer se crea al conocer el tamaño del video)
+        ocfg = self.cfg.get("output") or {}
+        self.output_scale = float(ocfg.get("scale", 1.0))
+        self.output_step = max(1, int(ocfg.get("frame_step", 1)))
+        self.overlay = None
+        self.annotated = None
+
+        # Grabación opcional de detecciones/tracks para replay de reglas (core/replay.py)
+        self.recorder = None
+        # Exportación columnar de tracks por frame (sección `tracks_export:`)
+        self.track_sink = None
+        self._speed_H = None
+
+        # Perillas de coste (las mueve el control adaptativo de calidad, sección
+        # `adaptive:`; ver core/utils/quality.py). 1 = en todos los frames.
+        self.detect_stride = 1
+        self.lane_stride = 1
+        self.quality = None
+        self._last_dets = []
+        self._lane_cache = (None, None)   # (frame_idx, lane_info)
 
         # Logger (se re-crea después de limpiar para reescribir encabezados)
-        self.logger = EventLogger(self.cfg["video"]["output_dir"], self.cfg["video"]["evidence_dir"])
+        self.logger = self._make_logger()
+
+        # Telemetría en vivo (latencias por etapa, fps, colas, estado de reglas;
+        # ver core/utils/telemetry.py). Se mide siempre; la sección `telemetry:`
+        # decide si se exporta por HTTP y/o en líneas JSON periódicas.
+        tel_cfg = self.cfg.get("telemetry") or {}
+        # Nombre = escena:salida (varios pipelines por proceso en workers y multistream)
+        scene_name = os.path.splitext(os.path.basename(self.scene_path))[0]
+        out_name = os.path.basename(os.path.normpath(self.cfg["video"]["output_dir"]))
+        self.telemetry = Telemetry(f"{scene_name}:{out_name}",
+                                   window=tel_cfg.get("window_frames", 256),
+                                   json_log_seconds=tel_cfg.get("json_log_seconds", 30))
+        self.telemetry.add_collector(self._telemetry_samples)
+
+    def _input_helmet_dets(self, inputs):
+        # Sólo si hay persona + moto en escena para ahorrar cómputo
+        tracks = inputs.get("tracks")
+        need_helmet = any(t["label"]=="person" for t in tracks) and any(t["label"]=="motorbike" for t in tracks)
+        return self.helmet_detector.infer(inputs.frame) if need_helmet else []
+
+    def _input_lane_info(self, inputs):
+        # MVP con Canny+Hough; con lane_stride > 1 se reutiliza el último resultado
+        last_idx, info = self._lane_cache
+        if last_idx is None or inputs.frame_idx - last_idx >= self.lane_stride:
+            info = self.lane_detector.infer(inputs.frame)
+            self._lane_cache = (inputs.frame_idx, info)
+        return info
+
+    def _input_trajectories(self, inputs):
+        # Se alimenta una vez por frame, sólo si alguna regla lo usa
+        self.trajectories.update(inputs.get("tracks"), inputs.ts)
+        return self.trajectories
+
+    def _input_traffic_light(self, inputs):
+        return self.traffic_light.infer(inputs.frame, inputs.get("detections"))
 
-    def process_video(self, in_path, out_path, clean_previous=True):
+    def _make_logger(self):
+        return EventLogger(self.cfg["video"]["output_dir"], self.cfg["video"]["evidence_dir"],
+                           evidence_cfg=self.cfg.get("evidence"))
+
+
+    def _telemetry_samples(self):
+        # Se evalúa sólo al exportar (scrape HTTP o línea JSON), no por frame
+        out = [("infractions_events_total", "counter", {"rule": r}, n) for r, n in list(self.logger.event_counts.items())]
+        for rule in self.rules:
+            size = sum(len(v) for v in rule.state_dict().values() if hasattr(v, "__len__"))
+            out.append(("rule_state_entries", "gauge", {"rule": rule.rule_name}, size))
+            if rule.rule_name == "helmet":
+                out += [("helmet_inference_total", "counter", {"result": result}, n)
+                        for result, n in rule.inference_counts().items()]
+        out.append(("tracker_cached_embeddings", "gauge", {}, self.tracker.cached_embeddings()))
+        if (stage := self.logger.plate_stage) is not None:
+            out += [("queue_depth", "gauge", {"queue": f"plate_{name}"}, n) for name, n in stage.queue_depth().items()]
+        if self.track_sink is not None:
+            out.append(("queue_depth", "gauge", {"queue": "track_sink"}, self.track_sink.queue_depth()))
+        if (selector := self.logger.selector) is not None:
+            out += [("queue_depth", "gauge", {"queue": "evidence_pending"}, selector.pending_count()),
+                    ("queue_depth", "gauge", {"queue": "evidence_candidates"}, selector.candidate_count())]
+        return out
+
+    def output_geometry(self, fps, size):
+        """(fps, (ancho, alto)) del video anotado según la sección `output:` del YAML."""
+        return fps / self.output_step, scaled_size(size, self.output_scale)
+
+    def _overlay_for(self, frame):
+        size = (frame.shape[1], frame.shape[0])
+        if self.overlay is None or self.overlay.in_size != size:
+            self.overlay = OverlayRenderer(self.cfg.get("geometry"), size, scaled_size(size, self.output_scale))
+        return self.overlay
+
+    def reset(self, output_dir=None):
+        """
+        Deja el pipeline listo para otro video sin recargar modelos: tracker,
+        trayectorias, reglas y logger nuevos (opcionalmente con otro directorio
+        de salida). Lo usan los workers de la cola (core/worker.py).
+        """
+        if output_dir:
+            self._overrides["video"] = {"output_dir": output_dir,
+                                        "evidence_dir": os.path.join(output_dir, "evidence")}
+            self.cfg = deep_merge(self.cfg, self._overrides)
+        self.tracker.reset()
+        tcfg = self.cfg.get("trajectory") or {}
+        self.trajectories = TrajectoryStore(capacity=tcfg.get("capacity", 32),
+                                            max_tracks=tcfg.get("max_tracks", 256))
+        self.rules = build_rules(self.cfg, {"tracks", "detections", *self.input_providers}, scene=self.scene)
+        self.yolo_imgsz = self.cfg["yolo"]["imgsz"]   # lo pudo bajar el control de calidad
+        self.detect_stride = self.lane_stride = 1
+        self._last_dets = []
+        self._lane_cache = (None, None)
+        self.overlay = self.annotated = None
+        self.logger.close()
+        self.logger = self._make_logger()
+
+    def reload_scene(self, cfg):
+        """
+        Aplica una config de escena nueva (ver SceneWatcher) sin recargar
+        modelos: geometría compilada, reglas (conservando su estado por track),
+        umbrales del detector y overlays. Salidas, logger y tracker no cambian.
+        """
+        self.cfg = deep_merge(cfg, self._overrides)
+        size = self.scene.size
+        self.scene = Scene(self.cfg)
+        if size is not None:
+            self.scene.rasterize(size)
+        old = {rule.rule_name: rule for rule in self.rules}
+        self.rules = build_rules(self.cfg, {"tracks", "detections", *self.input_providers}, scene=self.scene)
+        for rule in self.rules:
+            if (prev := old.get(rule.rule_name)) is not None:
+                rule.load_state_dict(prev.state_dict())
+        self.yolo_imgsz = self.cfg["yolo"]["imgsz"]
+        self.yolo_conf = self.cfg["yolo"]["conf"]
+        if self.quality is not None:
+            self.apply_quality(self.quality.settings)
+        self.overlay = None
+        self.telemetry.inc("scene_reloads_total")
+
+    def poll_scene(self):
+        """Recarga la escena si su YAML (o un include) cambió; barato en cada frame."""
+        if self.scene_watcher is not None and (cfg := self.scene_watcher.poll()) is not None:
+            self.reload_scene(cfg)
+
+    def start_scene_watch(self):
+        """Vigila la escena para recargarla en caliente si `scene.hot_reload` está activo."""
+        scfg = self.cfg.get("scene") or {}
+        if scfg.get("hot_reload") and self.scene_watcher is None:
+            self.scene_watcher = SceneWatcher(self.scene_path, scfg.get("check_seconds", 2.0))
+
+    def _quality_knobs(self):
+        # Perillas con efecto según las reglas activas (ver core/utils/quality.py)
+        knobs = {"detect_stride", "imgsz"}
+        if any("lane_info" in rule.requires for rule in self.rules):
+            knobs.add("lane_stride")
+        if any(rule.rule_name == "helmet" for rule in self.rules):
+            knobs.add("helmet_recheck_seconds")
+        return knobs
+
+    def apply_quality(self, settings):
+        """Aplica los ajustes del control adaptativo (imgsz, strides, revalidación de casco)."""
+        self.yolo_imgsz = settings.get("imgsz", self.cfg["yolo"]["imgsz"])
+        self.detect_stride = max(1, int(settings.get("detect_stride", 1)))
+        self.lane_stride = max(1, int(settings.get("lane_stride", 1)))
+        for rule in self.rules:
+            if rule.rule_name == "helmet" and "helmet_recheck_seconds" in settings:
+                rule.recheck = float(settings["helmet_recheck_seconds"])
+
+    def state_dict(self, in_path, frame_idx):
+        """Estado completo para un checkpoint tras procesar `frame_idx` frames."""
+        # Los eventos pendientes de evidencia se escriben ya (las reglas los dan por
+        # reportados y no se volverían a detectar al reanudar) y los tracks
+        # exportados quedan en disco antes de guardar sus posiciones
+        self.logger.flush_evidence()
+        if self.track_sink is not None:
+            self.track_sink.flush()
+        return {
+            "video": video_fingerprint(in_path),
+            "frame_idx": frame_idx,
+            "tracker": self.tracker.state_dict(),
+            "trajectories": self.trajectories.state_dict(),
+            "rules": {rule.__class__.__name__: rule.state_dict() for rule in self.rules},
+            "logger": self.logger.state_dict(),
+            "track_sink": self.track_sink.state_dict() if self.track_sink is not None else None,
+            "plates": self.logger.plate_stage.state_dict() if self.logger.plate_stage is not None else None,
+        }
+
+    def load_state_dict(self, state):
+        self.tracker.load_state_dict(state["tracker"])
+        self.trajectories.load_state_dict(state["trajectories"])
+        for rule in self.rules:
+            if (rs := state["rules"].get(rule.__class__.__name__)) is not None:
+                rule.load_state_dict(rs)
+        self.logger.load_state_dict(state["logger"])
+
+    def process_frame(self, frame, frame_idx, ts, fps, base_dets=None, render=True):
+        """
+        Procesa un frame completo (sin leer ni escribir video) y devuelve los
+        tracks. Si `base_dets` viene dado (inferencia en lote hecha por fuera,
+        ver core/multistream.py), se omite la detección YOLO. Con render=True
+        el frame anotado queda en self.annotated (el propio `frame`, dibujado
+        en sitio, salvo que `output.scale` reduzca la resolución); con False
+        se omiten los overlays (frames que no se escriben).
+        """
+        self.logger.frame_idx = frame_idx
+        tel = self.telemetry
+        t = time.perf_counter()
+
+        # 1-2) Detección base (YOLO sobre el frame actual) y tracking (IDs
+        #      persistentes). Con detect_stride > 1 los frames intermedios no
+        #      pasan por YOLO: el tracker sólo predice y las reglas ven las
+        #      últimas detecciones (semáforo, etc.).
+        if base_dets is None and self.detect_stride > 1 and frame_idx % self.detect_stride:
+            base_dets = self._last_dets
+            tracks = self.tracker.predict()
+            tel.inc("frames_skipped_total", reason="detect_stride")
+        else:
+            if base_dets is None:
+                base_dets = self.detector.infer(frame, imgsz=self.yolo_imgsz, conf=self.yolo_conf)
+                t = _lap(tel, "detect", t)
+            self._last_dets = base_dets
+            tracks = self.tracker.update(base_dets, frame)
+        t = _lap(tel, "track", t)
+
+        # 3) Reglas habilitadas. Cada una pide sus entradas a `inputs`
+        #    (casco, carriles, semáforo...), que se calculan una sola vez
+        #    por frame y sólo si alguna regla las necesita.
+        #    IMPORTANTE: cuando una regla confirma infracción, llama a
+        #    self.logger.log(...), que escribe una foto del frame y el
+        #    recorte del bbox a data/output/evidence/<tipo>/...
+        inputs = FrameInputs(self.input_providers, frame, ts, frame_idx,
+                             tracks=tracks, detections=base_dets)
+        for rule in self.rules:
+            rule.update(frame, tracks, ts, self.logger, inputs)
+        # Evidencia diferida: nuevas tomas de los eventos pendientes y
+        # escritura de los que ya se cerraron (antes de dibujar overlays)
+        self.logger.end_frame(frame, tracks, ts)
+        # Candidatos de placa para los vehículos con eventos (antes de dibujar overlays)
+        if self.logger.plate_stage is not None:
+            self.logger.plate_stage.observe(frame, tracks)
+        if self.recorder is not None:
+            # Se graban todas las entradas que dependen de la imagen, las use
+            # o no la config actual: el replay puede activar otras reglas
+            recorded = {k: inputs.get(k) for k in RECORDED_INPUTS if k in self.input_providers}
+            self.recorder.write(frame_idx, ts, base_dets, tracks, recorded)
+        if self.track_sink is not None:
+            # Velocidad sólo si las trayectorias ya se alimentaron en este frame
+            # y hay homografía (m/s -> km/h); si no, queda NaN
+            speeds = None
+            if self._speed_H is not None and "trajectories" in inputs.computed():
+                speeds = {tid: v * 3.6 for tid, v in self.trajectories.speeds(self._speed_H, ts=ts).items()}
+            self.track_sink.write(frame_idx, ts, tracks, speeds)
+        t = _lap(tel, "rules", t)
+
+        # 4) Overlays (visual): geometría de la escena desde una capa cacheada,
+        #    cajas y etiquetas por track y HUD
+        self.annotated = self._overlay_for(frame).render(
+            frame, tracks, f"FPS: {fps:.1f} | Frame: {frame_idx}") if render else None
+        if render:
+            _lap(tel, "overlay", t)
+        tel.frame()
+        return tracks
+
+    def process_video(self, in_path, out_path, clean_previous=True, **kwargs):
         """
         Ejecuta el análisis del video y produce tres artefactos:
           - Video anotado (bounding boxes, HUD y líneas guía), escrito frame a
@@ -137,79 +475,206 @@ class Pipeline:
           - Evidencias en disco (capturas del frame y recortes del bbox) por
             cada infracción detectada, gestionadas por EventLogger.log().
 
+        Es un envoltorio bloqueante sobre iter_process_video(): consume el
+        generador y devuelve únicamente el resultado final.
+
         Parámetros:
           - in_path: ruta del video fuente
           - out_path: ruta deseada del video de salida (se puede ajustar .mp4/.webm/.avi)
           - clean_previous: si True, limpia CSV y evidencias antes de empezar
+          - kwargs: mismas opciones que iter_process_video() (cancel_event,
+            resume, start_s/end_s, events_from_s, on_tracks, record_path)
         """
-        if clean_previous:
-            _clean_previous_outputs(self.cfg["video"]["output_dir"], self.cfg["video"]["evidence_dir"])
-            self.logger = EventLogger(self.cfg["video"]["output_dir"], self.cfg["video"]["evidence_dir"])
+        result = {}
+        for update in self.iter_process_video(in_path, out_path, clean_previous=clean_previous, **kwargs):
+            if update["type"] == "done":
+                result = update
+        return result
 
+    def iter_process_video(self, in_path, out_path, clean_previous=True,
+                           progress_every=10, cancel_event=None, resume=False,
+                           start_s=None, end_s=None, events_from_s=None, on_tracks=None,
+                           record_path=None):
+        """
+        Versión en streaming de process_video(): es un generador que produce
+        diccionarios a medida que avanza el análisis.
+
+          - {"type": "progress", "frame_idx", "total_frames", "processing_fps",
+             "eta_seconds", "new_events"}: cada `progress_every` frames y, además,
+            en cuanto alguna regla confirma eventos nuevos (filas del CSV como dicts).
+          - {"type": "done", "events_df", "out_path_final", "processing_seconds",
+             "processing_fps", "frames", "cancelled"}: último elemento.
+
+        Cancelación cooperativa: se revisa `cancel_event.is_set()` en cada frame.
+        Cerrar el generador (gen.close()) también libera lector y escritor.
+
+        Checkpoints: cada `checkpoint.every_frames` frames (y al cancelar) se
+        guarda <output_dir>/checkpoint.pkl. Con resume=True se restaura tracker,
+        reglas y logger, se salta al frame guardado y se sigue anexando al mismo
+        CSV; el video anotado continúa en '<salida>_resume<frame>.<ext>'.
+
+        Rango: con start_s/end_s sólo se procesa la ventana [start_s, end_s) del
+        video (seek directo al inicio). Con events_from_s los frames anteriores
+        sirven de calentamiento (tracker y reglas acumulan estado) pero sus
+        eventos no se registran. on_tracks(frame_idx, ts, tracks) se invoca en
+        cada frame tras el tracking (ver core/parallel.py).
+
+        Con record_path se graban detecciones, tracks y entradas de imagen de
+        cada frame (core/utils/recording.py) para re-ejecutar las reglas sin
+        modelos (core/replay.py).
+        """
+        ckpt_path = checkpoint_path(self.cfg["video"]["output_dir"])
+        ckpt_every = int((self.cfg.get("checkpoint") or {}).get("every_frames", 0) or 0)
+        ckpt = load_checkpoint(ckpt_path, in_path) if resume else None
+        if ckpt is None and clean_previous:
+            _clean_previous_outputs(self.cfg["video"]["output_dir"], self.cfg["video"]["evidence_dir"])
+            self.logger.close()
+            self.logger = self._make_logger()
+        start_frame = 0
+        if ckpt is not None:
+            self.load_state_dict(ckpt)
+            start_frame = ckpt["frame_idx"]
+            out_path = _resume_output_path(out_path, start_frame)
+            log.info(f"Reanudando desde checkpoint en frame {start_frame}")
+        self.logger.events_from_ts = events_from_s
+        # Descarta eventos de ejecuciones anteriores que nadie consumió
+        self.logger.drain_new_events()
 
         # Marca de tiempo inicial para medir duración del análisis completo
         t0 = time.perf_counter()
 
-        # core/pipeline.py (dentro de process_video)
-        # 1) Abrir lector del video de entrada: devuelve handle + tamaño + FPS
-        cap, w, h, fps = open_video_reader(in_path)
+        # 1) Abrir lector del video de entrada (backend según `video.reader`):
+        #    devuelve handle + tamaño + FPS
+        cap, w, h, fps = open_video_reader(in_path, **reader_options(self.cfg))
+        total_frames = video_frame_count(cap)
+        # Polígonos de la escena rasterizados a la resolución de proceso
+        self.scene.rasterize((w, h))
+        self.start_scene_watch()
+        if start_s:
+            start_frame = max(start_frame, int(round(start_s * fps)))
+        end_frame = int(round(end_s * fps)) if end_s is not None else None
+        if end_frame is not None:
+            total_frames = min(total_frames, end_frame) if total_frames else end_frame
+        seek_frame(cap, start_frame)
 
-        # >>> CAMBIO: open_video_writer ahora devuelve (writer, out_path_final)
         # 2) Abrir escritor del video anotado. Devuelve el writer y la ruta
         #    final del archivo (la extensión puede variar según códec elegido).
-        writer, out_path_final = open_video_writer(out_path, fps, (w, h))
+        #    Resolución y fps de salida según `output:` (scale, frame_step).
+        out_fps, out_size = self.output_geometry(fps, (w, h))
+        writer, out_path_final = open_video_writer(out_path, out_fps, out_size)
+
+        # Clips pre/post evento desde un ring buffer en memoria (opcional)
+        clips_cfg = self.cfg.get("clips") or {}
+        if clips_cfg.get("enabled"):
+            clips_dir = os.path.join(self.cfg["video"]["evidence_dir"], "clips")
+            self.logger.clip_recorder = ClipRecorder.from_config(clips_dir, out_fps, out_size, clips_cfg)
+        # Placas por OCR asíncrono sólo para vehículos con eventos (opcional)
+        if self.plate_recognizer is not None:
+            self.logger.plate_stage = PlateOCRStage.from_config(self.plate_recognizer, self.cfg.get("plates"))
+            if ckpt is not None and ckpt.get("plates"):
+                self.logger.plate_stage.load_state_dict(ckpt["plates"])
+        if record_path:
+            self.recorder = RecordingWriter(record_path, meta={
+                "video": os.path.abspath(in_path), "fps": fps, "size": [w, h],
+                "helmet": self.helmet_detector is not None, "start_frame": start_frame,
+            })
+
+        # Control adaptativo de calidad (opcional): ajusta imgsz y frecuencias
+        # según la latencia por frame frente a `adaptive.target_fps`
+        self.quality = QualityController.from_config(
+            self.cfg.get("adaptive"), self.cfg["yolo"]["imgsz"],
+            (self.cfg.get("helmet") or {}).get("recheck_seconds", 0.5), knobs=self._quality_knobs())
+        if self.quality is not None:
+            self.apply_quality(self.quality.settings)
 
+        # Tracks por frame en chunks columnares para analítica (core/track_analytics.py)
+        self.track_sink = TrackSink.from_config(self.cfg["video"]["output_dir"], self.cfg.get("tracks_export"),
+                                                meta={"video": os.path.abspath(in_path), "fps": fps, "size": [w, h]})
+        if self.track_sink is not None and ckpt is not None and ckpt.get("track_sink"):
+            self.track_sink.load_state_dict(ckpt["track_sink"])
+        if self.track_sink is not None:
+            self._speed_H = homography_from_config((self.cfg.get("speed") or {}).get("homography"))
 
-        # Geometría (para overlays de referencia)
-        geom = self.cfg["geometry"]
-        A1,A2 = geom["speed_lines"]["A"]
-        B1,B2 = geom["speed_lines"]["B"]
-        SL1,SL2 = geom["stop_line"]
+        # Endpoint Prometheus local (una vez por proceso, si `telemetry.http_port`)
+        start_telemetry(self.cfg.get("telemetry"))
+        tel = self.telemetry
+        max_gap = 1.5 / fps if fps > 0 else None
+        last_ts = None
 
-        frame_idx = 0
+        frame_idx = start_frame
+        cancelled = False
+        # Mientras haya un checkpoint en disco el CSV no se reescribe (las
+        # placas se completan al terminar la ejecución que lo consuma)
+        keep_ckpt = ckpt is not None
         try:
             while True:
-                ok, frame = cap.read()
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+                if end_frame is not None and frame_idx >= end_frame:
+                    break
+                t_frame = time.perf_counter()
+                # Decodifica sobre el mismo buffer en cada frame (nada lo
+                # retiene: evidencias y clips se codifican en el momento)
+                ok, frame = cap.read(self.buffers.get("decode", (h, w, 3)))
                 if not ok: break
                 frame_idx += 1
-                ts = frame_idx / fps
-
-                # 1) Detección base (YOLO sobre el frame actual)
-                base_dets = self.detector.infer(frame)
-
-                # 2) Tracking (asigna IDs persistentes a las detecciones)
-                tracks = self.tracker.update(base_dets, frame)
-
-                # 3) Casco (sólo si hay persona + moto en escena para ahorrar cómputo)
-                need_helmet = any(t["label"]=="person" for t in tracks) and any(t["label"]=="motorbike" for t in tracks)
-                helmet_dets = self.helmet_detector.infer(frame) if (self.helmet_detector and need_helmet) else []
-
-                # 4) Lanes (MVP con Canny+Hough; usado por reglas de carril)
-                lane_info = self.lane_detector.infer(frame)
-
-                # 5) Reglas (helmet / speed / lane invasion)
-                #    IMPORTANTE: cuando una regla confirma infracción, llama a
-                #    self.logger.log(...), que escribe una foto del frame y el
-                #    recorte del bbox a data/output/evidence/<tipo>/...
-                for rule in self.rules:
-                    if rule.__class__.__name__ == "HelmetRule":
-                        rule.update(frame, tracks, ts, self.logger, helmet_dets=helmet_dets)
-                    elif rule.__class__.__name__ == "LaneInvasionRule":
-                        rule.update(frame, tracks, ts, self.logger, lane_info=lane_info)
-                    else:
-                        rule.update(frame, tracks, ts, self.logger)
-
-                # 6) Overlays (visual) sobre el frame que será escrito a disco
-                for t in tracks:
-                    txt = f"ID {t['id']} {t['label']}"
-                    draw_box(frame, t["bbox"], text=txt)
-                draw_line(frame, SL1, SL2, color=(0,0,255))   # stop line
-                draw_line(frame, A1, A2, color=(255,255,0))   # speed A
-                draw_line(frame, B1, B2, color=(255,255,0))   # speed B
-                draw_hud(frame, f"FPS: {fps:.1f} | Frame: {frame_idx}")
-
-                # 7) Escritura del frame anotado al video de salida
-                writer.write(frame)
+                ts = frame_timestamp(cap, frame_idx, fps)  # pts del contenedor
+                _lap(tel, "decode", t_frame)
+                # Saltos en los pts: frames perdidos en origen (cámara/stream)
+                if max_gap is not None and last_ts is not None and ts - last_ts > max_gap:
+                    tel.inc("frames_dropped_total", int(round((ts - last_ts) * fps)) - 1, reason="source_gap")
+                last_ts = ts
+
+                # 1-6) Detección, tracking, reglas (y sus entradas) y overlays
+                #      (sólo en los frames que se escriben)
+                write = frame_idx % self.output_step == 0
+                tracks = self.process_frame(frame, frame_idx, ts, fps, render=write)
+                if on_tracks is not None:
+                    on_tracks(frame_idx, ts, tracks)
+
+                # 7) Escritura del frame anotado al video de salida (y al ring de clips)
+                if write:
+                    t_write = time.perf_counter()
+                    writer.write(self.annotated)
+                    if self.logger.clip_recorder is not None:
+                        self.logger.clip_recorder.push(self.annotated, ts)
+                    _lap(tel, "write", t_write)
+                else:
+                    tel.inc("frames_skipped_total", reason="output_step")
+                tel.maybe_log()
+                self.poll_scene()
+
+                # Latencia del frame (lectura a escritura) para el control de calidad
+                if self.quality is not None and (settings := self.quality.observe(
+                        time.perf_counter() - t_frame, frame_idx)) is not None:
+                    self.apply_quality(settings)
+
+                # 8) Progreso: por bloques de frames o en cuanto haya eventos nuevos
+                new_events = self.logger.drain_new_events()
+                if new_events or frame_idx % max(1, progress_every) == 0:
+                    yield _progress_update(frame_idx, total_frames, t0, new_events, start_frame)
+
+                # 9) Checkpoint periódico (estado consistente tras escribir el frame)
+                if ckpt_every and frame_idx % ckpt_every == 0:
+                    save_checkpoint(ckpt_path, self.state_dict(in_path, frame_idx))
+                    keep_ckpt = True
+
+            # Al cancelar se deja checkpoint para reanudar; al terminar se elimina
+            if cancelled:
+                save_checkpoint(ckpt_path, self.state_dict(in_path, frame_idx))
+                keep_ckpt = True
+            else:
+                remove_checkpoint(ckpt_path)
+                keep_ckpt = False
+
+            # Eventos con evidencia aún pendiente (tracks vivos al final del video)
+            self.logger.flush_evidence()
+            if new_events := self.logger.drain_new_events():
+                yield _progress_update(frame_idx, total_frames, t0, new_events, start_frame)
+
+            # Espera al OCR de placas pendiente y completa la columna 'placa'
+            self.logger.finish_plates(rewrite=not keep_ckpt)
 
             # Devuelve DataFrame para integraciones programáticas (la UI lo lee del CSV)
             csv_path = os.path.join(self.cfg["video"]["output_dir"], "events.csv")
@@ -217,14 +682,29 @@ class Pipeline:
             # Medición de rendimiento: duración total y FPS de procesamiento
             t1 = time.perf_counter()
             processing_seconds = max(0.0, t1 - t0)
-            processing_fps = (frame_idx / processing_seconds) if processing_seconds > 0 else 0.0
-            return {
+            processing_fps = ((frame_idx - start_frame) / processing_seconds) if processing_seconds > 0 else 0.0
+            yield {
+                "type": "done",
                 "events_df": df,
                 "out_path_final": out_path_final,
                 "processing_seconds": processing_seconds,
                 "processing_fps": processing_fps,
+                "frames": frame_idx,
+                "cancelled": cancelled,
+                "quality_changes": self.quality.changes if self.quality is not None else [],
             }
 
         finally:
-            # 8) Liberar recursos de video (lector y escritor)
+            # 10) Liberar recursos de video (lector y escritor)
+            self.logger.events_from_ts = None
+            if self.logger.clip_recorder is not None:
+                self.logger.clip_recorder.close()
+                self.logger.clip_recorder = None
+            if self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None
+            if self.track_sink is not None:
+                self.track_sink.close()
+                self.track_sink = None
+            self.logger.close(rewrite=not keep_ckpt)
             release_safely(cap, writer)
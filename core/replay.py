@@ -0,0 +1,121 @@
+# -----------------------------------------------------------------------------
+# Replay de reglas sobre una grabación (core/utils/recording.py) y barrido de
+# configuraciones para ajustar parámetros sin volver a ejecutar modelos.
+#
+#   1) Grabar una vez:  Pipeline.process_video(..., record_path="rec.bin")
+#   2) Replay:          replay_recording("rec.bin", cfg) -> eventos con esa config
+#   3) Barrido:         sweep_recording("rec.bin", escena, grid) -> una fila
+#                       por combinación de parámetros con el conteo de eventos
+#
+# No se importa nada de YOLO/DeepSORT: cada replay es sólo reglas sobre
+# detecciones y tracks ya calculados. Las filas del CSV no llevan evidencias
+# (no hay imágenes en la grabación).
+# -----------------------------------------------------------------------------
+
+import logging
+import copy
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from core.rules.registry import FrameInputs, build_rules
+from core.utils.config import load_config
+from core.utils.events import EventLogger
+from core.utils.recording import read_recording
+from core.utils.trajectory import TrajectoryStore
+
+log = logging.getLogger(__name__)
+
+
+def replay_recording(recording_path, cfg, output_dir):
+    """
+    Re-ejecuta las reglas habilitadas en `cfg` sobre la grabación y escribe
+    <output_dir>/events.csv. Devuelve {"events_df", "frames", "processing_seconds"}.
+    """
+    t0 = time.perf_counter()
+    meta, frames = read_recording(recording_path)
+    tcfg = cfg.get("trajectory") or {}
+    trajectories = TrajectoryStore(capacity=tcfg.get("capacity", 32), max_tracks=tcfg.get("max_tracks", 256))
+
+    def _trajectories(inputs):
+        trajectories.update(inputs.get("tracks"), inputs.ts)
+        return trajectories
+
+    providers = {"trajectories": _trajectories, "helmet_dets": lambda inputs: []}
+    available = {"tracks", "detections", "traffic_light", "trajectories"}
+    if meta.get("helmet"):
+        available.add("helmet_dets")
+    rules = build_rules(cfg, available)
+
+    csv_path = os.path.join(output_dir, "events.csv")
+    if os.path.exists(csv_path):
+        os.remove(csv_path)
+    logger = EventLogger(output_dir, os.path.join(output_dir, "evidence"), evidence_cfg=cfg.get("evidence"))
+    n = 0
+    try:
+        for rec in frames:
+            logger.frame_idx = rec["frame_idx"]
+            inputs = FrameInputs(providers, None, rec["ts"], rec["frame_idx"],
+                                 tracks=rec["tracks"], detections=rec["detections"], **rec["inputs"])
+            for rule in rules:
+                rule.update(None, rec["tracks"], rec["ts"], logger, inputs)
+            n += 1
+    finally:
+        logger.close()
+    df = pd.read_csv(csv_path) if os.path.exists(csv_path) else pd.DataFrame()
+    return {"events_df": df, "frames": n, "processing_seconds": time.perf_counter() - t0}
+
+
+def _set_dotted(cfg, key, value):
+    node = cfg
+    *path, last = key.split(".")
+    for k in path:
+        node = node.setdefault(k, {})
+    node[last] = value
+
+
+def expand_grid(grid):
+    """{"helmet.helmet_iou_thresh": [0.05, 0.1], ...} -> lista de dicts (producto cartesiano)."""
+    keys = list(grid)
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in grid.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def _run_config(job):
+    """Worker (proceso aparte): replay con una combinación de parámetros."""
+    cfg = copy.deepcopy(job["cfg"])
+    for k, v in job["params"].items():
+        _set_dotted(cfg, k, v)
+    res = replay_recording(job["recording"], cfg, job["output_dir"])
+    df = res["events_df"]
+    counts = df["tipo_infraccion"].value_counts().to_dict() if not df.empty else {}
+    return {"config": job["index"], **job["params"], "eventos": len(df), **counts,
+            "segundos": round(res["processing_seconds"], 3)}
+
+
+def sweep_recording(recording_path, scene_config_path, grid, output_dir, workers=None):
+    """
+    Evalúa cada combinación de `grid` (claves con puntos sobre la config de la
+    escena) en procesos paralelos. Cada una escribe <output_dir>/cfg_XXX/events.csv;
+    la comparación (eventos totales y por tipo) queda en <output_dir>/sweep.csv.
+    """
+    cfg = load_config(scene_config_path)
+    combos = expand_grid(grid)
+    jobs = [{"index": i, "params": p, "cfg": cfg, "recording": recording_path,
+             "output_dir": os.path.join(output_dir, f"cfg_{i:03d}")} for i, p in enumerate(combos)]
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    log.info(f"{len(jobs)} configuraciones en {min(workers, len(jobs))} procesos")
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs))), mp_context=ctx) as ex:
+        rows = list(ex.map(_run_config, jobs))
+    df = pd.DataFrame(rows)
+    # Tipos de evento que no aparecieron en alguna config -> 0
+    counts = [c for c in df.columns if c not in ("config", "segundos", *grid)]
+    df[counts] = df[counts].fillna(0).astype(int)
+    os.makedirs(output_dir, exist_ok=True)
+    df.to_csv(os.path.join(output_dir, "sweep.csv"), index=False)
+    return df
@@ -5,10 +5,18 @@ Mejoras frente a la versión básica:
 - ROI de cabeza proporcional al alto del bbox de persona (ajustable).
 - Verificación con IoU mínimo casco↔cabeza y filtro por confianza del casco.
 - Persistencia temporal (frames consecutivos) antes de reportar "sin casco".
+- Caché de veredicto por persona: el modelo de casco sólo se ejecuta si algún
+  motociclista en escena tiene veredicto desconocido, vencido
+  (`recheck_seconds`), dudoso (confianza con decaimiento exponencial,
+  `verdict_half_life_seconds`, por debajo de `borderline_conf`) o va
+  acumulando frames "sin casco" hacia `min_persistence_no_helmet`. En el
+  resto de frames se reutiliza el veredicto cacheado (un cambio de "con
+  casco" a "sin casco" se detecta con un retraso de hasta `recheck_seconds`).
 """
 
 import numpy as np
 from core.utils.geometry import center_of
+from core.rules.registry import register_rule
 
 
 def _iou(a, b):
@@ -24,7 +32,10 @@ def _iou(a, b):
     return inter / union
 
 
+@register_rule("helmet")
 class HelmetRule:
+    requires = ("tracks", "helmet_dets")
+
     def __init__(self, cfg):
         hcfg = cfg["helmet"]
         # Frames consecutivos sin casco para reportar. Mantiene compatibilidad
@@ -40,12 +51,33 @@ class HelmetRule:
         self.head_ratio = hcfg.get("head_roi_top_ratio", 0.38)  # 38% superior del bbox
         self.iou_thr = hcfg.get("helmet_iou_thresh", 0.12)      # IoU mínimo casco↔cabeza
         self.conf_min = hcfg.get("helmet_conf_min", 0.25)       # conf mínima detección casco
+        # Caché de veredictos (recheck_seconds: 0 = inferir en todos los frames)
+        self.recheck = float(hcfg.get("recheck_seconds", 0.5))
+        self.half_life = float(hcfg.get("verdict_half_life_seconds", 2.0))
+        self.borderline = float(hcfg.get("borderline_conf", 0.35))
 
         # Estado por id de persona
         self.neg = {}              # frames consecutivos sin casco
         self.pos = {}              # frames consecutivos con casco
         self.active = set()        # ids en violación activa (ya reportados)
         self.last_report = {}      # id -> timestamp del último reporte
+        self.verdicts = {}         # id -> (tiene_casco, confianza, ts de la inferencia)
+        # Contadores de frames con / sin inferencia de casco (telemetría:
+        # helmet_inference_total{result="run"|"cached"})
+        self.helmet_checks = 0
+        self.helmet_skips = 0
+
+    def state_dict(self):
+        """Estado mutable por id (para checkpoints)."""
+        return {"neg": self.neg, "pos": self.pos, "active": self.active, "last_report": self.last_report,
+                "verdicts": self.verdicts}
+
+    def load_state_dict(self, state):
+        self.neg = dict(state["neg"])
+        self.pos = dict(state["pos"])
+        self.active = set(state["active"])
+        self.last_report = dict(state["last_report"])
+        self.verdicts = dict(state.get("verdicts", {}))
 
     def _associate_people_to_motos(self, tracks):
         """Empareja cada persona con su moto más cercana si está dentro de max_dist."""
@@ -70,21 +102,67 @@ class HelmetRule:
         padx = int(0.08 * (x2 - x1))  # margen para tolerar pequeñas desviaciones
         return [x1 - padx, y1, x2 + padx, head_y2]
 
-    def update(self, frame, tracks, ts, logger, helmet_dets):
-        # Filtra detecciones de casco por confianza
-        helmet_dets = [h for h in helmet_dets if h.get("conf", 1.0) >= self.conf_min]
+    def _needs_check(self, pid, ts):
+        """¿Hace falta inferir casco para esta persona en este frame?"""
+        v = self.verdicts.get(pid)
+        if v is None or self.recheck <= 0:
+            return True                                   # desconocido / caché desactivada
+        has_helmet, conf, t_check = v
+        age = ts - t_check
+        if age >= self.recheck:
+            return True                                   # vencido
+        if conf * 0.5 ** (age / max(1e-6, self.half_life)) < self.borderline:
+            return True                                   # dudoso (confianza decaída)
+        # Sin casco y aún no reportado: cada frame cuenta para la persistencia
+        return not has_helmet and pid not in self.active
+
+    def _verdict(self, roi, helmet_dets):
+        """(tiene_casco, confianza) de la ROI de cabeza frente a las detecciones de casco."""
+        best_iou, best_conf = 0.0, 0.0
+        for hdet in helmet_dets:
+            iou = _iou(roi, hdet["bbox"])
+            if iou > best_iou:
+                best_iou, best_conf = iou, hdet.get("conf", 1.0)
+        if best_iou >= self.iou_thr:
+            return True, best_conf
+        # Sin casco: menos seguro cuanto más cerca del umbral de IoU
+        return False, 1.0 - best_iou / max(1e-6, self.iou_thr)
 
+    def inference_counts(self):
+        """{"run": frames con inferencia de casco, "cached": frames con veredictos en caché}."""
+        return {"run": self.helmet_checks, "cached": self.helmet_skips}
+
+    def _prune_verdicts(self, ts):
+        # Un veredicto más viejo que recheck_seconds ya no se reutiliza (se
+        # vuelve a inferir): se olvida, así no crece con cada persona vista
+        horizon = ts - max(0.0, self.recheck)
+        for pid in [pid for pid, v in self.verdicts.items() if v[2] < horizon]:
+            del self.verdicts[pid]
+
+    def update(self, frame, tracks, ts, logger, inputs):
+        if self.verdicts:
+            self._prune_verdicts(ts)
         pairs = self._associate_people_to_motos(tracks)
+        if not pairs:
+            return
+        # Inferencia (una por frame, para todos) sólo si algún veredicto no sirve
+        fresh = any(self._needs_check(p["id"], ts) for p, _ in pairs)
+        if fresh:
+            self.helmet_checks += 1
+            # Filtra detecciones de casco por confianza
+            helmet_dets = [h for h in inputs.get("helmet_dets") if h.get("conf", 1.0) >= self.conf_min]
+        else:
+            self.helmet_skips += 1
+
         for p, m in pairs:
             pid = p["id"]
-            roi = self._head_roi(p["bbox"])
 
             # ¿Hay casco con IoU suficiente con la ROI de cabeza?
-            has_helmet = False
-            for hdet in helmet_dets:
-                if _iou(roi, hdet["bbox"]) >= self.iou_thr:
-                    has_helmet = True
-                    break
+            if fresh:
+                has_helmet, conf = self._verdict(self._head_roi(p["bbox"]), helmet_dets)
+                self.verdicts[pid] = (has_helmet, conf, ts)
+            else:
+                has_helmet = self.verdicts[pid][0]
 
             if not has_helmet:
                 # Acumula frames negativos y resetea positivos
@@ -97,10 +175,14 @@ class HelmetRule:
                         logger.log("no_helmet", ts, pid, p["bbox"], extra={"moto_id": m["id"]}, frame=frame)
                         self.active.add(pid)
                         self.last_report[pid] = ts
+                elif pid not in self.active:
+                    # Camino de confirmarse: toma candidata para la evidencia
+                    logger.candidate("no_helmet", ts, pid, p["bbox"], frame)
             else:
                 # Vemos casco: acumula positivos y resetea negativos
                 self.pos[pid] = self.pos.get(pid, 0) + 1
                 self.neg[pid] = 0
+                logger.discard("no_helmet", pid)
                 # Si mantiene casco por algunos frames, limpia estado activo
                 if self.pos[pid] >= self.helmet_need and pid in self.active:
                     self.active.remove(pid)
@@ -1,23 +1,43 @@
-from core.utils.geometry import center_of, point_in_polygon
+from core.utils.geometry import center_of
+from core.utils.scene import Scene
+from core.rules.registry import register_rule
 
+@register_rule("lane_invasion")
 class LaneInvasionRule:
-    def __init__(self, cfg):
-        self.poly = cfg["geometry"]["no_cross_polygon"]
+    # Usa el polígono fijo de la escena; no necesita el detector de carriles
+    requires = ("tracks",)
+    uses_scene = True
+
+    def __init__(self, cfg, scene=None):
+        # Polígono compilado (máscara rasterizada a la resolución del frame)
+        self.poly = (scene or Scene(cfg)).polygon("no_cross_polygon")
         self.persist = cfg["lane"]["persistence_frames"]  # frames consecutivos para confirmar
         self.state = {}            # track_id -> conteo de frames dentro
         self.active = set()        # tracks actualmente reportados (violación activa)
         self.cooldown = {}         # track_id -> último timestamp reportado
         self.min_gap = 3.0         # segundos entre reportes del mismo track
 
-    def update(self, frame, tracks, ts, logger, lane_info=None):
-        for t in tracks:
-            # vehículos relevantes
-            if t["label"] not in ["car","bus","truck","motorbike"]:
-                continue
+    def state_dict(self):
+        """Estado mutable por id (para checkpoints)."""
+        return {"state": self.state, "active": self.active, "cooldown": self.cooldown}
+
+    def load_state_dict(self, state):
+        self.state = dict(state["state"])
+        self.active = set(state["active"])
+        self.cooldown = dict(state["cooldown"])
 
+    def update(self, frame, tracks, ts, logger, inputs=None):
+        # vehículos relevantes
+        vehicles = [t for t in tracks if t["label"] in ["car","bus","truck","motorbike"]]
+        if not vehicles or self.poly is None:
+            return
+        # Pertenencia de todos los centros en una sola consulta a la máscara
+        # (sin frame, p. ej. en replay, se usa ray casting vectorizado)
+        size = None if frame is None else (frame.shape[1], frame.shape[0])
+        inside_all = self.poly.contains([center_of(t["bbox"]) for t in vehicles], size)
+        for t, inside in zip(vehicles, inside_all):
             tid = t["id"]
-            c = center_of(t["bbox"])
-            if inside := point_in_polygon(c, self.poly):
+            if inside:
                 self.state[tid] = self.state.get(tid, 0) + 1
                 # Cuando supera persistencia y aún no está activo => reportar si pasó cooldown
                 if self.state[tid] >= self.persist and tid not in self.active:
@@ -26,8 +46,12 @@ class LaneInvasionRule:
                         logger.log("lane_invasion", ts, tid, t["bbox"], extra={}, frame=frame)
                         self.active.add(tid)          # marcamos como en violación
                         self.cooldown[tid] = ts       # registramos último reporte
+                elif tid not in self.active:
+                    # Acumulando persistencia: toma candidata para la evidencia
+                    logger.candidate("lane_invasion", ts, tid, t["bbox"], frame)
             else:
                 # Salió de la zona: reset y permitir futuros reportes
                 self.state[tid] = 0
+                logger.discard("lane_invasion", tid)
                 if tid in self.active:
                     self.active.remove(tid)
\ No newline at end of file
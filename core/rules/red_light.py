@@ -0,0 +1,65 @@
+import numpy as np
+
+from core.utils.scene import Scene
+from core.rules.registry import register_rule
+
+
+@register_rule("red_light")
+class RedLightRule:
+    """Regla de luz roja: vehículo que cruza la línea de stop con el semáforo en rojo.
+
+    El estado del semáforo llega como entrada 'traffic_light' (ver
+    core/detectors/traffic_light.py) y sólo se calcula si hay algún cruce.
+    El cruce se mide entre las dos últimas posiciones del track en las
+    trayectorias compartidas (TrajectoryStore).
+    """
+
+    requires = ("tracks", "trajectories", "traffic_light")
+    uses_scene = True
+
+    def __init__(self, cfg, scene=None):
+        # Recta de la línea de stop precompilada (core/utils/scene.py)
+        self.stop_line = (scene or Scene(cfg)).line("stop_line")
+        rcfg = cfg.get("red_light", {})
+        # Segundos mínimos entre reportes del mismo track
+        self.min_gap = float(rcfg.get("min_gap_seconds", 5.0))
+        self.last_report = {}  # track_id -> timestamp del último reporte
+
+    def state_dict(self):
+        """Estado mutable por id (para checkpoints)."""
+        return {"last_report": self.last_report}
+
+    def load_state_dict(self, state):
+        self.last_report = dict(state["last_report"])
+
+    def update(self, frame, tracks, ts, logger, inputs):
+        if not self.stop_line:
+            return
+        vehicles = [t for t in tracks if t["label"] in ["car", "bus", "truck", "motorbike"]]
+        if not vehicles:
+            return
+        # Centros anterior y actual de cada track desde las trayectorias
+        # compartidas (las mismas que usa la regla de velocidad)
+        traj = inputs.get("trajectories")
+        moving, prev, curr = [], [], []
+        for t in vehicles:
+            p, c = traj.last(t["id"], 2), traj.last(t["id"], 1)
+            if p is not None and c is not None:
+                moving.append(t)
+                prev.append(p[1])
+                curr.append(c[1])
+        if not moving:
+            return
+        # Lado de la línea antes/después para todos los tracks a la vez
+        hit = self.stop_line.crossed(np.array(prev), np.array(curr))
+        crossing = [t for t, h in zip(moving, hit) if h]
+        if not crossing:
+            return
+        light = inputs.get("traffic_light")
+        if light["state"] != "red":
+            return
+        for t in crossing:
+            if ts - self.last_report.get(t["id"], -1e9) < self.min_gap:
+                continue
+            logger.log("red_light", ts, t["id"], t["bbox"], extra={"semaforo": light["state"]}, frame=frame)
+            self.last_report[t["id"]] = ts
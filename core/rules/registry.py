@@ -0,0 +1,97 @@
+"""Registro de reglas y entradas por frame calculadas bajo demanda.
+
+Cada regla se registra con un nombre (la clave en la sección `rules:` del
+YAML) y declara en `requires` las entradas que usa:
+
+    @register_rule("lane_invasion")
+    class LaneInvasionRule:
+        requires = ("tracks",)
+        def update(self, frame, tracks, ts, logger, inputs): ...
+
+El pipeline sólo instancia las reglas habilitadas en el YAML y les pasa un
+FrameInputs: las entradas costosas (detecciones de casco, carriles, estado
+del semáforo) se calculan la primera vez que alguna regla las pide con
+`inputs.get(nombre)` y se reutilizan el resto del frame. Si ninguna regla
+las pide, no cuestan nada.
+
+Reglas externas: listar sus módulos en `rule_plugins:` del YAML; basta con
+que usen @register_rule al importarse.
+
+Geometría: las reglas con `uses_scene = True` reciben además la escena
+compilada (core/utils/scene.py) compartida por el pipeline: cls(cfg, scene).
+"""
+
+import importlib
+import logging
+
+from core.utils.scene import Scene
+
+log = logging.getLogger(__name__)
+
+# Módulos con las reglas incluidas en el repo (se importan al construir)
+BUILTIN_RULE_MODULES = (
+    "core.rules.helmet",
+    "core.rules.speed",
+    "core.rules.lane_invasion",
+    "core.rules.red_light",
+)
+
+RULES = {}
+
+
+def register_rule(name):
+    """Decorador: registra la clase de regla bajo `name` (clave de `rules:`)."""
+    def deco(cls):
+        cls.rule_name = name
+        cls.requires = tuple(getattr(cls, "requires", ("tracks",)))
+        RULES[name] = cls
+        return cls
+    return deco
+
+
+class FrameInputs:
+    """Entradas de un frame: se calculan bajo demanda y como máximo una vez."""
+
+    def __init__(self, providers, frame, ts, frame_idx, **known):
+        self._providers = providers
+        self._cache = dict(known)
+        self.frame = frame
+        self.ts = ts
+        self.frame_idx = frame_idx
+
+    def get(self, name):
+        if name not in self._cache:
+            if name not in self._providers:
+                raise KeyError(f"Entrada de regla desconocida: {name}")
+            self._cache[name] = self._providers[name](self)
+        return self._cache[name]
+
+    def computed(self):
+        """Entradas ya calculadas en este frame (nombre -> valor)."""
+        return dict(self._cache)
+
+
+def build_rules(cfg, available_inputs, scene=None):
+    """
+    Instancia las reglas habilitadas en cfg['rules'] cuyas entradas estén
+    disponibles. Devuelve la lista en el orden del YAML. `scene` es la
+    geometría compilada (se compila de cfg si no se da).
+    """
+    scene = scene or Scene(cfg)
+    for mod in (*BUILTIN_RULE_MODULES, *(cfg.get("rule_plugins") or [])):
+        importlib.import_module(mod)
+
+    rules = []
+    for name, enabled in (cfg.get("rules") or {}).items():
+        if not enabled:
+            continue
+        cls = RULES.get(name)
+        if cls is None:
+            log.warning(f"Regla '{name}' no registrada; se ignora")
+            continue
+        if missing := [i for i in cls.requires if i not in available_inputs]:
+            log.warning(f"Regla '{name}' DESACTIVADA (faltan entradas: {', '.join(missing)})")
+            continue
+        log.info(f"Regla '{name}' ACTIVADA")
+        rules.append(cls(cfg, scene) if getattr(cls, "uses_scene", False) else cls(cfg))
+    return rules
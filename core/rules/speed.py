@@ -1,48 +1,119 @@
-from core.utils.geometry import crossed_line
+from core.utils.scene import Scene
+from core.utils.trajectory import homography_from_config
+from core.rules.registry import register_rule
 
 
+@register_rule("speed")
 class SpeedRule:
-    """Regla de velocidad: mide Δt entre líneas A y B y estima km/h.
+    """Regla de velocidad sobre las trayectorias compartidas (TrajectoryStore).
+
+    Dos modos:
+    - Homografía (`speed.homography` en la escena): velocidad continua en el
+      plano del suelo, vectorizada para todos los tracks en cada frame. Mide
+      también vehículos que aparecen entre las líneas A y B. Se reporta si
+      supera el límite durante `min_over_frames` frames consecutivos.
+    - Sin homografía (compatibilidad): Δt entre los cruces de las líneas A y B,
+      con instantes de cruce interpolados a precisión sub-frame, y
+      v = k_calibration * pixel_distance / Δt.
 
     Diseño robusto: si falta `cfg['speed']` en la escena, aplica valores por
     defecto razonables en vez de fallar con KeyError.
     """
 
-    def __init__(self, cfg):
-        geom = cfg.get("geometry", {})
-        sl = geom.get("speed_lines", {}) or {"A": [[0, 0], [0, 0]], "B": [[0, 1], [0, 1]]}
-        self.A = sl.get("A")
-        self.B = sl.get("B")
+    requires = ("tracks", "trajectories")
+    uses_scene = True
+
+    def __init__(self, cfg, scene=None):
+        # Rectas A y B precompiladas (core/utils/scene.py); sin líneas, el modo
+        # por líneas queda desactivado
+        scene = scene or Scene(cfg)
+        self.A = scene.line("speed_A")
+        self.B = scene.line("speed_B")
 
         scfg = cfg.get("speed", {})
         self.D_pix = float(scfg.get("pixel_distance", 120))
         self.k = float(scfg.get("k_calibration", 0.18))     # m/pixel aprox
         self.limit = float(scfg.get("limit_kmh", 40))        # km/h
+        # Homografía imagen→suelo (metros) y parámetros del modo continuo
+        self.H = homography_from_config(scfg.get("homography"))
+        self.window = int(scfg.get("window_samples", 8))
+        self.min_samples = int(scfg.get("min_samples", 4))
+        self.min_over = int(scfg.get("min_over_frames", 3))
+        self.min_gap = float(scfg.get("min_gap_seconds", 5.0))
+
+        self.tsA = {}          # instante de cruce de A por track_id (modo líneas)
+        self.over = {}         # frames consecutivos sobre el límite (modo homografía)
+        self.last_report = {}  # track_id -> timestamp del último reporte
+
+    def state_dict(self):
+        """Estado mutable por id (para checkpoints)."""
+        return {"tsA": self.tsA, "over": self.over, "last_report": self.last_report}
+
+    def load_state_dict(self, state):
+        self.tsA = dict(state["tsA"])
+        self.over = dict(state.get("over", {}))
+        self.last_report = dict(state.get("last_report", {}))
 
-        self.tsA = {}  # tiempo de cruce por track_id
+    def _report(self, frame, t, ts, logger, v_kmh, method):
+        logger.log(
+            "overspeed",
+            ts,
+            t["id"],
+            t["bbox"],
+            extra={"kmh": round(v_kmh, 1), "metodo": method},
+            frame=frame,
+        )
+        self.last_report[t["id"]] = ts
 
-    def update(self, frame, tracks, ts, logger):
-        # Si no hay líneas válidas, no hacer nada
-        if not (self.A and self.B):
+    def update(self, frame, tracks, ts, logger, inputs):
+        vehicles = [t for t in tracks if t["label"] in ["car", "bus", "truck", "motorbike"]]
+        if not vehicles:
             return
-        for t in tracks:
-            if t["label"] not in ["car", "bus", "truck", "motorbike"]:
+        traj = inputs.get("trajectories")
+        if self.H is not None:
+            self._update_homography(frame, vehicles, ts, logger, traj)
+        elif self.A and self.B:
+            self._update_lines(frame, vehicles, ts, logger, traj)
+
+    def _update_homography(self, frame, vehicles, ts, logger, traj):
+        # Una sola pasada vectorizada para todos los tracks vistos en este frame
+        speeds = traj.speeds(self.H, window=self.window, ts=ts, min_samples=self.min_samples)
+        for t in vehicles:
+            tid = t["id"]
+            if tid not in speeds:
+                continue
+            v_kmh = speeds[tid] * 3.6
+            if v_kmh <= self.limit:
+                self.over[tid] = 0
+                logger.discard("overspeed", tid)
+                continue
+            self.over[tid] = self.over.get(tid, 0) + 1
+            if self.over[tid] >= self.min_over and ts - self.last_report.get(tid, -1e9) >= self.min_gap:
+                self._report(frame, t, ts, logger, v_kmh, "homografia")
+            else:
+                logger.candidate("overspeed", ts, tid, t["bbox"], frame)
+
+    def _update_lines(self, frame, vehicles, ts, logger, traj):
+        for t in vehicles:
+            tid = t["id"]
+            prev, curr = traj.last(tid, 2), traj.last(tid, 1)
+            if prev is None or curr is None:
                 continue
-            # Cruce A
-            if crossed_line(t, self.A[0], self.A[1]) and t["id"] not in self.tsA:
-                self.tsA[t["id"]] = ts
+            (t_prev, c_prev), (t_curr, c_curr) = prev, curr
+            # Cruce A (instante interpolado entre los dos últimos frames)
+            if tid not in self.tsA:
+                if (tA := self.A.crossing_time(c_prev, c_curr, t_prev, t_curr)) is not None:
+                    self.tsA[tid] = tA
             # Cruce B -> medir Δt
-            if crossed_line(t, self.B[0], self.B[1]) and t["id"] in self.tsA:
-                dt = max(1e-6, ts - self.tsA.pop(t["id"]))
-                # v ~ (k * D_pix) / dt  -> m/s
-                v_ms = (self.k * self.D_pix) / dt
-                v_kmh = v_ms * 3.6
-                if v_kmh > self.limit:
-                    logger.log(
-                        "overspeed",
-                        ts,
-                        t["id"],
-                        t["bbox"],
-                        extra={"kmh": round(v_kmh, 1)},
-                        frame=frame,
-                    )
+            if tid in self.tsA:
+                if (tB := self.B.crossing_time(c_prev, c_curr, t_prev, t_curr)) is not None:
+                    dt = max(1e-6, tB - self.tsA.pop(tid))
+                    # v ~ (k * D_pix) / dt  -> m/s
+                    v_kmh = (self.k * self.D_pix) / dt * 3.6
+                    if v_kmh > self.limit:
+                        self._report(frame, t, ts, logger, v_kmh, "lineas")
+                    else:
+                        logger.discard("overspeed", tid)
+                else:
+                    # Entre A y B: tomas candidatas por si resulta exceso
+                    logger.candidate("overspeed", ts, tid, t["bbox"], frame)
@@ -0,0 +1,114 @@
+# Pruebas de la cola SQLite con varios procesos worker compartiendo la base.
+# El Pipeline se sustituye por uno falso (sin modelos ni video): se prueba el
+# reparto de trabajos, los reintentos y la recuperación de leases vencidos.
+#
+#   python -m pytest core/test_worker.py
+
+import json
+import multiprocessing as mp
+import os
+import time
+
+import pytest
+
+from core.job_queue import JobQueue
+from core.worker import QueueWorker
+
+pytestmark = pytest.mark.skipif("fork" not in mp.get_all_start_methods(),
+                                reason="los workers de prueba se lanzan con fork")
+
+
+class FakePipeline:
+    """Sustituto de Pipeline: 'procesa' un video escribiendo una marca por ejecución."""
+
+    def __init__(self, scene):
+        self.out_dir = None
+
+    def reset(self, output_dir=None):
+        self.out_dir = output_dir
+
+    def process_video(self, in_path, out_path, clean_previous=True, cancel_event=None):
+        name = os.path.basename(in_path)
+        runs = os.path.join(self.out_dir, "runs")
+        with open(runs, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        with open(runs) as f:
+            attempt = len(f.readlines())
+        if name.startswith("flaky") and attempt == 1:
+            raise RuntimeError("fallo transitorio")
+        if name.startswith("crash") and attempt == 1:
+            os._exit(1)   # worker caído a mitad del trabajo: su lease vence
+        time.sleep(0.05)
+        return {"events_df": None, "out_path_final": out_path, "frames": 10, "processing_fps": 100.0}
+
+
+def _worker_main(db_path, output_root, worker_id, opts):
+    worker = QueueWorker(db_path, output_root=output_root, worker_id=worker_id,
+                         pipeline_factory=FakePipeline, **opts)
+    worker.run(exit_when_empty=True)
+
+
+def _run_workers(tmp_path, n, **opts):
+    opts = {"lease_seconds": 5.0, "heartbeat_seconds": 0.5, "retry_delay": 0.5, "poll_seconds": 0.2, **opts}
+    ctx = mp.get_context("fork")
+    procs = [ctx.Process(target=_worker_main, args=(str(tmp_path / "jobs.db"), str(tmp_path / "out"), f"w{i}", opts))
+             for i in range(n)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+        assert not p.is_alive(), "un worker no terminó"
+    return procs
+
+
+def _enqueue(tmp_path, names, **kwargs):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    ids = [queue.enqueue(str(tmp_path / name), str(tmp_path / "scene.yaml"), **kwargs) for name in names]
+    return queue, ids
+
+
+def _runs(tmp_path, job_id):
+    with open(tmp_path / "out" / f"job_{job_id:06d}" / "runs") as f:
+        return [line.strip() for line in f]
+
+
+def test_jobs_are_split_across_processes_once_each(tmp_path):
+    queue, ids = _enqueue(tmp_path, [f"video_{i}.mp4" for i in range(12)])
+    _run_workers(tmp_path, 3)
+    assert queue.counts() == {"done": 12}
+    for job_id in ids:
+        assert len(_runs(tmp_path, job_id)) == 1
+    workers = {job["worker"] for job in queue.jobs()}
+    assert len(workers) > 1
+    assert all(json.loads(job["result"])["frames"] == 10 for job in queue.jobs())
+    queue.close()
+
+
+def test_exit_when_empty_waits_for_pending_retry(tmp_path):
+    queue, ids = _enqueue(tmp_path, ["flaky.mp4", "video.mp4"])
+    _run_workers(tmp_path, 2)
+    assert queue.counts() == {"done": 2}
+    flaky = next(job for job in queue.jobs() if job["id"] == ids[0])
+    assert flaky["attempts"] == 2
+    assert len(_runs(tmp_path, ids[0])) == 2
+    queue.close()
+
+
+def test_expired_lease_is_taken_over_by_another_worker(tmp_path):
+    queue, ids = _enqueue(tmp_path, ["crash.mp4"])
+    _run_workers(tmp_path, 2, lease_seconds=1.0, heartbeat_seconds=0.3)
+    job = queue.jobs()[0]
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    first, second = _runs(tmp_path, ids[0])
+    assert first != second   # lo terminó otro proceso
+    queue.close()
+
+
+def test_failed_after_max_attempts(tmp_path):
+    queue, ids = _enqueue(tmp_path, ["flaky.mp4"], max_attempts=1)
+    _run_workers(tmp_path, 2)
+    job = queue.jobs()[0]
+    assert job["status"] == "failed"
+    assert "fallo transitorio" in job["error"]
+    queue.close()
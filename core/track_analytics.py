@@ -0,0 +1,122 @@
+# -----------------------------------------------------------------------------
+# Consultas agregadas sobre la exportación de tracks (core/utils/track_sink.py).
+#
+# Todo se calcula chunk a chunk con NumPy (sólo las columnas necesarias); lo
+# único que se acumula entre chunks son claves únicas o contadores, así que
+# la memoria no depende de la duración del video. El resultado final, ya
+# pequeño, se devuelve como DataFrame.
+#
+#   counts_per_minute(dir)          vehículos distintos por clase y minuto
+#   line_flows(dir, lines)          cruces por línea, clase y sentido
+#   speed_histogram(dir)            distribución de velocidades (si se conocen)
+# -----------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from core.utils.track_sink import iter_track_chunks, read_track_meta
+
+_ID_SPAN = 1 << 31
+
+
+def scene_lines(cfg):
+    """Líneas de la escena {nombre: [[x1,y1],[x2,y2]]}: stop_line, speed_lines, lane_center."""
+    geom = cfg.get("geometry") or {}
+    lines = {}
+    if geom.get("stop_line"):
+        lines["stop_line"] = geom["stop_line"]
+    for name, seg in (geom.get("speed_lines") or {}).items():
+        lines[f"speed_{name}"] = seg
+    if geom.get("lane_center"):
+        lines["lane_center"] = geom["lane_center"]
+    return lines
+
+
+def counts_per_minute(track_dir, bucket_seconds=60.0, labels=None):
+    """
+    Tracks distintos por clase en cada intervalo de `bucket_seconds`.
+    Devuelve DataFrame [minuto, clase, vehiculos] (minuto = inicio del intervalo en min).
+    """
+    names = read_track_meta(track_dir)["labels"]
+    keys = np.empty(0, dtype=np.int64)
+    for ch in iter_track_chunks(track_dir, columns=("ts", "id", "label")):
+        bucket = (ch["ts"] // bucket_seconds).astype(np.int64)
+        k = (bucket * 256 + ch["label"].astype(np.int64)) * _ID_SPAN + ch["id"].astype(np.int64)
+        keys = np.union1d(keys, np.unique(k))
+    group, counts = np.unique(keys // _ID_SPAN, return_counts=True)
+    df = pd.DataFrame({
+        "minuto": (group // 256) * bucket_seconds / 60.0,
+        "clase": [names.get(int(c), str(c)) for c in group % 256],
+        "vehiculos": counts,
+    })
+    if labels is not None:
+        df = df[df["clase"].isin(labels)]
+    return df.reset_index(drop=True)
+
+
+def _crossings(px, py, qx, qy, p1, p2):
+    """Máscara de segmentos (p->q) que cruzan el segmento p1->p2 y su sentido (+1/-1)."""
+    (ax, ay), (bx, by) = p1, p2
+    dx, dy = bx - ax, by - ay
+    s_p = dx * (py - ay) - dy * (px - ax)
+    s_q = dx * (qy - ay) - dy * (qx - ax)
+    # El movimiento debe además dejar p1 y p2 a lados opuestos (cruce dentro del segmento)
+    mx, my = qx - px, qy - py
+    t1 = mx * (ay - py) - my * (ax - px)
+    t2 = mx * (by - py) - my * (bx - px)
+    # Un punto justo sobre la línea cuenta del lado "+" (si no, ese cruce se perdería)
+    hit = ((s_p < 0) != (s_q < 0)) & (t1 * t2 <= 0)
+    return hit, np.where(s_q >= 0, 1, -1)
+
+
+def line_flows(track_dir, lines, max_gap_frames=30):
+    """
+    Cruces de los centros de los tracks sobre cada línea {nombre: [[x1,y1],[x2,y2]]}.
+    Sentido "+" = hacia la derecha de p1->p2 tal como se ve en la imagen (y hacia abajo).
+    Dos muestras del mismo track separadas por más de `max_gap_frames` no se unen.
+    Devuelve DataFrame [linea, clase, sentido, cruces].
+    """
+    names = read_track_meta(track_dir)["labels"]
+    counts = {}
+    carry = None   # última muestra de cada track del chunk anterior
+    cols = ("frame", "id", "label", "cx", "cy")
+    for ch in iter_track_chunks(track_dir, columns=cols):
+        if carry is not None:
+            ch = {c: np.concatenate([carry[c], ch[c]]) for c in cols}
+        # Orden estable por id: las muestras de cada track quedan consecutivas y en orden de frame
+        order = np.argsort(ch["id"], kind="stable")
+        fr, ids, lab = ch["frame"][order], ch["id"][order], ch["label"][order]
+        x, y = ch["cx"][order].astype(np.float64), ch["cy"][order].astype(np.float64)
+        same = (ids[1:] == ids[:-1]) & (fr[1:] - fr[:-1] <= max_gap_frames)
+        for name, (p1, p2) in lines.items():
+            hit, sense = _crossings(x[:-1], y[:-1], x[1:], y[1:], p1, p2)
+            hit &= same
+            for code, s in zip(lab[1:][hit], sense[hit]):
+                key = (name, int(code), "+" if s > 0 else "-")
+                counts[key] = counts.get(key, 0) + 1
+        # Última muestra por track; se descartan tracks sin verse hace más de max_gap_frames
+        last = np.r_[ids[1:] != ids[:-1], True]
+        keep = last & (fr >= fr.max() - max_gap_frames) if fr.size else last
+        carry = {c: ch[c][order][keep] for c in cols}
+    rows = [{"linea": n, "clase": names.get(c, str(c)), "sentido": s, "cruces": k}
+            for (n, c, s), k in sorted(counts.items())]
+    return pd.DataFrame(rows, columns=["linea", "clase", "sentido", "cruces"])
+
+
+def speed_histogram(track_dir, bin_kmh=5.0, max_kmh=150.0):
+    """
+    Histograma de velocidades (km/h) de las muestras con velocidad conocida, por clase.
+    Devuelve DataFrame [clase, desde_kmh, hasta_kmh, muestras] (sólo bins no vacíos).
+    """
+    names = read_track_meta(track_dir)["labels"]
+    edges = np.arange(0.0, max_kmh + bin_kmh, bin_kmh)
+    hist = {}
+    for ch in iter_track_chunks(track_dir, columns=("label", "speed_kmh")):
+        known = ~np.isnan(ch["speed_kmh"])
+        for code in np.unique(ch["label"][known]):
+            sel = known & (ch["label"] == code)
+            h, _ = np.histogram(np.clip(ch["speed_kmh"][sel], 0, max_kmh), bins=edges)
+            hist[int(code)] = hist.get(int(code), 0) + h
+    rows = [{"clase": names.get(c, str(c)), "desde_kmh": edges[i], "hasta_kmh": edges[i + 1], "muestras": int(n)}
+            for c, h in sorted(hist.items()) for i, n in enumerate(h) if n]
+    return pd.DataFrame(rows, columns=["clase", "desde_kmh", "hasta_kmh", "muestras"])
@@ -1,21 +1,189 @@
+import time
+
+import cv2
+import numpy as np
 from deep_sort_realtime.deepsort_tracker import DeepSort
 
+
+def _iou_matrix(a, b):
+    """IoU entre cada caja de `a` (N,4) y de `b` (M,4), formato x1,y1,x2,y2."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0]); iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2]); iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
 class DeepSortWrapper:
-    def __init__(self, max_age=15):
+    """
+    DeepSORT con el embedding de apariencia controlado por el wrapper:
+      - Todos los recortes del frame se redimensionan una sola vez a la
+        entrada del embedder y se infieren en UNA llamada (lote).
+      - Si una detección coincide sin ambigüedad por IoU (≥ reuse_iou con un
+        track del frame anterior y < ambiguity_iou con cualquier otro) se
+        reutiliza el embedding de ese track hasta `reuse_frames` frames
+        seguidos; en oclusiones y cruces se vuelve a calcular.
+      - last_embed_seconds / last_embed_count / last_embed_reused exponen el
+        coste del último frame (y embed_seconds / embed_count los totales).
+    Con reuse_frames=0 se calcula el embedding de todas las detecciones.
+    """
+
+    def __init__(self, max_age=15, reuse_frames=5, reuse_iou=0.6, ambiguity_iou=0.3):
         self.trk = DeepSort(max_age=max_age)
+        self.reuse_frames = int(reuse_frames)
+        self.reuse_iou = float(reuse_iou)
+        self.ambiguity_iou = float(ambiguity_iou)
+        # track_id -> {"bbox", "embed", "age"} del último frame en que se actualizó
+        self._embeds = {}
+        self._batch = None
+        self.last_embed_seconds = 0.0
+        self.last_embed_count = 0
+        self.last_embed_reused = 0
+        self.embed_seconds = 0.0
+        self.embed_count = 0
+
+    @classmethod
+    def from_config(cls, tcfg, max_age=15):
+        tcfg = tcfg or {}
+        return cls(max_age=tcfg.get("max_age", max_age),
+                   reuse_frames=tcfg.get("embed_reuse_frames", 5),
+                   reuse_iou=tcfg.get("embed_reuse_iou", 0.6),
+                   ambiguity_iou=tcfg.get("embed_ambiguity_iou", 0.3))
+
+    def state_dict(self):
+        """
+        Estado serializable del tracker (tracks, filtros de Kalman, galería de
+        apariencia y contador de ids). El embedder no se incluye: se reconstruye.
+        """
+        return {"tracker": self.trk.tracker, "embeds": self._embeds}
+
+    def load_state_dict(self, state):
+        self.trk.tracker = state["tracker"]
+        self._embeds = dict(state.get("embeds", {}))
+
+    def cached_embeddings(self):
+        """Embeddings de apariencia guardados para reutilizar (telemetría)."""
+        return len(self._embeds)
+
+    def reset(self):
+        """Olvida todos los tracks (ids desde 1) sin recargar el embedder."""
+        self.trk.delete_all_tracks()
+        self.trk.tracker.metric.samples = {}
+        self._embeds = {}
+
+    def _embed_crops(self, frame, boxes):
+        """Embeddings de los recortes `boxes` (x1,y1,x2,y2) en una sola inferencia."""
+        emb = self.trk.embedder
+        H, W = frame.shape[:2]
+        crops = []
+        for x1, y1, x2, y2 in boxes:
+            # Mismo recorte que DeepSort.crop_bb (enteros y recortado al frame)
+            l, t = int(x1), int(y1)
+            r, b = l + int(x2 - x1), t + int(y2 - y1)
+            crop = frame[max(0, t):min(H, b), max(0, l):min(W, r)]
+            crops.append(crop if crop.size else frame[:1, :1])
+        from deep_sort_realtime.embedder.embedder_pytorch import MobileNetv2_Embedder, INPUT_WIDTH
+        if not isinstance(emb, MobileNetv2_Embedder):
+            # Otros embedders (torchreid, clip...): su predict ya procesa en lote
+            return list(emb.predict(crops))
+
+        import torch
+        model, size = emb.model, INPUT_WIDTH
+        # MobileNetV2: resize una vez a la entrada, sobre un lote preasignado
+        n = len(crops)
+        if self._batch is None or self._batch.shape[0] < n:
+            self._batch = np.empty((max(n, 16), size, size, 3), dtype=np.uint8)
+        batch = self._batch[:n]
+        for i, crop in enumerate(crops):
+            cv2.resize(crop, (size, size), dst=batch[i])
+        if emb.bgr:
+            batch = batch[..., ::-1]
+        x = torch.from_numpy(np.ascontiguousarray(batch)).permute(0, 3, 1, 2).float().div_(255.0)
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+        x = (x - mean) / std
+        if emb.gpu:
+            x = x.cuda()
+            if emb.half:
+                x = x.half()
+        with torch.no_grad():
+            return list(model.forward(x).float().cpu().numpy())
+
+    def _embeddings(self, frame, boxes):
+        """Embedding por detección: reutilizado si el emparejamiento es claro, si no calculado."""
+        n = len(boxes)
+        embeds, fresh = [None] * n, [True] * n
+        if self.reuse_frames > 0 and self._embeds and n:
+            tids = list(self._embeds)
+            iou = _iou_matrix(boxes, [self._embeds[t]["bbox"] for t in tids])
+            for i in range(n):
+                j = int(np.argmax(iou[i]))
+                if iou[i, j] < self.reuse_iou:
+                    continue
+                # Ambigüedad: otro track cerca de esta detección u otra detección cerca de ese track
+                row = np.delete(iou[i], j)
+                col = np.delete(iou[:, j], i)
+                if (row.size and row.max() >= self.ambiguity_iou) or (col.size and col.max() >= self.ambiguity_iou):
+                    continue
+                cached = self._embeds[tids[j]]
+                if cached["age"] < self.reuse_frames:
+                    embeds[i], fresh[i] = cached["embed"], False
+
+        todo = [i for i in range(n) if fresh[i]]
+        t0 = time.perf_counter()
+        if todo:
+            for i, e in zip(todo, self._embed_crops(frame, [boxes[i] for i in todo])):
+                embeds[i] = e
+        self.last_embed_seconds = time.perf_counter() - t0
+        self.last_embed_count = len(todo)
+        self.last_embed_reused = n - len(todo)
+        self.embed_seconds += self.last_embed_seconds
+        self.embed_count += len(todo)
+        return embeds, fresh
 
     def update(self, dets, frame):
         """
         dets: [{"bbox":[x1,y1,x2,y2], "conf":..., "label": str}, ...]
         retorna tracks: [{"id":int,"bbox":[...],"label":str,"prev_center":(x,y)}]
         """
+        # DeepSort descarta cajas vacías DESPUÉS de recibir los embeddings: se
+        # filtran aquí para que detecciones, embeddings y `others` coincidan
+        dets = [d for d in dets if d["bbox"][2] > d["bbox"][0] and d["bbox"][3] > d["bbox"][1]]
         bbs = []
         for d in dets:
             x1,y1,x2,y2 = d["bbox"]
             w,h = x2-x1, y2-y1
             bbs.append(([x1,y1,w,h], d["conf"], d["label"]))
-        tracks = self.trk.update_tracks(bbs, frame=frame)
+        boxes = [d["bbox"] for d in dets]
+        embeds, fresh = self._embeddings(frame, boxes)
+        # others: índice de la detección para saber qué embedding recibió cada track
+        tracks = self.trk.update_tracks(bbs, embeds=embeds, frame=frame,
+                                        others=[(i, fresh[i]) for i in range(len(dets))])
+
+        embeds_next = {}
+        for t in tracks:
+            if t.time_since_update == 0 and (sup := t.get_det_supplementary()) is not None:
+                i, was_fresh = sup
+                prev = self._embeds.get(t.track_id)
+                age = 0 if was_fresh or prev is None else prev["age"] + 1
+                embeds_next[t.track_id] = {"bbox": list(boxes[i]), "embed": embeds[i], "age": age}
+        self._embeds = embeds_next
+        return self._output(tracks)
+
+    def predict(self):
+        """
+        Frame sin detecciones (p.ej. stride de detección del control de
+        calidad): sólo avanza el filtro de Kalman. A diferencia de update([]),
+        no cuenta como frame perdido, así que los tracks tentativos no se borran.
+        """
+        self.trk.tracker.predict()
+        return self._output(self.trk.tracker.tracks)
 
+    @staticmethod
+    def _output(tracks):
         out = []
         for t in tracks:
             if not t.is_confirmed(): continue
@@ -24,5 +192,4 @@ class DeepSortWrapper:
             # Guarda centro previo para cruce de líneas
             c = ((l+r)/2.0, (t_+b)/2.0)
             t._prev_center = c
-            out[-1]["prev_center"] = getattr(t, "_prev_center", None)
-        return out
\ No newline at end of file
+        return out
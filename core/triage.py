@@ -0,0 +1,167 @@
+# -----------------------------------------------------------------------------
+# Modo de dos pasadas "triage -> análisis" para videos con poca actividad.
+#
+#   1) Triage: detector barato (imgsz bajo, un frame cada `stride_frames`,
+#      sólo keyframes si el lector es PyAV) buscando vehículos cuyo centro
+#      cae en las zonas de la escena: no_cross_polygon o a menos de
+#      `line_margin_px` de la stop line / líneas de velocidad.
+#   2) Los instantes con actividad se convierten en intervalos con margen
+#      (`pad_seconds`) y se fusionan los cercanos (`merge_gap_seconds`).
+#   3) Análisis: el pipeline completo sólo sobre esos intervalos (un
+#      Pipeline por intervalo con tracker y reglas nuevos, modelos
+#      compartidos). Los CSV se fusionan en <output_dir>/events.csv con IDs
+#      globales, igual que en core/parallel.py.
+#
+# El resultado informa qué fracción del video se omitió.
+# -----------------------------------------------------------------------------
+
+import logging
+import os
+import time
+
+from core.parallel import merge_segment_events
+from core.utils.buffer_pool import BufferPool
+from core.utils.geometry import center_of
+from core.utils.scene import Scene
+from core.utils.video_io import open_video_reader, video_frame_count, release_safely, reader_options
+
+log = logging.getLogger(__name__)
+
+VEHICLE_LABELS = ("car", "bus", "truck", "motorbike")
+
+
+def _in_scene_regions(points, scene, margin, size):
+    """True si algún punto cae en el polígono o a menos de `margin` px de una línea."""
+    if not points:
+        return False
+    poly = scene.polygon("no_cross_polygon")
+    if poly is not None and poly.contains(points, size).any():
+        return True
+    lines = [ln for name, ln in scene.lines.items() if name == "stop_line" or name.startswith("speed_")]
+    return any((ln.distance(points) <= margin).any() for ln in lines)
+
+
+def merge_intervals(times, pad_s, merge_gap_s, sample_s, start_s=0.0, end_s=None):
+    """Instantes con actividad -> lista ordenada de intervalos [(s0, s1)] con margen y fusionados."""
+    intervals = []
+    for t in sorted(times):
+        s0 = max(start_s, t - pad_s)
+        s1 = t + sample_s + pad_s
+        if end_s is not None:
+            s1 = min(end_s, s1)
+        if intervals and s0 - intervals[-1][1] <= merge_gap_s:
+            intervals[-1] = (intervals[-1][0], max(intervals[-1][1], s1))
+        else:
+            intervals.append((s0, s1))
+    return intervals
+
+
+def find_activity_intervals(cfg, in_path, detector=None):
+    """
+    Primera pasada barata. Devuelve {"intervals", "duration_s", "samples",
+    "seconds"}; los parámetros salen de la sección `triage:` de la escena.
+    """
+    tcfg = cfg.get("triage") or {}
+    if detector is None:
+        from core.detectors.yolo_detector import YoloDetector
+        detector = YoloDetector(model_path=cfg["models"]["yolo_path"],
+                                imgsz=tcfg.get("imgsz", 320),
+                                conf=tcfg.get("conf", cfg["yolo"]["conf"]))
+    labels = set(tcfg.get("labels") or VEHICLE_LABELS)
+    margin = float(tcfg.get("line_margin_px", 60))
+    scene = Scene(cfg)
+
+    opts = reader_options(cfg)
+    opts["keyframes_only"] = tcfg.get("keyframes_only", True) and opts["backend"] == "pyav"
+    t0 = time.perf_counter()
+    cap, w, h, fps = open_video_reader(in_path, **opts)
+    buf = BufferPool().get("decode", (h, w, 3))
+    duration_s = video_frame_count(cap) / fps
+    # Muestreo por tiempo: vale igual para todos los frames o sólo keyframes
+    sample_s = max(1, int(tcfg.get("stride_frames", 10))) / fps
+    next_sample, samples, active = 0.0, 0, []
+    try:
+        while cap.grab():
+            ts = cap.timestamp
+            if ts + 1e-6 < next_sample:
+                continue
+            ok, frame = cap.retrieve(buf)  # sólo se convierte el frame muestreado
+            if not ok:
+                break
+            next_sample = ts + sample_s
+            samples += 1
+            centers = [center_of(d["bbox"]) for d in detector.infer(frame) if d["label"] in labels]
+            if _in_scene_regions(centers, scene, margin, (w, h)):
+                active.append(ts)
+    finally:
+        release_safely(cap)
+    duration_s = max(duration_s, (cap.timestamp or 0.0) + 1.0 / fps)
+    intervals = merge_intervals(active, float(tcfg.get("pad_seconds", 3.0)),
+                                float(tcfg.get("merge_gap_seconds", 2.0)), sample_s, end_s=duration_s)
+    return {"intervals": intervals, "duration_s": duration_s, "fps": fps, "samples": samples,
+            "seconds": time.perf_counter() - t0}
+
+
+def process_video_triage(scene_config_path, in_path, out_path, output_dir=None,
+                         yolo_imgsz=None, yolo_conf=None, cancel_event=None):
+    """
+    Triage + análisis completo sólo en los intervalos con actividad.
+    Cada intervalo escribe en <output_dir>/segments/int_XXX/ y su video
+    anotado '<salida>_intXXX.<ext>'. Devuelve un dict análogo a
+    Pipeline.process_video() con 'events_df' fusionado, 'intervals' y
+    'skipped_fraction'.
+    """
+    from core.pipeline import Pipeline, _load_config, _clean_previous_outputs, load_models
+
+    cfg = _load_config(scene_config_path)
+    if yolo_imgsz: cfg["yolo"]["imgsz"] = yolo_imgsz
+    if yolo_conf:  cfg["yolo"]["conf"]  = yolo_conf
+    output_dir = output_dir or cfg["video"]["output_dir"]
+
+    t0 = time.perf_counter()
+    tri = find_activity_intervals(cfg, in_path)
+    intervals, duration_s = tri["intervals"], tri["duration_s"]
+    active_s = sum(s1 - s0 for s0, s1 in intervals)
+    skipped = 1.0 - active_s / duration_s if duration_s > 0 else 0.0
+    log.info(f"{tri['samples']} muestras en {tri['seconds']:.1f}s -> {len(intervals)} intervalos, "
+             f"{active_s:.1f}s de {duration_s:.1f}s ({skipped:.1%} del video omitido)")
+
+    _clean_previous_outputs(output_dir, os.path.join(output_dir, "evidence"))
+    models = load_models(cfg) if intervals else None
+    base, ext = os.path.splitext(out_path)
+    results, cancelled = [], False
+    for i, (s0, s1) in enumerate(intervals):
+        if cancel_event is not None and cancel_event.is_set():
+            cancelled = True
+            break
+        # Pipeline nuevo por intervalo: tracker y reglas no arrastran estado a través del hueco
+        pipe = Pipeline(scene_config_path, yolo_imgsz=yolo_imgsz, yolo_conf=yolo_conf,
+                        output_dir=os.path.join(output_dir, "segments", f"int_{i:03d}"), models=models)
+        res = pipe.process_video(in_path, f"{base}_int{i:03d}{ext}", clean_previous=True,
+                                 start_s=s0, end_s=s1, cancel_event=cancel_event)
+        results.append({
+            "segment": {"index": i, "start_s": s0, "end_s": s1, "warmup_s": s0},
+            "csv_path": pipe.logger.csv_path,
+            "out_path_final": res.get("out_path_final"),
+            "frames": res.get("frames", 0),
+            "processing_seconds": res.get("processing_seconds", 0.0),
+            "seam_tracks": {"head": {}, "tail": {}},
+        })
+        cancelled = bool(res.get("cancelled"))
+
+    os.makedirs(output_dir, exist_ok=True)
+    # Los intervalos no se solapan: sin costuras ni duplicados que eliminar
+    df = merge_segment_events(results, os.path.join(output_dir, "events.csv"), dedupe_window_s=0.0)
+    secs = max(1e-9, time.perf_counter() - t0)
+    frames = sum(r["frames"] - int(round(r["segment"]["start_s"] * tri["fps"])) for r in results)
+    return {
+        "events_df": df,
+        "out_path_final": [r["out_path_final"] for r in results],
+        "processing_seconds": secs,
+        "processing_fps": frames / secs,
+        "intervals": intervals,
+        "duration_s": duration_s,
+        "skipped_fraction": skipped,
+        "cancelled": cancelled,
+        "segments": [{k: v for k, v in r.items() if k != "seam_tracks"} for r in results],
+    }
@@ -0,0 +1,45 @@
+"""Arrays preasignados y reutilizables entre frames.
+
+En un video largo, cada frame pedía memoria nueva para la decodificación y
+para los intermedios del detector de carriles (gris, blur, bordes, máscara
+ROI). Con BufferPool esos arrays se crean una sola vez por (nombre, forma,
+dtype) y se reescriben en cada frame (`dst=` de OpenCV, cap.read(image=...)),
+lo que evita la rotación del asignador y estabiliza la latencia.
+
+Las máscaras estáticas (p.ej. la ROI de carriles) se construyen una vez por
+resolución con `static()`.
+
+Ojo: el contenido de un buffer sólo es válido hasta el siguiente frame;
+quien necesite conservarlo debe copiarlo.
+"""
+
+import numpy as np
+
+
+class BufferPool:
+    def __init__(self):
+        self._bufs = {}
+        self._static = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Buffer reutilizable (contenido indefinido) para `name` con esa forma y dtype."""
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        buf = self._bufs.get(key)
+        if buf is None:
+            # Si cambia la resolución se descarta el buffer anterior del mismo nombre
+            for k in [k for k in self._bufs if k[0] == name]:
+                del self._bufs[k]
+            buf = self._bufs[key] = np.empty(shape, dtype=dtype)
+        return buf
+
+    def static(self, name, shape, build):
+        """Array constante por resolución: build(shape) se llama una sola vez por forma."""
+        key = (name, tuple(shape))
+        arr = self._static.get(key)
+        if arr is None:
+            arr = self._static[key] = build(tuple(shape))
+            arr.setflags(write=False)
+        return arr
+
+    def nbytes(self):
+        return sum(b.nbytes for b in self._bufs.values()) + sum(a.nbytes for a in self._static.values())
@@ -0,0 +1,60 @@
+"""Checkpoints del análisis de video para poder reanudar ejecuciones largas.
+
+Un checkpoint es un pickle con el offset de frame, el estado del tracker, el
+estado de cada regla y la posición del EventLogger. Se escribe de forma
+atómica (archivo temporal + os.replace) para que un kill a mitad de escritura
+nunca deje un checkpoint corrupto.
+"""
+
+import logging
+import os
+import pickle
+
+log = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_NAME = "checkpoint.pkl"
+
+
+def checkpoint_path(output_dir: str) -> str:
+    return os.path.join(output_dir, CHECKPOINT_NAME)
+
+
+def video_fingerprint(path: str) -> dict:
+    """Identifica el video de entrada (ruta absoluta + tamaño) para no reanudar otro."""
+    size = os.path.getsize(path) if os.path.isfile(path) else None  # streams: sin tamaño
+    return {"path": os.path.abspath(path), "size": size}
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": CHECKPOINT_VERSION, **state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str, in_path: str) -> dict | None:
+    """Devuelve el checkpoint si existe y corresponde a `in_path`; si no, None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except Exception as e:
+        log.warning(f"No se pudo leer {path}: {e}")
+        return None
+    if state.get("version") != CHECKPOINT_VERSION:
+        log.warning(f"Versión incompatible en {path}; se ignora")
+        return None
+    if state.get("video") != video_fingerprint(in_path):
+        log.warning(f"{path} corresponde a otro video; se ignora")
+        return None
+    return state
+
+
+def remove_checkpoint(path: str) -> None:
+    for p in (path, f"{path}.tmp"):
+        if os.path.exists(p):
+            os.remove(p)
@@ -0,0 +1,144 @@
+# -----------------------------------------------------------------------------
+# ClipRecorder: clips de video pre/post evento desde un ring buffer en memoria.
+# - Cada frame (ya anotado) se comprime a JPEG en memoria y entra a un ring
+#   buffer acotado por tiempo (pre_seconds) y por tamaño (max_buffer_mb).
+# - request(ts) abre un clip [ts - pre, ts + post] con los frames ya
+#   almacenados; los siguientes frames se van anexando hasta cubrir el "post".
+# - Eventos cercanos cuyo intervalo se solapa con un clip abierto lo extienden
+#   en lugar de crear otro (un solo archivo para varias infracciones), hasta
+#   `max_clip_seconds`; pasado el tope se abre un clip nuevo.
+# - max_buffer_mb cuenta el ring Y los frames retenidos por clips abiertos;
+#   si sólo los clips lo exceden, se cierra antes el más antiguo.
+# - La escritura (decodificar + codificar video) ocurre en un hilo aparte.
+# No vuelve a leer la fuente: funciona igual con streams en vivo.
+# -----------------------------------------------------------------------------
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from core.utils.video_io import open_video_writer
+
+log = logging.getLogger(__name__)
+
+
+class ClipRecorder:
+    def __init__(self, clips_dir, fps, size, pre_seconds=3.0, post_seconds=2.0,
+                 jpeg_quality=80, max_buffer_mb=256, max_clip_seconds=30.0):
+        self.clips_dir = clips_dir
+        self.fps = float(fps)
+        self.size = tuple(size)
+        self.pre = float(pre_seconds)
+        self.post = float(post_seconds)
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        self.max_bytes = int(max_buffer_mb * 1024 * 1024)
+        self.max_clip = max(float(max_clip_seconds), self.pre + self.post)
+
+        self._ring = deque()   # (ts, jpeg_bytes)
+        self._ring_bytes = 0
+        self._open = []        # clips pendientes: {"start", "end", "path", "frames", "bytes"}
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-writer")
+        os.makedirs(self.clips_dir, exist_ok=True)
+        self._ext = self._probe_extension()
+
+    @classmethod
+    def from_config(cls, clips_dir, fps, size, cfg):
+        return cls(
+            clips_dir, fps, size,
+            pre_seconds=cfg.get("pre_seconds", 3.0),
+            post_seconds=cfg.get("post_seconds", 2.0),
+            jpeg_quality=cfg.get("jpeg_quality", 80),
+            max_buffer_mb=cfg.get("max_buffer_mb", 256),
+            max_clip_seconds=cfg.get("max_clip_seconds", 30.0),
+        )
+
+    def _probe_extension(self):
+        """
+        open_video_writer() puede cambiar la extensión según el códec disponible.
+        Se prueba una vez para conocer la ruta final antes de escribir el clip
+        (la ruta se registra en el CSV en el momento del evento).
+        """
+        probe = os.path.join(self.clips_dir, "_probe.mp4")
+        writer, final = open_video_writer(probe, self.fps, self.size)
+        writer.release()
+        if os.path.exists(final):
+            os.remove(final)
+        return os.path.splitext(final)[1]
+
+    def push(self, frame, ts):
+        """Añade el frame actual al ring buffer y a los clips abiertos que lo cubren."""
+        ok, buf = cv2.imencode(".jpg", frame, self.params)
+        if not ok:
+            return
+        data = buf.tobytes()
+        self._ring.append((ts, data))
+        self._ring_bytes += len(data)
+
+        still_open = []
+        for clip in self._open:
+            if clip["start"] <= ts <= clip["end"]:
+                clip["frames"].append(data)
+                clip["bytes"] += len(data)
+            if ts >= clip["end"]:
+                self._submit(clip)
+            else:
+                still_open.append(clip)
+        self._open = still_open
+
+        # Límite de RAM: ring + clips abiertos (cota superior: los frames
+        # compartidos entre ring y clip se cuentan dos veces)
+        clip_bytes = sum(clip["bytes"] for clip in self._open)
+        while self._open and clip_bytes > self.max_bytes:
+            clip = self._open.pop(0)
+            log.warning(f"Clip {clip['path']} cerrado antes de tiempo: supera max_buffer_mb")
+            clip_bytes -= clip["bytes"]
+            self._submit(clip)
+        # Expulsa lo que ya no sirve como "pre" o excede el límite de RAM
+        while self._ring and (ts - self._ring[0][0] > self.pre or self._ring_bytes + clip_bytes > self.max_bytes):
+            self._ring_bytes -= len(self._ring.popleft()[1])
+
+    def request(self, ts, name):
+        """Pide un clip alrededor de `ts`; devuelve la ruta (compartida si se fusiona)."""
+        start, end = ts - self.pre, ts + self.post
+        for clip in self._open:
+            # Se fusiona sólo si el clip resultante no supera max_clip_seconds
+            if start <= clip["end"] and end - clip["start"] <= self.max_clip:
+                clip["end"] = max(clip["end"], end)
+                return clip["path"]
+        path = os.path.join(self.clips_dir, f"{name}{self._ext}").replace("\\", "/")
+        frames = [data for t, data in self._ring if t >= start]
+        self._open.append({"start": start, "end": end, "path": path, "frames": frames,
+                           "bytes": sum(map(len, frames))})
+        return path
+
+    def _submit(self, clip):
+        self._futures = [f for f in self._futures if not f.done()]
+        self._futures.append(self._pool.submit(self._write_clip, clip["path"], clip["frames"]))
+
+    def _write_clip(self, path, frames):
+        writer, _ = open_video_writer(path, self.fps, self.size)
+        try:
+            for data in frames:
+                img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if img is not None:
+                    writer.write(img)
+        finally:
+            writer.release()
+
+    def close(self):
+        """Escribe los clips abiertos con lo disponible y espera a que terminen."""
+        for clip in self._open:
+            self._submit(clip)
+        self._open = []
+        self._pool.shutdown(wait=True)
+        for f in self._futures:
+            if exc := f.exception():
+                log.error(f"Error escribiendo clip: {exc}")
+        self._futures = []
+        self._ring.clear()
+        self._ring_bytes = 0
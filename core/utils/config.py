@@ -0,0 +1,108 @@
+# Carga de configuración YAML de escena (con `include:` de otras configs).
+# Sin dependencias pesadas: lo usan también procesos que no cargan modelos
+# (replay de reglas, ver core/replay.py).
+#
+# - `include:` (ruta o lista de rutas) se resuelve de forma recursiva; cada
+#   ruta se busca tal cual (relativa al directorio de trabajo) y, si no
+#   existe, relativa al YAML que la incluye.
+# - Los includes se combinan en orden y el archivo actual va encima, con
+#   mezcla profunda: una escena que fija sólo `helmet.min_gap_seconds` conserva
+#   el resto del bloque `helmet:` de la base. Las listas se reemplazan enteras.
+# - La config resultante se valida (validate_config) antes de devolverse.
+import os
+
+import yaml
+
+
+def deep_merge(base, override):
+    """Copia de `base` con `override` encima; los dicts se mezclan por clave."""
+    out = dict(base)
+    for k, v in override.items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = deep_merge(out[k], v)
+        else:
+            out[k] = v
+    return out
+
+
+def _resolve_include(ref, including_path):
+    if os.path.exists(ref):
+        return ref
+    rel = os.path.join(os.path.dirname(including_path), ref)
+    return rel if os.path.exists(rel) else ref
+
+
+def _load(path, stack, sources):
+    key = os.path.abspath(path)
+    if key in stack:
+        raise ValueError(f"include circular: {' -> '.join(stack + [key])}")
+    with open(path, 'r') as f:
+        cfg = yaml.safe_load(f) or {}
+    sources.append(path)
+    includes = cfg.pop("include", None) or []
+    if isinstance(includes, str):
+        includes = [includes]
+    merged = {}
+    for ref in includes:
+        merged = deep_merge(merged, _load(_resolve_include(ref, path), stack + [key], sources))
+    return deep_merge(merged, cfg)
+
+
+def load_config(path, validate=True):
+    cfg, _ = load_config_with_sources(path, validate=validate)
+    return cfg
+
+
+def load_config_with_sources(path, validate=True):
+    """(cfg, [archivos leídos]) — la lista sirve para vigilar cambios (hot reload)."""
+    sources = []
+    cfg = _load(path, [], sources)
+    if validate:
+        validate_config(cfg, path)
+    return cfg, sources
+
+
+def _is_point(p):
+    return isinstance(p, (list, tuple)) and len(p) == 2 and all(isinstance(v, (int, float)) for v in p)
+
+
+def _check_segment(errors, name, seg):
+    if not (isinstance(seg, (list, tuple)) and len(seg) == 2 and all(map(_is_point, seg))):
+        errors.append(f"{name}: se esperaba [[x1, y1], [x2, y2]]")
+    elif list(seg[0]) == list(seg[1]):
+        errors.append(f"{name}: los dos extremos son el mismo punto")
+
+
+def validate_config(cfg, path="<config>"):
+    """
+    Comprueba tipos y forma de lo que use el pipeline (sólo de las secciones
+    presentes). Lanza ValueError con todos los problemas encontrados a la vez.
+    """
+    errors = []
+    for section in ("video", "yolo", "models", "rules", "geometry"):
+        if section in cfg and not isinstance(cfg[section], (dict, type(None))):
+            errors.append(f"{section}: debe ser un diccionario")
+    yolo = cfg.get("yolo") or {}
+    if "imgsz" in yolo and not (isinstance(yolo["imgsz"], int) and yolo["imgsz"] > 0):
+        errors.append("yolo.imgsz: debe ser un entero positivo")
+    if "conf" in yolo and not (isinstance(yolo["conf"], (int, float)) and 0 <= yolo["conf"] <= 1):
+        errors.append("yolo.conf: debe estar entre 0 y 1")
+
+    geom = cfg.get("geometry") if isinstance(cfg.get("geometry"), dict) else {}
+    for name in ("stop_line", "lane_center"):
+        if geom.get(name) is not None:
+            _check_segment(errors, f"geometry.{name}", geom[name])
+    lines = geom.get("speed_lines")
+    if lines is not None:
+        if not isinstance(lines, dict):
+            errors.append("geometry.speed_lines: debe ser {nombre: [[x1, y1], [x2, y2]]}")
+        else:
+            for name, seg in lines.items():
+                _check_segment(errors, f"geometry.speed_lines.{name}", seg)
+    for name, poly in geom.items():
+        if name.endswith("_polygon") and poly is not None:
+            if not (isinstance(poly, (list, tuple)) and len(poly) >= 3 and all(map(_is_point, poly))):
+                errors.append(f"geometry.{name}: se esperan al menos 3 puntos [x, y]")
+
+    if errors:
+        raise ValueError(f"Config inválida ({path}):\n  - " + "\n  - ".join(errors))
@@ -14,20 +14,106 @@ def draw_line(frame, p1, p2, color=YELLOW, thickness=2):
     cv2.line(frame, tuple(p1), tuple(p2), color, thickness)
 
 def draw_polygon(frame, poly, color=CYAN, thickness=2):
-    pts = [tuple(map(int, p)) for p in poly]
-    cv2.polylines(frame, [cv2.UMat(pts).get() if hasattr(cv2, 'UMat') else 
-                          cv2.convexHull(cv2.UMat(pts)).get() if False else 
-                          cv2.UMat(pts).get() if False else 
-                          None], False, color, thickness)
-    # versión simple:
-    cv2.polylines(frame, [cv2.UMat(pts).get() if False else 
-                          (cv2.UMat(pts).get() if False else 
-                           (cv2.UMat(pts).get() if False else None))], False, color, thickness)
-    # fallback sencillo (sin UMat):
-    try:
-        cv2.polylines(frame, [np.array(pts, dtype='int32')], True, color, thickness)
-    except Exception as e:
-        print(f"Error dibujando polígono: {e}")
+    pts = np.asarray(poly, dtype=np.int32).reshape(-1, 1, 2)
+    cv2.polylines(frame, [pts], True, color, thickness)
 
 def draw_hud(frame, text, x=10, y=20, color=WHITE):
-    cv2.putText(frame, text, (x,y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
\ No newline at end of file
+    cv2.putText(frame, text, (x,y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+
+class OverlayRenderer:
+    """
+    Overlays del video anotado con coste por frame plano:
+      - La geometría de la escena (stop line, líneas de velocidad, polígono)
+        se dibuja UNA vez en una capa con su máscara; por frame se compone
+        con cv2.copyTo enmascarado sobre los rectángulos que la contienen
+        (sin rasterizar líneas ni polígonos de nuevo).
+      - El texto de cada track se rasteriza una vez por (id, etiqueta) y se
+        pega como sprite (putText es de lo más caro del overlay).
+      - Salida a resolución reducida: el frame se reescala una vez a
+        `out_size` en un buffer reutilizado y se dibuja ya sobre él.
+    """
+
+    MAX_LABELS = 512
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+    def __init__(self, geometry, in_size, out_size=None):
+        self.in_size = tuple(in_size)
+        self.out_size = tuple(out_size or in_size)
+        self.sx = self.out_size[0] / self.in_size[0]
+        self.sy = self.out_size[1] / self.in_size[1]
+        self._resized = None
+        self._labels = {}
+        self._build_static(geometry or {})
+
+    def _scale_pts(self, pts):
+        return [(int(round(x * self.sx)), int(round(y * self.sy))) for x, y in pts]
+
+    def _build_static(self, geom):
+        w, h = self.out_size
+        layer = np.zeros((h, w, 3), dtype=np.uint8)
+        mask = np.zeros((h, w), dtype=np.uint8)
+        if poly := geom.get("no_cross_polygon"):
+            pts = self._scale_pts(poly)
+            draw_polygon(layer, pts, color=CYAN)
+            draw_polygon(mask, pts, color=255)
+        lines = [(geom.get("stop_line"), RED)]
+        lines += [(ln, CYAN) for ln in (geom.get("speed_lines") or {}).values()]
+        for ln, color in lines:
+            if ln:
+                p1, p2 = self._scale_pts(ln)
+                draw_line(layer, p1, p2, color=color)
+                draw_line(mask, p1, p2, color=255)
+        # Un parche (rectángulo + máscara) por componente conexa de la capa:
+        # sólo se tocan los píxeles cercanos a la geometría
+        self._patches = []
+        n, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        for x, y, bw, bh, _ in stats[1:n]:
+            roi = (slice(y, y + bh), slice(x, x + bw))
+            self._patches.append((roi, layer[roi].copy(), mask[roi].copy()))
+
+    def _label_sprite(self, track):
+        key = (track["id"], track["label"])
+        sprite = self._labels.get(key)
+        if sprite is None:
+            if len(self._labels) >= self.MAX_LABELS:
+                self._labels.clear()
+            text = f"ID {track['id']} {track['label']}"
+            (tw, th), base = cv2.getTextSize(text, self.FONT, 0.5, 1)
+            img = np.zeros((th + base, tw, 3), dtype=np.uint8)
+            cv2.putText(img, text, (0, th), self.FONT, 0.5, GREEN, 1)
+            mask = (img.max(axis=2) > 0).astype(np.uint8)
+            sprite = self._labels[key] = (img, mask, th)
+        return sprite
+
+    def _paste(self, dst, sprite, x, y):
+        img, mask, th = sprite
+        sh, sw = mask.shape
+        y0 = y - th  # (x, y) es la línea base, como en putText
+        h, w = dst.shape[:2]
+        if x >= 0 and y0 >= 0 and x + sw <= w and y0 + sh <= h:
+            cv2.copyTo(img, mask, dst[y0:y0 + sh, x:x + sw])
+            return
+        # Recorte en los bordes del frame
+        x0, y0c, x1, y1 = max(0, x), max(0, y0), min(w, x + sw), min(h, y0 + sh)
+        if x1 > x0 and y1 > y0c:
+            sub = (slice(y0c - y0, y1 - y0), slice(x0 - x, x1 - x))
+            cv2.copyTo(img[sub], mask[sub], dst[y0c:y1, x0:x1])
+
+    def render(self, frame, tracks, hud_text=None):
+        """Devuelve el frame anotado (el mismo `frame` si no hay reescalado)."""
+        if self.out_size != self.in_size:
+            self._resized = cv2.resize(frame, self.out_size, dst=self._resized, interpolation=cv2.INTER_AREA)
+            frame = self._resized
+        for roi, layer, mask in self._patches:
+            cv2.copyTo(layer, mask, frame[roi])  # escribe en sitio sobre la vista
+        for t in tracks:
+            x1, y1, x2, y2 = t["bbox"]
+            x1, x2 = int(x1 * self.sx), int(x2 * self.sx)
+            y1, y2 = int(y1 * self.sy), int(y2 * self.sy)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), GREEN, 2)
+            self._paste(frame, self._label_sprite(t), x1, max(12, y1 - 6))
+        if hud_text:
+            draw_hud(frame, hud_text)
+        return frame
+
@@ -2,13 +2,35 @@
 # EventLogger:
 # - CSV con encabezados en ESPAÑOL:
 #   fecha_hora, tipo_infraccion, tiempo_seg, id_objeto, x1, y1, x2, y2,
-#   ruta_imagen, ruta_recorte, extra
-# - Guarda evidencia: frame completo y recorte del bbox con padding.
+#   ruta_imagen, ruta_recorte, extra, ruta_miniatura, ruta_clip, placa
+# - Guarda evidencia vía EvidenceStore: frame completo (una vez por frame,
+#   compartido entre eventos), recorte del bbox con padding y miniatura.
+# - Opcionalmente, un clip de video pre/post evento (ver clip_buffer.py).
+# - Opcionalmente, la placa del vehículo leída en segundo plano (ver
+#   plate_stage.py); se rellena en el CSV al terminar (finish_plates()).
+# - Mantiene en memoria los eventos nuevos para consumidores en streaming
+#   (ver drain_new_events() y Pipeline.iter_process_video()).
+# - Opcionalmente (evidence.best_frame), evidencia desde el MEJOR frame del
+#   track y no desde el de confirmación: las reglas ofrecen candidatos
+#   (candidate()/discard()), el evento confirmado queda pendiente unos frames
+#   y se escribe una sola vez al terminar (ver evidence_select.py). La fila
+#   del CSV conserva el tiempo de confirmación; `extra.ts_evidencia` indica
+#   el instante de la imagen.
 # -----------------------------------------------------------------------------
 
-import os, csv, cv2, json
+import os, csv, json, logging, tempfile
 from datetime import datetime
 
+from core.utils.evidence_store import EvidenceStore
+from core.utils.evidence_select import BestFrameSelector
+
+CSV_COLUMNS = [
+    "fecha_hora","tipo_infraccion","tiempo_seg","id_objeto",
+    "x1","y1","x2","y2","ruta_imagen","ruta_recorte","extra","ruta_miniatura","ruta_clip","placa"
+]
+
+log = logging.getLogger(__name__)
+
 def _safe_mkdir(p):
     os.makedirs(p, exist_ok=True)
 
@@ -20,61 +42,230 @@ def _crop_with_padding(frame, bbox, pad=10):
     return frame[y1p:y2p, x1p:x2p]
 
 class EventLogger:
-    def __init__(self, output_dir="data/output", evidence_dir="data/output/evidence"):
+    def __init__(self, output_dir="data/output", evidence_dir="data/output/evidence", evidence_cfg=None):
         # Directorios donde se escriben CSV y evidencias (imágenes)
         self.output_dir = output_dir
         self.evidence_dir = evidence_dir
         _safe_mkdir(self.output_dir)
         _safe_mkdir(self.evidence_dir)
+        # Formato/calidad/miniaturas/pack según la sección `evidence:` del YAML
+        self.store = EvidenceStore.from_config(self.evidence_dir, evidence_cfg)
+        # Índice del frame en curso (lo fija el pipeline); permite compartir
+        # el frame completo entre todos los eventos del mismo frame
+        self.frame_idx = None
+        # ClipRecorder opcional (lo asigna el pipeline por ejecución)
+        self.clip_recorder = None
+        # PlateOCRStage opcional (lo asigna el pipeline por ejecución) y filas
+        # del CSV a la espera de su placa: (tipo, tiempo_seg, id_objeto) -> id vehículo
+        self.plate_stage = None
+        self._plate_rows = {}
         # Ruta del CSV de eventos. Se crea con encabezados si no existe.
         self.csv_path = os.path.join(self.output_dir, "events.csv")
         self._init_csv()
+        # Eventos registrados y aún no consumidos por drain_new_events()
+        self._new_events = []
+        # Si se fija, los eventos con ts anterior se descartan (calentamiento
+        # de segmentos: las reglas acumulan estado pero no se registra nada)
+        self.events_from_ts = None
+        # Eventos registrados por tipo (telemetría)
+        self.event_counts = {}
+        # Selector del mejor frame (None = evidencia del frame de confirmación)
+        self.selector = BestFrameSelector.from_config(evidence_cfg)
 
     def _init_csv(self):
         # Si no existe o está vacío, crea CSV con encabezados en español.
         if not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0:
             with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
                 w = csv.writer(f)
-                w.writerow([
-                    "fecha_hora","tipo_infraccion","tiempo_seg","id_objeto",
-                    "x1","y1","x2","y2","ruta_imagen","ruta_recorte","extra"
-                ])
+                w.writerow(CSV_COLUMNS)
+            return
+        # CSV de una versión anterior (directorio de salida reutilizado): no
+        # se anexan filas con otras columnas debajo de un encabezado distinto
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        if header == CSV_COLUMNS:
+            return
+        if header and header == CSV_COLUMNS[:len(header)]:
+            # Esquema antiguo (menos columnas al final): se migra rellenando vacías
+            with open(self.csv_path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))[1:]
+            fd, tmp = tempfile.mkstemp(dir=self.output_dir, suffix=".csv")
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                w.writerow(CSV_COLUMNS)
+                w.writerows(row + [""] * (len(CSV_COLUMNS) - len(row)) for row in rows)
+            os.replace(tmp, self.csv_path)
+            log.info(f"{self.csv_path}: migrado de {len(header)} a {len(CSV_COLUMNS)} columnas")
+        else:
+            # Encabezado desconocido: se aparta el archivo y se empieza uno nuevo
+            rotated = f"{os.path.splitext(self.csv_path)[0]}.{datetime.now():%Y%m%d_%H%M%S}.csv"
+            os.replace(self.csv_path, rotated)
+            log.warning(f"{self.csv_path}: encabezado no reconocido; movido a {rotated}")
+            self._init_csv()
 
     def log(self, event_type, ts, track_id, bbox, extra=None, frame=None):
         """
         Registra una fila en el CSV y, si se pasa el frame, crea dos imágenes:
-          - imagen completa del frame actual (con overlays incluidos)
+          - imagen completa del frame (reducida a contexto si hay selector)
           - recorte (crop) alrededor del bbox del objeto infractor
         Las imágenes se guardan en data/output/evidence/<event_type>/
+        Con selector de mejor frame, la fila se escribe al cerrar el evento
+        (end_frame()/flush_evidence()) con la mejor toma del track.
         """
-        now = datetime.now().isoformat(timespec="seconds")
-        x1,y1,x2,y2 = map(int, bbox)
-        extra_json = json.dumps(extra or {}, ensure_ascii=False)
+        if self.events_from_ts is not None and ts < self.events_from_ts:
+            return
+        base = f"{event_type}_id{track_id}_{int(ts*1000)}"
+        event = {"event_type": event_type, "ts": ts, "track_id": track_id, "bbox": bbox,
+                 "extra": dict(extra or {}), "base": base, "clip_path": "", "plate": ""}
 
-        image_path, crop_path = "", ""
+        # Clip pre/post evento (se escribe en segundo plano al completarse)
+        if frame is not None and self.clip_recorder is not None:
+            event["clip_path"] = self.clip_recorder.request(ts, base)
 
-        if frame is not None:
-            # 1) Carpeta por tipo de evento (e.g., evidence/no_helmet)
-            ev_dir = os.path.join(self.evidence_dir, event_type)
-            _safe_mkdir(ev_dir)
+        # Placa: en caché si el vehículo ya se leyó; si no, se pide al OCR
+        # asíncrono y la fila se completa al terminar. En 'no_helmet' el
+        # vehículo es la moto (extra.moto_id), no la persona del bbox.
+        if self.plate_stage is not None:
+            own = "moto_id" not in event["extra"]
+            vehicle_id = str(track_id if own else extra["moto_id"])
+            event["plate"] = self.plate_stage.request(vehicle_id, frame if own else None, bbox if own else None) or ""
+            if not event["plate"]:
+                self._plate_rows[(event_type, f"{ts:.3f}", str(track_id))] = vehicle_id
 
-            # 2) Nombrar archivos por tipo, id y timestamp en ms
-            base = f"{event_type}_id{track_id}_{int(ts*1000)}"
-            image_path = os.path.join(ev_dir, f"{base}.jpg").replace("\\","/")
-            crop_path  = os.path.join(ev_dir, f"{base}_crop.jpg").replace("\\","/")
+        if frame is not None and self.selector is not None:
+            key = (event_type, str(track_id))
+            for ev, shot in self.selector.confirm(key, event, frame, bbox, ts, self.frame_idx or 0):
+                self._write_event(ev, shot=shot)
+            return
+        self._write_event(event, frame=frame)
 
-            # 3) Guardar frame completo (lo que ves en la GUI en ese momento)
-            cv2.imwrite(image_path, frame)
+    def candidate(self, event_type, ts, track_id, bbox, frame):
+        """La regla ve a `track_id` camino de una infracción: ofrece este frame como toma."""
+        if self.selector is not None and frame is not None:
+            self.selector.offer((event_type, str(track_id)), frame, bbox, ts, self.frame_idx or 0)
 
-            # 4) Guardar recorte con padding suave alrededor del bbox
+    def discard(self, event_type, track_id):
+        """El track dejó de ser candidato: se liberan sus tomas (si no hay evento pendiente)."""
+        if self.selector is not None:
+            self.selector.discard((event_type, str(track_id)))
+
+    def end_frame(self, frame, tracks, ts):
+        """Fin de frame (tras las reglas): escribe los eventos pendientes que ya se cerraron."""
+        if self.selector is not None:
+            for ev, shot in self.selector.step(frame, tracks, self.frame_idx or 0, ts):
+                self._write_event(ev, shot=shot)
+
+    def flush_evidence(self):
+        """Escribe ya todos los eventos pendientes con su mejor toma hasta ahora."""
+        if self.selector is not None:
+            for ev, shot in self.selector.flush():
+                self._write_event(ev, shot=shot)
+
+    def _write_event(self, event, frame=None, shot=None):
+        # Imágenes desde el frame de confirmación (`frame`) o desde la mejor
+        # toma (`shot`: recorte y contexto ya preparados por el selector)
+        event_type, ts, base = event["event_type"], event["ts"], event["base"]
+        bbox, extra = event["bbox"], event["extra"]
+        image_path, crop_path, thumb_path = "", "", ""
+        crop = None
+        if shot is not None:
+            bbox = shot["bbox"]
+            extra = {**extra, "ts_evidencia": round(shot["ts"], 3)}
+            image_path = self.store.save_frame(shot["context"], shot["frame_idx"], prescaled=True)
+            crop = shot["crop"]
+        elif frame is not None:
+            # Frame completo (compartido por índice de frame; sin índice, por ts)
+            frame_key = self.frame_idx if self.frame_idx is not None else int(ts * 1000)
+            image_path = self.store.save_frame(frame, frame_key)
+            # Recorte con padding suave alrededor del bbox (resolución nativa)
             crop = _crop_with_padding(frame, bbox, pad=12)
-            if crop.size > 0:
-                cv2.imwrite(crop_path, crop)
+        if crop is not None and crop.size > 0:
+            crop_path = self.store.save_crop(crop, event_type, base)
+            thumb_path = self.store.save_thumbnail(crop, event_type, base)
 
-        # 5) Añadir fila al CSV con las rutas generadas
+        # Añadir fila al CSV con las rutas generadas
+        now = datetime.now().isoformat(timespec="seconds")
+        x1,y1,x2,y2 = map(int, bbox)
+        row = [
+            now, event_type, f"{ts:.3f}", event["track_id"], x1,y1,x2,y2,
+            image_path, crop_path, json.dumps(extra, ensure_ascii=False), thumb_path,
+            event["clip_path"], event["plate"]
+        ]
         with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow([
-                now, event_type, f"{ts:.3f}", track_id, x1,y1,x2,y2,
-                image_path, crop_path, extra_json
-            ])
+            w.writerow(row)
+        self._new_events.append(dict(zip(CSV_COLUMNS, row)))
+        self.event_counts[event_type] = self.event_counts.get(event_type, 0) + 1
+
+    def state_dict(self):
+        """
+        Posición del logger (para checkpoints): bytes escritos en el CSV y filas
+        a la espera de su placa. Los eventos pendientes de evidencia no entran:
+        quien guarda el checkpoint debe llamar antes a flush_evidence(). El
+        estado del OCR de placas lo guarda aparte el pipeline (PlateOCRStage).
+        """
+        return {"csv_bytes": os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0,
+                "plate_rows": dict(self._plate_rows)}
+
+    def load_state_dict(self, state):
+        """
+        Trunca el CSV a la posición del checkpoint: los eventos posteriores se
+        volverán a detectar al reanudar, así no quedan filas duplicadas.
+        """
+        if os.path.exists(self.csv_path) and os.path.getsize(self.csv_path) > state["csv_bytes"]:
+            with open(self.csv_path, "r+b") as f:
+                f.truncate(state["csv_bytes"])
+        self._init_csv()
+        self._new_events = []
+        self._plate_rows = dict(state.get("plate_rows") or {})
+        if self.selector is not None:
+            self.selector.clear()
+
+    def finish_plates(self, rewrite=True):
+        """
+        Espera al OCR de placas y escribe las placas leídas en las filas del
+        CSV que quedaron pendientes (reescritura atómica del archivo).
+
+        Con rewrite=False (queda un checkpoint para reanudar) no se toca el
+        CSV: reescribirlo cambiaría los bytes que el checkpoint guardó en
+        `csv_bytes`. Las filas pendientes y el OCR siguen en el checkpoint y
+        se completan al terminar la ejecución reanudada.
+        """
+        if self.plate_stage is None:
+            return {}
+        if not rewrite:
+            plates = self.plate_stage.close(wait=False)
+            self.plate_stage = None
+            self._plate_rows = {}
+            return plates
+        plates = self.plate_stage.close()
+        self.plate_stage = None
+        pending, self._plate_rows = self._plate_rows, {}
+        if not any(plates.get(v) for v in pending.values()) or not os.path.exists(self.csv_path):
+            return plates
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        header = rows[0]
+        if "placa" not in header:
+            return plates
+        i_type, i_ts, i_id, i_plate = (header.index(c) for c in ("tipo_infraccion", "tiempo_seg", "id_objeto", "placa"))
+        for row in rows[1:]:
+            vid = pending.get((row[i_type], row[i_ts], row[i_id]))
+            if vid is not None and plates.get(vid):
+                row[i_plate] = plates[vid]
+        fd, tmp = tempfile.mkstemp(dir=self.output_dir, suffix=".csv")
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+        os.replace(tmp, self.csv_path)
+        return plates
+
+    def close(self, rewrite=True):
+        """Cierra evidencias y placas; rewrite=False si queda un checkpoint (ver finish_plates)."""
+        self.flush_evidence()
+        self.finish_plates(rewrite=rewrite)
+        self.store.close()
+
+    def drain_new_events(self):
+        """Devuelve (y olvida) los eventos registrados desde la última llamada."""
+        events, self._new_events = self._new_events, []
+        return events
@@ -0,0 +1,169 @@
+# -----------------------------------------------------------------------------
+# Selección del mejor frame de evidencia por (infracción, track).
+#
+# Las reglas ofrecen frames candidatos mientras un track va acumulando una
+# posible infracción (EventLogger.candidate) y confirman con EventLogger.log.
+# Por cada (tipo, track) se guardan como mucho `top_k` tomas, puntuadas por:
+#   nitidez   varianza del Laplaciano del recorte normalizado a 64 px de alto
+#   tamaño    raíz del área del bbox (objetos más grandes = más detalle)
+#   recorte   fracción del bbox dentro del frame (penaliza objetos cortados)
+# De cada toma sólo se copia el recorte (con padding) y un frame de contexto
+# reducido (`context_px` de lado mayor); nunca el frame completo.
+#
+# Tras la confirmación se siguen ofreciendo frames del track durante
+# `post_frames` frames (o hasta que el track desaparece); entonces el evento
+# queda listo y se escribe UNA vez, desde la mejor toma (o, si ninguna se pudo
+# puntuar, desde el frame de confirmación). Memoria acotada:
+# top_k tomas x `max_candidates` tracks candidatos (se descartan los más
+# antiguos).
+# -----------------------------------------------------------------------------
+
+import heapq
+import itertools
+
+import cv2
+import numpy as np
+
+
+def _score(frame, bbox):
+    """(puntuación, (x1, y1, x2, y2) del bbox recortado al frame) de una toma."""
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = map(int, bbox)
+    cx1, cy1, cx2, cy2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+    area = max(0, x2 - x1) * max(0, y2 - y1)
+    visible = max(0, cx2 - cx1) * max(0, cy2 - cy1)
+    if visible < 16:
+        return 0.0, None
+    roi = frame[cy1:cy2, cx1:cx2]
+    scale = 64.0 / roi.shape[0]
+    small = cv2.resize(roi, (max(8, int(roi.shape[1] * scale)), 64), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+    return sharpness * np.sqrt(visible) * (visible / area), (cx1, cy1, cx2, cy2)
+
+
+class BestFrameSelector:
+    def __init__(self, top_k=3, context_px=640, pad=12, post_frames=15, max_missing=5, max_candidates=64):
+        self.top_k = max(1, int(top_k))
+        self.context_px = int(context_px)
+        self.pad = int(pad)
+        self.post_frames = int(post_frames)
+        self.max_missing = int(max_missing)
+        self.max_candidates = max(1, int(max_candidates))
+        self._shots = {}     # (tipo, track_id) -> heap [(score, seq, toma)] (mínimo arriba)
+        self._seen = {}      # (tipo, track_id) -> último frame_idx con toma ofrecida
+        self._pending = {}   # (tipo, track_id) -> (evento, frame_idx de confirmación, toma de respaldo)
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_config(cls, ecfg):
+        """Selector según `evidence.best_frame` del YAML; None si está desactivado."""
+        bcfg = (ecfg or {}).get("best_frame") or {}
+        if not bcfg.get("enabled"):
+            return None
+        return cls(top_k=bcfg.get("top_k", 3), context_px=bcfg.get("context_px", 640),
+                   post_frames=bcfg.get("post_frames", 15), max_missing=bcfg.get("max_missing_frames", 5),
+                   max_candidates=bcfg.get("max_candidates", 64))
+
+    def _shot(self, frame, bbox, ts, frame_idx, clipped):
+        # Copia sólo recorte (resolución nativa) y contexto reducido
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = clipped
+        crop = frame[max(0, y1 - self.pad):min(h, y2 + self.pad), max(0, x1 - self.pad):min(w, x2 + self.pad)].copy()
+        scale = min(1.0, self.context_px / max(h, w)) if self.context_px > 0 else 1.0
+        context = (cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+                   if scale < 1.0 else frame.copy())
+        return {"crop": crop, "context": context, "ts": ts, "frame_idx": frame_idx, "bbox": list(bbox)}
+
+    def offer(self, key, frame, bbox, ts, frame_idx):
+        """Ofrece el frame actual como toma de `key`; sólo se copia si entra en el top-k."""
+        if self._seen.get(key) == frame_idx:
+            return
+        score, clipped = _score(frame, bbox)
+        if clipped is None:
+            return
+        heap = self._shots.get(key)
+        if heap is None:
+            if len(self._shots) >= self.max_candidates:
+                self._evict()
+            heap = self._shots[key] = []
+        self._seen[key] = frame_idx
+        if len(heap) >= self.top_k and score <= heap[0][0]:
+            return
+        entry = (score, next(self._seq), self._shot(frame, bbox, ts, frame_idx, clipped))
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heapreplace(heap, entry)
+
+    def _evict(self):
+        # Candidato sin confirmar visto hace más tiempo
+        free = [k for k in self._shots if k not in self._pending]
+        if free:
+            self.discard(min(free, key=lambda k: self._seen.get(k, -1)))
+
+    def discard(self, key):
+        """Olvida las tomas de un candidato que dejó de serlo (salvo evento pendiente)."""
+        if key not in self._pending:
+            self._shots.pop(key, None)
+            self._seen.pop(key, None)
+
+    def confirm(self, key, event, frame, bbox, ts, frame_idx):
+        """
+        Evento confirmado: queda pendiente hasta reunir tomas posteriores.
+        Devuelve [(evento, toma)] listos (un evento previo de la misma clave).
+        """
+        ready = [self._finish(key)] if key in self._pending else []
+        self.offer(key, frame, bbox, ts, frame_idx)
+        fallback = None
+        if not self._shots.get(key):
+            # Sin toma puntuable (bbox casi fuera del frame): el evento conserva
+            # al menos el recorte y el contexto del frame de confirmación
+            h, w = frame.shape[:2]
+            x1, y1, x2, y2 = map(int, bbox)
+            cx1, cy1 = min(max(0, x1), w), min(max(0, y1), h)
+            clipped = (cx1, cy1, max(cx1, min(w, x2)), max(cy1, min(h, y2)))
+            fallback = self._shot(frame, bbox, ts, frame_idx, clipped)
+        self._pending[key] = (event, frame_idx, fallback)
+        return ready
+
+    def _finish(self, key):
+        event, _, fallback = self._pending.pop(key)
+        heap = self._shots.pop(key, None) or []
+        self._seen.pop(key, None)
+        return event, (max(heap, key=lambda e: e[0])[2] if heap else fallback)
+
+    def step(self, frame, tracks, frame_idx, ts):
+        """
+        Fin de frame: nuevas tomas para los tracks con evento pendiente,
+        limpieza de candidatos desaparecidos y [(evento, mejor toma)] listos.
+        """
+        boxes = {str(t["id"]): t["bbox"] for t in tracks}
+        ready = []
+        for key, (_, confirmed_at, _) in list(self._pending.items()):
+            bbox = boxes.get(key[1])
+            if bbox is not None and frame is not None:
+                self.offer(key, frame, bbox, ts, frame_idx)
+            gone = frame_idx - self._seen.get(key, confirmed_at) > self.max_missing
+            if gone or frame_idx - confirmed_at >= self.post_frames:
+                ready.append(self._finish(key))
+        for key in [k for k, seen in self._seen.items()
+                    if k not in self._pending and frame_idx - seen > self.max_missing]:
+            self.discard(key)
+        return ready
+
+    def flush(self):
+        """Todos los eventos pendientes, con su mejor toma hasta ahora."""
+        return [self._finish(key) for key in list(self._pending)]
+
+    def clear(self):
+        """Olvida tomas y eventos pendientes (al restaurar un checkpoint)."""
+        self._shots.clear()
+        self._seen.clear()
+        self._pending.clear()
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def candidate_count(self):
+        return len(self._shots)
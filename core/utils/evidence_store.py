@@ -0,0 +1,123 @@
+# -----------------------------------------------------------------------------
+# EvidenceStore: almacenamiento compacto de evidencias.
+# - Frame completo guardado UNA vez por índice de frame (evidence/frames/) y
+#   compartido por todos los eventos que ocurren en ese frame.
+# - Formato y calidad configurables (JPEG / WebP).
+# - Frame completo opcionalmente reducido; el recorte siempre a resolución nativa.
+# - Miniaturas pequeñas para la lista de eventos de la GUI.
+# - Modo "pack": todo se anexa a un único archivo evidence.pack con un índice
+#   JSONL (evidence.pack.idx). Las rutas quedan como '<pack>#<offset>:<size>' y
+#   se leen con read_evidence().
+# -----------------------------------------------------------------------------
+
+import os, json
+import cv2
+
+_EXT = {"jpg": ".jpg", "jpeg": ".jpg", "webp": ".webp"}
+
+
+def read_evidence(path):
+    """Devuelve los bytes de una evidencia (archivo suelto o referencia a pack), o None."""
+    if not isinstance(path, str) or not path:
+        return None
+    if "#" in path and path.split("#", 1)[0].endswith(".pack"):
+        pack_path, ref = path.split("#", 1)
+        offset, size = map(int, ref.split(":"))
+        if not os.path.exists(pack_path):
+            return None
+        with open(pack_path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class EvidenceStore:
+    def __init__(self, evidence_dir, fmt="jpg", quality=85, full_frame_scale=1.0,
+                 thumbnail_px=160, pack=False):
+        self.evidence_dir = evidence_dir
+        fmt = str(fmt).lower()
+        if fmt not in _EXT:
+            raise ValueError(f"Formato de evidencia no soportado: {fmt} (usa jpg o webp)")
+        self.ext = _EXT[fmt]
+        quality = int(quality)
+        flag = cv2.IMWRITE_WEBP_QUALITY if self.ext == ".webp" else cv2.IMWRITE_JPEG_QUALITY
+        self.params = [flag, quality]
+        self.full_frame_scale = float(full_frame_scale)
+        self.thumbnail_px = int(thumbnail_px or 0)
+        self.pack = bool(pack)
+        self._pack_f = None
+        # Último frame guardado: idx -> ruta (los eventos de un mismo frame llegan juntos)
+        self._frame_key = None
+        self._frame_path = ""
+
+    @classmethod
+    def from_config(cls, evidence_dir, cfg=None):
+        cfg = cfg or {}
+        return cls(
+            evidence_dir,
+            fmt=cfg.get("format", "jpg"),
+            quality=cfg.get("quality", 85),
+            full_frame_scale=cfg.get("full_frame_scale", 1.0),
+            thumbnail_px=cfg.get("thumbnail_px", 160),
+            pack=cfg.get("pack", False),
+        )
+
+    def _write(self, rel_name, img):
+        """Codifica `img` y la guarda como archivo suelto o dentro del pack."""
+        ok, buf = cv2.imencode(self.ext, img, self.params)
+        if not ok:
+            return ""
+        data = buf.tobytes()
+        if not self.pack:
+            path = os.path.join(self.evidence_dir, rel_name).replace("\\", "/")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+            return path
+        pack_path = os.path.join(self.evidence_dir, "evidence.pack").replace("\\", "/")
+        if self._pack_f is None:
+            os.makedirs(self.evidence_dir, exist_ok=True)
+            self._pack_f = open(pack_path, "ab")
+        offset = self._pack_f.tell()
+        self._pack_f.write(data)
+        self._pack_f.flush()
+        with open(f"{pack_path}.idx", "a", encoding="utf-8") as idx:
+            idx.write(json.dumps({"name": rel_name, "offset": offset, "size": len(data)}) + "\n")
+        return f"{pack_path}#{offset}:{len(data)}"
+
+    def save_frame(self, frame, frame_key, prescaled=False):
+        """
+        Guarda el frame completo una sola vez por `frame_key` y devuelve su ruta.
+        prescaled=True: el frame ya viene reducido (contexto del selector de
+        mejor frame) y no se aplica full_frame_scale.
+        """
+        if frame_key == self._frame_key:
+            return self._frame_path
+        img = frame
+        if not prescaled and 0 < self.full_frame_scale < 1.0:
+            img = cv2.resize(frame, None, fx=self.full_frame_scale, fy=self.full_frame_scale,
+                             interpolation=cv2.INTER_AREA)
+        name = f"frame_{frame_key:08d}" if isinstance(frame_key, int) else f"frame_{frame_key}"
+        self._frame_key = frame_key
+        self._frame_path = self._write(os.path.join("frames", f"{name}{self.ext}"), img)
+        return self._frame_path
+
+    def save_crop(self, crop, event_type, base):
+        return self._write(os.path.join(event_type, f"{base}_crop{self.ext}"), crop)
+
+    def save_thumbnail(self, crop, event_type, base):
+        """Miniatura del recorte (lado mayor = thumbnail_px). '' si están desactivadas."""
+        if self.thumbnail_px <= 0:
+            return ""
+        h, w = crop.shape[:2]
+        scale = min(1.0, self.thumbnail_px / max(h, w))
+        thumb = cv2.resize(crop, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        return self._write(os.path.join(event_type, f"{base}_thumb{self.ext}"), thumb)
+
+    def close(self):
+        if self._pack_f is not None:
+            self._pack_f.close()
+            self._pack_f = None
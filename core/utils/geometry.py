@@ -33,4 +33,4 @@ def point_in_polygon(point, polygon):
 
 def line_angle(p1, p2):
     v = np.array(p2) - np.array(p1)
-    return np.degrees(np.arctan2(v[1], v[0]))
\ No newline at end of file
+    return np.degrees(np.arctan2(v[1], v[0]))
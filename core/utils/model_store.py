@@ -0,0 +1,258 @@
+"""Almacén de modelos: manifiesto, descargas reanudables y verificación SHA256.
+
+Manifiesto (sección `models.manifest` del YAML), una entrada por modelo:
+
+    helmet_best:
+      path: "models/helmet/helmet_best.pt"
+      sha256: "0629..."        # opcional: sin hash sólo se garantiza que el archivo está completo
+      mirrors: ["https://...", "https://..."]
+      kind: "helmet"           # opcional: modelos alternativos para un mismo rol
+
+Descarga (ensure):
+  - Se escribe en <path>.part pidiendo con Range lo que falte (reanuda tras
+    un corte). El SHA256 se calcula al vuelo, parte previa incluida, así que
+    no se relee el archivo al terminar.
+  - Mirrors en orden. Un corte conserva el .part (se reanuda, incluso desde
+    otro mirror); un hash incorrecto lo descarta y pasa al siguiente.
+  - Publicación atómica (fsync + os.replace): si existe <path>, está completo.
+  - <path>.lock (flock) serializa la descarga del mismo modelo entre hilos y
+    procesos (p. ej. varios workers arrancando a la vez).
+  - ensure_many() prepara varios modelos en paralelo.
+
+Caché de verificación (`models.store.cache`): {ruta: [tamaño, mtime_ns, sha256]}.
+Mientras tamaño y mtime no cambien, arrancar no vuelve a hashear pesos grandes.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:   # Windows: sin lock entre procesos (el .part sigue siendo atómico al publicar)
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+CHUNK = 1 << 20  # 1 MiB
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _hash_into(path, h):
+    """Añade el contenido de `path` al hash `h`; devuelve los bytes leídos."""
+    n = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            h.update(chunk)
+            n += len(chunk)
+    return n
+
+
+class ModelStore:
+    def __init__(self, manifest=None, cache_path="models/.verified.json", timeout=90.0, workers=4):
+        self.manifest = {name: dict(entry) for name, entry in (manifest or {}).items()}
+        self.cache_path = cache_path
+        self.timeout = float(timeout)
+        self.workers = max(1, int(workers))
+        self._lock = threading.Lock()
+        self._cache = None
+
+    @classmethod
+    def from_config(cls, mcfg):
+        """Store según la sección `models:` del YAML (manifest + store)."""
+        mcfg = mcfg or {}
+        scfg = mcfg.get("store") or {}
+        return cls(mcfg.get("manifest"), cache_path=scfg.get("cache", "models/.verified.json"),
+                   timeout=scfg.get("timeout_seconds", 90.0), workers=scfg.get("workers", 4))
+
+    # --- Manifiesto ---
+    def name_for(self, path):
+        """Nombre de la entrada del manifiesto con esa ruta (None si no está)."""
+        target = os.path.abspath(path)
+        for name, entry in self.manifest.items():
+            if os.path.abspath(entry["path"]) == target:
+                return name
+        return None
+
+    def register(self, path, mirrors=(), kind=None):
+        """
+        Devuelve el nombre de la entrada para `path`, creándola si la ruta no
+        está en el manifiesto (rutas/URLs sueltas de la config o del entorno).
+        Los mirrors dados se añaden al final de los de la entrada.
+        """
+        name = self.name_for(path)
+        if name is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+            while name in self.manifest:
+                name += "_"
+            self.manifest[name] = {"path": path, "mirrors": [], "kind": kind}
+        entry = self.manifest[name]
+        known = list(entry.get("mirrors") or [])
+        entry["mirrors"] = known + [m for m in mirrors if m and m not in known]
+        if kind and not entry.get("kind"):
+            entry["kind"] = kind
+        return name
+
+    # --- Caché de hashes verificados ---
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(self.cache_path, encoding="utf-8") as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+
+    def _remember(self, path, sha):
+        st = os.stat(path)
+        with self._lock:
+            cache = self._load_cache()
+            cache[os.path.abspath(path)] = [st.st_size, st.st_mtime_ns, sha]
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+                tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(cache, f, indent=1)
+                os.replace(tmp, self.cache_path)
+            except OSError as e:
+                log.debug(f"No se pudo guardar la caché de hashes: {e}")
+
+    def _sha256(self, path):
+        # Hash del archivo, desde la caché si tamaño y mtime no cambiaron
+        st = os.stat(path)
+        with self._lock:
+            cached = self._load_cache().get(os.path.abspath(path))
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        _hash_into(path, h)
+        self._remember(path, h.hexdigest())
+        return h.hexdigest()
+
+    # --- Verificación y descarga ---
+    def verify(self, name):
+        """True si el archivo existe y (si el manifiesto trae sha256) su hash coincide."""
+        entry = self.manifest[name]
+        path = entry["path"]
+        if not os.path.isfile(path):
+            return False
+        expected = (entry.get("sha256") or "").lower()
+        if not expected:
+            return True
+        if self._sha256(path) == expected:
+            return True
+        log.warning(f"Modelo {name}: SHA256 de {path} no coincide con el manifiesto")
+        return False
+
+    def first_ready(self, kind):
+        """Ruta del primer modelo del manifiesto de ese rol que ya está en disco y verificado."""
+        for name, entry in self.manifest.items():
+            if entry.get("kind") == kind and self.verify(name):
+                return entry["path"]
+        return None
+
+    def ensure(self, name):
+        """
+        Deja el modelo `name` en su ruta (descargándolo de sus mirrors si falta
+        o no verifica) y devuelve la ruta. Lanza RuntimeError si no se pudo.
+        """
+        entry = self.manifest[name]
+        path = entry["path"]
+        if self.verify(name):
+            return path
+        with _file_lock(path):
+            # Otro proceso pudo publicarlo mientras esperábamos el lock
+            if self.verify(name):
+                return path
+            if os.path.exists(path):
+                os.remove(path)   # hash incorrecto
+            errors = []
+            for url in entry.get("mirrors") or []:
+                try:
+                    log.info(f"Descargando modelo {name} desde {url}")
+                    sha = self._fetch(url, path, entry.get("sha256"))
+                    self._remember(path, sha)
+                    log.info(f"Modelo {name} listo en {path}")
+                    return path
+                except Exception as e:
+                    log.warning(f"Modelo {name}: falló {url}: {e}")
+                    errors.append(f"{url}: {e}")
+        detail = "; ".join(errors) if errors else "sin mirrors configurados"
+        raise RuntimeError(f"No se pudo obtener el modelo {name} ({path}): {detail}")
+
+    def ensure_many(self, names=None, workers=None):
+        """ensure() en paralelo; devuelve {nombre: ruta o None si falló}."""
+        names = list(self.manifest) if names is None else list(names)
+        if not names:
+            return {}
+
+        def _one(name):
+            try:
+                return self.ensure(name)
+            except Exception as e:
+                log.warning(str(e))
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(len(names), workers or self.workers),
+                                thread_name_prefix="model-fetch") as pool:
+            return dict(zip(names, pool.map(_one, names)))
+
+    def _fetch(self, url, dest, expected=None):
+        """Descarga `url` en `dest` reanudando <dest>.part; devuelve el SHA256."""
+        part = dest + ".part"
+        h = hashlib.sha256()
+        have = _hash_into(part, h) if os.path.exists(part) else 0
+        req = urllib.request.Request(url, headers={"User-Agent": "infracciones-model-store"})
+        if have:
+            req.add_header("Range", f"bytes={have}-")
+        try:
+            resp = urllib.request.urlopen(req, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or not have:
+                raise
+            # 416: nada que pedir; el .part está completo sólo si coincide con el tamaño total
+            total = (e.headers.get("Content-Range") or "").rpartition("/")[2]
+            if total.isdigit() and int(total) != have:
+                raise IOError(f"la descarga parcial ({have} bytes) no corresponde a este mirror ({total} bytes)")
+            resp = None
+        if resp is not None:
+            with resp:
+                if have and resp.status != 206:
+                    # El servidor ignoró el Range: se descarga desde cero
+                    h, have = hashlib.sha256(), 0
+                length = resp.headers.get("Content-Length")
+                got = 0
+                with open(part, "ab" if have else "wb") as out:
+                    while chunk := resp.read(CHUNK):
+                        out.write(chunk)
+                        h.update(chunk)
+                        got += len(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+            if length is not None and got < int(length):
+                # Conexión cortada: el .part queda para reanudar en el siguiente intento
+                raise IOError(f"descarga incompleta ({have + got} de {have + int(length)} bytes)")
+        digest = h.hexdigest()
+        if os.path.getsize(part) == 0 or (expected and digest != expected.lower()):
+            os.remove(part)
+            raise ValueError(f"archivo vacío o SHA256 incorrecto (obtenido {digest[:12]}…)")
+        os.replace(part, dest)
+        return digest
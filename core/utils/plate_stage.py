@@ -0,0 +1,143 @@
+"""Lectura asíncrona de placas, sólo para vehículos con eventos.
+
+Flujo:
+  1) EventLogger.log() llama a request(vehicle_id, ...) cuando una regla
+     registra un evento. Si la placa de ese track ya se leyó, se devuelve
+     al instante (caché por track: una lectura por vehículo).
+  2) Mientras el track siga visible, observe(frame, tracks) guarda el
+     recorte más nítido (mitad inferior del bbox, donde suele ir la placa)
+     entre los próximos `candidates` frames. Sólo se copia un recorte si
+     mejora al mejor hasta el momento.
+  3) Con `candidates` vistos, o si el track deja de verse `max_missing`
+     frames, el mejor recorte va a un pool de hilos con el OCR. El bucle de
+     frames nunca espera al OCR.
+  4) close() espera los pendientes y devuelve {vehicle_id: placa}; el
+     logger rellena la columna `placa` del CSV (EventLogger.finish_plates).
+
+Checkpoints: state_dict() guarda las placas ya leídas y los recortes de los
+vehículos aún sin leer (reuniendo candidatos o en el OCR); load_state_dict()
+los recupera y reenvía al OCR los que ya estaban completos.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from core.detectors.plate_ocr import sharpness
+
+log = logging.getLogger(__name__)
+
+
+class PlateOCRStage:
+    def __init__(self, recognizer, candidates=5, workers=2, min_conf=0.3, max_missing=3):
+        self.recognizer = recognizer
+        self.candidates = max(1, int(candidates))
+        self.min_conf = float(min_conf)
+        self.max_missing = int(max_missing)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="plate-ocr")
+        self._pending = {}   # vehicle_id -> {"crop", "score", "seen", "missing"}
+        self._futures = {}   # vehicle_id -> Future (ya enviado al OCR)
+        self._inflight = {}  # vehicle_id -> recorte enviado al OCR y aún sin leer
+        self.plates = {}     # vehicle_id -> texto ("" si no se pudo leer)
+        self.ocr_calls = 0
+
+    @classmethod
+    def from_config(cls, recognizer, pcfg):
+        pcfg = pcfg or {}
+        return cls(recognizer, candidates=pcfg.get("candidates", 5), workers=pcfg.get("workers", 2),
+                   min_conf=pcfg.get("min_conf", 0.3), max_missing=pcfg.get("max_missing_frames", 3))
+
+    def request(self, vehicle_id, frame=None, bbox=None):
+        """Pide la placa del vehículo; devuelve el texto si ya está en caché, si no None."""
+        vid = str(vehicle_id)
+        if vid in self.plates:
+            return self.plates[vid] or None
+        if vid not in self._futures and vid not in self._pending:
+            self._pending[vid] = {"crop": None, "score": -1.0, "seen": 0, "missing": 0}
+            if frame is not None and bbox is not None:
+                self._offer(vid, frame, bbox)
+        return None
+
+    def queue_depth(self):
+        """{"candidates": vehículos reuniendo recortes, "ocr": lecturas en curso} (telemetría)."""
+        return {"candidates": len(self._pending),
+                "ocr": sum(not f.done() for f in list(self._futures.values()))}
+
+    def _offer(self, vid, frame, bbox):
+        p = self._pending[vid]
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = map(int, bbox)
+        y1 = (y1 + y2) // 2  # mitad inferior del vehículo
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+        p["seen"] += 1
+        if x2 - x1 >= 8 and y2 - y1 >= 8:
+            crop = frame[y1:y2, x1:x2]
+            if (score := sharpness(crop)) > p["score"]:
+                p["crop"], p["score"] = crop.copy(), score
+        if p["seen"] >= self.candidates:
+            self._submit(vid)
+
+    def observe(self, frame, tracks):
+        """Se llama una vez por frame con los tracks actuales."""
+        if not self._pending:
+            return
+        visible = {str(t["id"]): t for t in tracks}
+        for vid in list(self._pending):
+            if (t := visible.get(vid)) is not None:
+                self._pending[vid]["missing"] = 0
+                self._offer(vid, frame, t["bbox"])
+            else:
+                self._pending[vid]["missing"] += 1
+                if self._pending[vid]["missing"] > self.max_missing:
+                    self._submit(vid)
+
+    def _submit(self, vid):
+        p = self._pending.pop(vid)
+        if p["crop"] is None:
+            self.plates[vid] = ""
+            return
+        self._inflight[vid] = p["crop"]
+        self._futures[vid] = self._pool.submit(self._recognize, vid, p["crop"])
+
+    def _recognize(self, vid, crop):
+        self.ocr_calls += 1
+        try:
+            text, conf = self.recognizer.recognize(crop)
+        except Exception as e:
+            log.warning(f"Error de OCR para el track {vid}: {e}")
+            text, conf = "", 0.0
+        self.plates[vid] = text if text and conf >= self.min_conf else ""
+        self._inflight.pop(vid, None)
+
+    def state_dict(self):
+        """Placas leídas y recortes de los vehículos pendientes (para checkpoints)."""
+        pending = {vid: dict(p) for vid, p in list(self._pending.items())}
+        for vid, crop in list(self._inflight.items()):
+            # En el OCR: al reanudar se vuelve a enviar con el mismo recorte
+            pending[vid] = {"crop": crop, "score": 0.0, "seen": self.candidates, "missing": 0}
+        plates = dict(self.plates)
+        for vid in plates:
+            pending.pop(vid, None)   # leída mientras se copiaba el estado
+        return {"plates": plates, "pending": pending}
+
+    def load_state_dict(self, state):
+        """Recupera placas y pendientes del checkpoint; los completos van al OCR."""
+        self.plates.update(state["plates"])
+        for vid, p in state["pending"].items():
+            self._pending[vid] = dict(p)
+            if p["seen"] >= self.candidates:
+                self._submit(vid)
+
+    def close(self, wait=True):
+        """
+        Envía lo pendiente, espera al OCR y devuelve {vehicle_id: placa}. Con
+        wait=False se descartan los pendientes y no se espera (queda checkpoint).
+        """
+        if not wait:
+            self._pending = {}
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            return dict(self.plates)
+        for vid in list(self._pending):
+            self._submit(vid)
+        self._pool.shutdown(wait=True)
+        self._futures = {}
+        return dict(self.plates)
@@ -0,0 +1,107 @@
+"""Control adaptativo de calidad para procesar en tiempo real.
+
+Mide la latencia por frame (media exponencial) frente al presupuesto
+1/target_fps y mueve un "nivel" sobre una escalera de ajustes:
+
+    nivel 0        -> máxima calidad (primer valor de cada perilla)
+    nivel N        -> más barato (último valor de cada perilla)
+
+Perillas (sección `adaptive:` del YAML, cada una una lista de mejor a peor):
+  - lane_stride:            detector de carriles cada N frames
+  - helmet_recheck_seconds: validez del veredicto de casco (core/rules/helmet.py)
+  - detect_stride:          YOLO cada N frames (el tracker predice en los demás)
+  - imgsz:                  resolución de entrada del detector
+
+La escalera degrada una perilla por paso, en ese orden y por turnos, así que
+lo más barato de perder (carriles, casco) cae antes que la detección. Si la
+latencia supera el presupuesto se baja un nivel; si queda por debajo de
+`headroom` * presupuesto se sube. Tras cada cambio se espera `cooldown_frames`
+para medir el efecto. Cada cambio se registra en consola y en `changes`.
+Las perillas sin efecto con las reglas activas (carriles si ninguna regla pide
+`lane_info`, casco sin regla de casco) no entran en la escalera: un paso que
+no ahorra nada sólo gastaría un cooldown.
+"""
+
+import logging
+
+log = logging.getLogger(__name__)
+
+KNOBS = ("lane_stride", "helmet_recheck_seconds", "detect_stride", "imgsz")
+
+
+def build_ladder(options):
+    """{perilla: [mejor, ..., peor]} -> lista de ajustes, un paso de una perilla por nivel."""
+    idx = {k: 0 for k in options}
+    ladder = [{k: v[0] for k, v in options.items()}]
+    while True:
+        moved = False
+        for k in KNOBS:
+            if k in options and idx[k] + 1 < len(options[k]):
+                idx[k] += 1
+                ladder.append({kk: options[kk][idx[kk]] for kk in options})
+                moved = True
+        if not moved:
+            return ladder
+
+
+class QualityController:
+    def __init__(self, options, target_fps, window_frames=30, headroom=0.7, cooldown_frames=30):
+        self.ladder = build_ladder(options)
+        self.budget = 1.0 / float(target_fps)
+        self.alpha = 2.0 / (max(1, int(window_frames)) + 1)
+        self.headroom = float(headroom)
+        self.cooldown = int(cooldown_frames)
+        self.level = 0
+        self.latency = None       # latencia media (s/frame)
+        self._since_change = 0
+        self.changes = []         # [{"frame_idx", "level", "latency_ms", "settings"}]
+
+    @classmethod
+    def from_config(cls, acfg, base_imgsz, base_recheck, knobs=KNOBS):
+        """
+        Controlador según la sección `adaptive:` (None si está deshabilitada).
+        La resolución configurada (YAML o UI) es el tope de `imgsz`. `knobs`:
+        perillas que tienen efecto en este pipeline (el resto se omite).
+        """
+        acfg = acfg or {}
+        if not acfg.get("enabled"):
+            return None
+        options = {
+            "lane_stride": [int(v) for v in acfg.get("lane_stride", [1])],
+            "helmet_recheck_seconds": [float(v) for v in acfg.get("helmet_recheck_seconds", [base_recheck])],
+            "detect_stride": [int(v) for v in acfg.get("detect_stride", [1])],
+            "imgsz": [int(base_imgsz)] + sorted((int(v) for v in acfg.get("imgsz", []) if int(v) < base_imgsz),
+                                                reverse=True),
+        }
+        options = {k: v for k, v in options.items() if k in knobs}
+        return cls(options, acfg.get("target_fps", 15), window_frames=acfg.get("window_frames", 30),
+                   headroom=acfg.get("headroom", 0.7), cooldown_frames=acfg.get("cooldown_frames", 30))
+
+    @property
+    def settings(self):
+        return self.ladder[self.level]
+
+    def observe(self, seconds, frame_idx):
+        """
+        Registra la latencia de un frame. Devuelve los nuevos ajustes si el
+        nivel cambió, si no None.
+        """
+        self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+        self._since_change += 1
+        if self._since_change < self.cooldown:
+            return None
+        if self.latency > self.budget and self.level + 1 < len(self.ladder):
+            return self._move(self.level + 1, frame_idx)
+        if self.latency < self.headroom * self.budget and self.level > 0:
+            return self._move(self.level - 1, frame_idx)
+        return None
+
+    def _move(self, level, frame_idx):
+        prev = self.settings
+        self.level, self._since_change = level, 0
+        diff = ", ".join(f"{k} {prev[k]}->{v}" for k, v in self.settings.items() if prev[k] != v)
+        log.info(f"Frame {frame_idx}: nivel {self.level} ({diff}); "
+                 f"latencia {self.latency * 1000:.0f} ms, presupuesto {self.budget * 1000:.0f} ms")
+        self.changes.append({"frame_idx": frame_idx, "level": self.level, "latency_ms": self.latency * 1000,
+                             "settings": dict(self.settings)})
+        return self.settings
@@ -0,0 +1,133 @@
+"""Grabación binaria compacta de detecciones y tracks por frame.
+
+Permite re-ejecutar las reglas sin modelos ni decodificación (ver
+core/replay.py). El archivo es una secuencia de registros:
+
+    tipo (1 byte) + longitud (uint32 LE) + payload
+
+    b"M"  metadatos JSON (versión, fps, tamaño, video, escena)
+    b"L"  definición de etiqueta: código (uint8) + nombre utf-8
+    b"F"  frame: cabecera fija + arrays NumPy empaquetados
+
+Por frame se guardan las detecciones base, los tracks confirmados y las
+entradas de reglas que dependen de la imagen y no se pueden recalcular sin
+ella: detecciones de casco (None si no se calcularon) y estado del
+semáforo. Cajas y confianzas van en float32; los IDs de track en int32.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+RECORDING_VERSION = 1
+
+_REC = struct.Struct("<cI")
+_FRAME = struct.Struct("<Id HHHBB")   # frame_idx, ts, n_dets, n_tracks, n_helmet, flags, semáforo
+_HAS_HELMET = 1
+
+_DET = np.dtype([("bbox", "<f4", 4), ("conf", "<f4"), ("label", "u1")])
+_TRACK = np.dtype([("id", "<i4"), ("bbox", "<f4", 4), ("label", "u1"), ("prev", "<f4", 2)])
+_HELMET = np.dtype([("bbox", "<f4", 4), ("conf", "<f4")])
+
+_LIGHT_STATES = ("unknown", "red", "yellow", "green")
+
+# Entradas por frame que se graban (las demás se recalculan en el replay)
+RECORDED_INPUTS = ("helmet_dets", "traffic_light")
+
+
+class RecordingWriter:
+    def __init__(self, path, meta=None):
+        self.path = path
+        self._f = open(path, "wb")
+        self._labels = {}
+        self._write(b"M", json.dumps({"version": RECORDING_VERSION, **(meta or {})}).encode("utf-8"))
+
+    def _write(self, kind, payload):
+        self._f.write(_REC.pack(kind, len(payload)))
+        self._f.write(payload)
+
+    def _label(self, name):
+        code = self._labels.get(name)
+        if code is None:
+            code = self._labels[name] = len(self._labels)
+            self._write(b"L", bytes([code]) + str(name).encode("utf-8"))
+        return code
+
+    def write(self, frame_idx, ts, detections, tracks, inputs=None):
+        inputs = inputs or {}
+        dets = np.zeros(len(detections), dtype=_DET)
+        for i, d in enumerate(detections):
+            dets[i] = (d["bbox"], d.get("conf", 1.0), self._label(d["label"]))
+        trk = np.zeros(len(tracks), dtype=_TRACK)
+        for i, t in enumerate(tracks):
+            prev = t.get("prev_center")
+            trk[i] = (int(t["id"]), t["bbox"], self._label(t["label"]),
+                      prev if prev is not None else (np.nan, np.nan))
+        helmet = inputs.get("helmet_dets")
+        hel = np.zeros(len(helmet or []), dtype=_HELMET)
+        for i, h in enumerate(helmet or []):
+            hel[i] = (h["bbox"], h.get("conf", 1.0))
+        light = (inputs.get("traffic_light") or {}).get("state", "unknown")
+        flags = _HAS_HELMET if helmet is not None else 0
+        head = _FRAME.pack(int(frame_idx), float(ts), len(dets), len(trk), len(hel), flags,
+                           _LIGHT_STATES.index(light) if light in _LIGHT_STATES else 0)
+        self._write(b"F", head + dets.tobytes() + trk.tobytes() + hel.tobytes())
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+def read_recording(path):
+    """
+    Devuelve (meta, frames) donde frames es un generador de dicts
+    {"frame_idx", "ts", "detections", "tracks", "inputs"} con el mismo
+    formato que produce el pipeline.
+    """
+    f = open(path, "rb")
+    kind, n = _REC.unpack(f.read(_REC.size))
+    if kind != b"M":
+        f.close()
+        raise ValueError(f"No es una grabación válida: {path}")
+    meta = json.loads(f.read(n))
+
+    def frames():
+        labels = {}
+        try:
+            while len(hdr := f.read(_REC.size)) == _REC.size:
+                kind, n = _REC.unpack(hdr)
+                payload = f.read(n)
+                if kind == b"L":
+                    labels[payload[0]] = payload[1:].decode("utf-8")
+                elif kind == b"F":
+                    yield _decode_frame(payload, labels)
+        finally:
+            f.close()
+
+    return meta, frames()
+
+
+def _decode_frame(payload, labels):
+    frame_idx, ts, nd, nt, nh, flags, light = _FRAME.unpack_from(payload)
+    off = _FRAME.size
+    dets = np.frombuffer(payload, _DET, nd, off); off += nd * _DET.itemsize
+    trk = np.frombuffer(payload, _TRACK, nt, off); off += nt * _TRACK.itemsize
+    hel = np.frombuffer(payload, _HELMET, nh, off)
+    tracks = []
+    for t in trk:
+        prev = t["prev"].tolist()
+        tracks.append({"id": str(int(t["id"])), "bbox": t["bbox"].tolist(), "label": labels[int(t["label"])],
+                       "prev_center": None if np.isnan(prev[0]) else tuple(prev)})
+    inputs = {"traffic_light": {"state": _LIGHT_STATES[light], "boxes": []}}
+    if flags & _HAS_HELMET:
+        inputs["helmet_dets"] = [{"bbox": h["bbox"].tolist(), "conf": float(h["conf"]), "label": "helmet"}
+                                 for h in hel]
+    return {
+        "frame_idx": frame_idx,
+        "ts": ts,
+        "detections": [{"bbox": d["bbox"].tolist(), "conf": float(d["conf"]), "label": labels[int(d["label"])]}
+                       for d in dets],
+        "tracks": tracks,
+        "inputs": inputs,
+    }
@@ -0,0 +1,173 @@
+"""Escena compilada: geometría de la config convertida una sola vez a NumPy.
+
+    scene = Scene(cfg)                 # cfg ya mezclado y validado (core/utils/config.py)
+    scene.line("stop_line").crossed(prev_centers, centers)   # vectorizado
+    scene.polygon("no_cross_polygon").contains(centers, frame_size)
+
+- Line: ecuación normalizada a*x + b*y + c = 0 (|(a, b)| = 1) precalculada;
+  side() da la distancia con signo de muchos puntos a la vez.
+- Polygon: vértices en float64 y, al conocer el tamaño del frame, una máscara
+  rasterizada (cv2.fillPoly) a esa resolución: contains() pasa a ser una
+  lectura O(1) por punto. Puntos fuera del frame usan ray casting vectorizado.
+- SceneWatcher: vigila el YAML de la escena y sus includes (mtime) y devuelve
+  la config nueva cuando cambian, para recargar reglas y overlays sin tocar
+  los modelos (Pipeline.reload_scene).
+"""
+
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from core.utils.config import load_config_with_sources
+
+log = logging.getLogger(__name__)
+
+
+class Line:
+    __slots__ = ("p1", "p2", "normal", "c")
+
+    def __init__(self, seg):
+        self.p1 = np.asarray(seg[0], dtype=np.float64)
+        self.p2 = np.asarray(seg[1], dtype=np.float64)
+        d = self.p2 - self.p1
+        # Normal unitaria a la derecha de p1->p2 en la imagen (y hacia abajo)
+        self.normal = np.array([-d[1], d[0]]) / max(1e-12, float(np.hypot(d[0], d[1])))
+        self.c = -float(self.normal @ self.p1)
+
+    def side(self, points):
+        """Distancia con signo (px) de uno o varios puntos (…, 2) a la recta."""
+        return np.asarray(points, dtype=np.float64) @ self.normal + self.c
+
+    def crossed(self, prev, curr):
+        """True donde el movimiento prev->curr deja la recta a lados opuestos."""
+        return self.side(prev) * self.side(curr) < 0
+
+    def crossing_time(self, c_prev, c_curr, t_prev, t_curr):
+        """Instante interpolado en que c_prev->c_curr cruza la recta; None si no cruza."""
+        s_prev, s_curr = float(self.side(c_prev)), float(self.side(c_curr))
+        if s_prev * s_curr >= 0:
+            return None
+        return t_prev + s_prev / (s_prev - s_curr) * (t_curr - t_prev)
+
+    def distance(self, points):
+        """Distancia euclídea de uno o varios puntos al SEGMENTO p1->p2."""
+        p = np.asarray(points, dtype=np.float64)
+        d = self.p2 - self.p1
+        u = np.clip(((p - self.p1) @ d) / max(1e-12, float(d @ d)), 0.0, 1.0)
+        return np.linalg.norm(p - (self.p1 + u[..., None] * d), axis=-1)
+
+
+class Polygon:
+    __slots__ = ("vertices", "_mask", "_size")
+
+    def __init__(self, points):
+        self.vertices = np.asarray(points, dtype=np.float64)
+        self._mask = None
+        self._size = None
+
+    def rasterize(self, size):
+        """Máscara (alto, ancho) a la resolución de proceso; se rehace sólo si cambia el tamaño."""
+        size = (int(size[0]), int(size[1]))
+        if self._size != size:
+            mask = np.zeros((size[1], size[0]), dtype=np.uint8)
+            cv2.fillPoly(mask, [np.round(self.vertices).astype(np.int32)], 1)
+            self._mask, self._size = mask.view(bool), size
+        return self._mask
+
+    def _ray_cast(self, pts):
+        x, y = pts[:, 0:1], pts[:, 1:2]
+        x1, y1 = self.vertices[:, 0], self.vertices[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        hit = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1 + 1e-9) + x1)
+        return np.count_nonzero(hit, axis=1) % 2 == 1
+
+    def contains(self, points, size=None):
+        """
+        Máscara booleana de qué puntos (N, 2) están dentro. Con `size`
+        (ancho, alto del frame) se usa la máscara rasterizada.
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if size is None or not len(pts):
+            return self._ray_cast(pts)
+        mask = self.rasterize(size)
+        xi, yi = np.floor(pts[:, 0]).astype(np.int64), np.floor(pts[:, 1]).astype(np.int64)
+        inside_frame = (xi >= 0) & (yi >= 0) & (xi < mask.shape[1]) & (yi < mask.shape[0])
+        out = np.zeros(len(pts), dtype=bool)
+        out[inside_frame] = mask[yi[inside_frame], xi[inside_frame]]
+        if not inside_frame.all():
+            out[~inside_frame] = self._ray_cast(pts[~inside_frame])
+        return out
+
+
+class Scene:
+    """Geometría de `cfg["geometry"]` compilada: líneas y polígonos por nombre."""
+
+    def __init__(self, cfg):
+        geom = cfg.get("geometry") or {}
+        self.lines = {}
+        for name in ("stop_line", "lane_center"):
+            if geom.get(name):
+                self.lines[name] = Line(geom[name])
+        for name, seg in (geom.get("speed_lines") or {}).items():
+            self.lines[f"speed_{name}"] = Line(seg)
+        self.polygons = {name: Polygon(pts) for name, pts in geom.items()
+                         if name.endswith("_polygon") and pts}
+        self.size = None   # resolución de proceso (ancho, alto) tras rasterize()
+
+    def line(self, name):
+        return self.lines.get(name)
+
+    def polygon(self, name):
+        return self.polygons.get(name)
+
+    def rasterize(self, size):
+        """Pre-rasteriza todos los polígonos al tamaño de proceso (ancho, alto)."""
+        self.size = (int(size[0]), int(size[1]))
+        for poly in self.polygons.values():
+            poly.rasterize(self.size)
+
+
+class SceneWatcher:
+    """Detecta cambios en el YAML de la escena (o sus includes) para recargarla en caliente."""
+
+    def __init__(self, path, check_seconds=2.0):
+        self.path = path
+        self.check_seconds = float(check_seconds)
+        _, sources = load_config_with_sources(path, validate=False)
+        self._mtimes = self._stat(sources)
+        self._next = time.monotonic() + self.check_seconds
+
+    @staticmethod
+    def _stat(paths):
+        out = {}
+        for p in paths:
+            try:
+                out[p] = os.stat(p).st_mtime_ns
+            except OSError:
+                out[p] = None
+        return out
+
+    def poll(self):
+        """
+        Config nueva (mezclada y validada) si algún archivo cambió desde la
+        última vez; None si no hay cambios o la nueva config es inválida (se
+        registra el error y se sigue con la anterior).
+        """
+        now = time.monotonic()
+        if now < self._next:
+            return None
+        self._next = now + self.check_seconds
+        if self._stat(self._mtimes) == self._mtimes:
+            return None
+        try:
+            cfg, sources = load_config_with_sources(self.path)
+        except Exception as e:
+            log.error(f"Escena {self.path} modificada pero inválida; se mantiene la anterior: {e}")
+            self._mtimes = self._stat(self._mtimes)
+            return None
+        self._mtimes = self._stat(sources)
+        log.info(f"Escena {self.path} recargada")
+        return cfg
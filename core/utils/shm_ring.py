@@ -0,0 +1,84 @@
+"""Anillo de frames en memoria compartida (multiprocessing.shared_memory).
+
+El proceso decodificador escribe cada frame directamente en un slot del
+anillo y sólo envía por las colas el índice del slot y metadatos pequeños
+(frame_idx, ts, detecciones). Los demás procesos leen el slot como un
+np.ndarray sin copiar. Cada slot lleva un contador de referencias: se fija
+al número de etapas consumidoras al adquirirlo y cada etapa lo libera al
+terminar; cuando llega a cero el slot vuelve a la cola de libres.
+
+El objeto se puede pasar como argumento a multiprocessing.Process (también
+con 'spawn'): al deserializarse se vuelve a adjuntar al mismo bloque.
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedFrameRing:
+    def __init__(self, slots, shape, dtype=np.uint8, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self.slots = int(slots)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.frame_bytes)
+        self._owner = True
+        self._refs = ctx.Array("i", self.slots)     # con lock propio
+        self._free = ctx.Queue()
+        for i in range(self.slots):
+            self._free.put(i)
+        self._views = self._make_views()
+
+    def _make_views(self):
+        buf = np.ndarray((self.slots, *self.shape), dtype=self.dtype, buffer=self._shm.buf)
+        return [buf[i] for i in range(self.slots)]
+
+    def __getstate__(self):
+        return {
+            "slots": self.slots, "shape": self.shape, "dtype": self.dtype.str,
+            "frame_bytes": self.frame_bytes, "name": self._shm.name,
+            "refs": self._refs, "free": self._free,
+        }
+
+    def __setstate__(self, st):
+        self.slots, self.shape = st["slots"], tuple(st["shape"])
+        self.dtype, self.frame_bytes = np.dtype(st["dtype"]), st["frame_bytes"]
+        self._shm = shared_memory.SharedMemory(name=st["name"])
+        self._owner = False
+        self._refs, self._free = st["refs"], st["free"]
+        self._views = self._make_views()
+
+    def acquire(self, consumers, timeout=None):
+        """Toma un slot libre (bloquea hasta `timeout`) con `consumers` referencias."""
+        slot = self._free.get(timeout=timeout)
+        with self._refs.get_lock():
+            self._refs[slot] = int(consumers)
+        return slot
+
+    def free_slots(self):
+        """Slots libres ahora mismo (telemetría; NotImplementedError en macOS)."""
+        return self._free.qsize()
+
+    def view(self, slot):
+        """np.ndarray (sin copia) del slot; válido mientras se mantenga la referencia."""
+        return self._views[slot]
+
+    def release(self, slot):
+        """Suelta una referencia; el último en soltar recicla el slot."""
+        with self._refs.get_lock():
+            self._refs[slot] -= 1
+            free = self._refs[slot] <= 0
+        if free:
+            self._free.put(slot)
+
+    def close(self):
+        self._views = []
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # aún hay vistas vivas; el SO libera el mapeo al salir del proceso
+        if self._owner:
+            self._shm.unlink()
@@ -0,0 +1,221 @@
+"""Telemetría en vivo para pipelines de larga duración.
+
+Cada Pipeline tiene un Telemetry (se registra solo en el registro del
+proceso con un nombre único: la etiqueta `pipeline` de sus series). En el frame loop sólo se hacen operaciones O(1) sobre arrays
+preasignados: latencia por etapa (ring de las últimas `window` muestras),
+instante de cada frame (fps móvil) y contadores. Lo costoso (percentiles,
+tamaño del estado de las reglas, RSS) se calcula sólo al exportar:
+
+  - render_prometheus(): texto en formato Prometheus de todos los Telemetry
+    del proceso; start_metrics_server(port) lo sirve en /metrics.
+  - Telemetry.maybe_log(): cada `json_log_seconds` una línea JSON con la
+    foto actual en el logger "telemetry".
+
+setup_logging() configura el logging con niveles para los scripts y la GUI
+(los módulos usan logging.getLogger(__name__)).
+"""
+
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+json_log = logging.getLogger("telemetry")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_REGISTRY = weakref.WeakSet()
+_registry_lock = threading.Lock()
+_server = None
+_server_lock = threading.Lock()
+
+
+def setup_logging(level=None):
+    """Logging con niveles a stderr; nivel por argumento o variable LOG_LEVEL (INFO por defecto)."""
+    level = (level or os.environ.get("LOG_LEVEL") or "INFO").upper()
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
+
+def rss_bytes():
+    """Memoria residente actual del proceso (pico si /proc no está disponible)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak * (1 if os.uname().sysname == "Darwin" else 1024)
+
+
+class _Stage:
+    __slots__ = ("ring", "i", "count", "total")
+
+    def __init__(self, window):
+        self.ring = np.zeros(window, dtype=np.float64)
+        self.i = self.count = 0
+        self.total = 0.0
+
+
+class Telemetry:
+    def __init__(self, name="pipeline", window=256, json_log_seconds=0.0):
+        # Dos instancias vivas con el mismo nombre darían series duplicadas
+        # (Prometheus rechaza el scrape): la segunda recibe un sufijo #2, #3...
+        with _registry_lock:
+            taken = {tel.name for tel in list(_REGISTRY)}
+            unique, n = name, 1
+            while unique in taken:
+                n += 1
+                unique = f"{name}#{n}"
+            self.name = unique
+            _REGISTRY.add(self)
+        self.window = int(window)
+        self.json_log_seconds = float(json_log_seconds)
+        self._stages = {}
+        self._frame_t = np.zeros(self.window, dtype=np.float64)
+        self.frames = 0
+        self._counters = {}     # (métrica, (("etiqueta", valor), ...)) -> valor
+        self._collectors = []   # fn() -> [(métrica, tipo, {etiquetas}, valor)]
+        self._last_log = time.monotonic()
+
+    # --- Registro (frame loop: barato) ---
+    def stage(self, name, seconds):
+        st = self._stages.get(name)
+        if st is None:
+            st = self._stages[name] = _Stage(self.window)
+        st.ring[st.i] = seconds
+        st.i = (st.i + 1) % self.window
+        st.count += 1
+        st.total += seconds
+
+    def frame(self):
+        self._frame_t[self.frames % self.window] = time.perf_counter()
+        self.frames += 1
+
+    def inc(self, metric, value=1, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_collector(self, fn):
+        """fn() -> lista de (métrica, "gauge"|"counter", {etiquetas}, valor), evaluada al exportar."""
+        self._collectors.append(fn)
+
+    # --- Exportación ---
+    def fps(self):
+        n = min(self.frames, self.window)
+        if n < 2:
+            return 0.0
+        last = self._frame_t[(self.frames - 1) % self.window]
+        first = self._frame_t[(self.frames - n) % self.window]
+        return (n - 1) / max(1e-9, last - first)
+
+    def samples(self):
+        """Lista de (métrica, tipo, {etiquetas}, valor) con todas las series actuales."""
+        out = [("pipeline_fps", "gauge", {}, self.fps()),
+               ("pipeline_frames_total", "counter", {}, self.frames)]
+        for name, st in list(self._stages.items()):
+            recent = st.ring[:min(st.count, self.window)]
+            p50, p95 = np.percentile(recent, (50, 95)) if recent.size else (0.0, 0.0)
+            out += [("pipeline_stage_seconds", "summary", {"stage": name, "quantile": "0.5"}, p50),
+                    ("pipeline_stage_seconds", "summary", {"stage": name, "quantile": "0.95"}, p95),
+                    ("pipeline_stage_seconds_sum", "summary", {"stage": name}, st.total),
+                    ("pipeline_stage_seconds_count", "summary", {"stage": name}, st.count)]
+        for (metric, labels), v in list(self._counters.items()):
+            out.append((metric, "counter", dict(labels), v))
+        for fn in self._collectors:
+            try:
+                out += list(fn())
+            except Exception as e:
+                log.debug(f"Colector de telemetría falló: {e}")
+        return out
+
+    def snapshot(self):
+        """Foto compacta para la línea JSON: {"pipeline", "fps", "frames", "stages_ms", métricas...}."""
+        snap = {"pipeline": self.name, "fps": round(self.fps(), 2), "frames": self.frames, "rss_mb": round(rss_bytes() / 2**20, 1),
+                "stages_ms": {}}
+        for metric, _, labels, v in self.samples():
+            if metric == "pipeline_stage_seconds" and labels.get("quantile") == "0.5":
+                snap["stages_ms"][labels["stage"]] = round(v * 1000, 2)
+            elif metric not in ("pipeline_fps", "pipeline_frames_total") and not metric.startswith("pipeline_stage_"):
+                key = metric + "".join(f".{v_}" for k_, v_ in sorted(labels.items()))
+                snap[key] = round(v, 3) if isinstance(v, float) else v
+        return snap
+
+    def maybe_log(self):
+        """Emite la línea JSON si pasó `json_log_seconds` desde la anterior (0 = nunca)."""
+        if self.json_log_seconds <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_log >= self.json_log_seconds:
+            self._last_log = now
+            json_log.info(json.dumps(self.snapshot(), ensure_ascii=False))
+
+
+def _escape_label(value):
+    # Formato de texto de Prometheus: \ " y salto de línea se escapan
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def render_prometheus():
+    """Texto Prometheus (v0.0.4) con las series de todos los Telemetry vivos del proceso."""
+    by_metric = {}
+    for tel in list(_REGISTRY):
+        for metric, kind, labels, value in tel.samples():
+            base = metric[:-4] if metric.endswith("_sum") else metric[:-6] if metric.endswith("_count") else metric
+            entry = by_metric.setdefault(base, (kind, []))
+            entry[1].append((metric, {"pipeline": tel.name, **labels}, value))
+    lines = ["# TYPE process_resident_memory_bytes gauge", f"process_resident_memory_bytes {rss_bytes()}"]
+    for base, (kind, series) in sorted(by_metric.items()):
+        lines.append(f"# TYPE {base} {kind}")
+        lines += [f"{m}{_fmt_labels(lb)} {float(v):.12g}" for m, lb, v in series]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass   # sin una línea de log por cada scrape
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Sirve /metrics en un hilo daemon (uno por proceso; llamadas repetidas no hacen nada)."""
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError as e:
+                log.warning(f"No se pudo abrir el endpoint de métricas en {host}:{port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            log.info(f"Métricas Prometheus en http://{host}:{port}/metrics")
+        return _server
+
+
+def start_from_config(tcfg):
+    """Arranca el endpoint según la sección `telemetry:` (http_port > 0)."""
+    tcfg = tcfg or {}
+    if int(tcfg.get("http_port", 0) or 0) > 0:
+        start_metrics_server(tcfg["http_port"], tcfg.get("http_host", "127.0.0.1"))
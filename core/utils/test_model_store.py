@@ -0,0 +1,180 @@
+# Pruebas del almacén de modelos contra mirrors HTTP locales (http.server en un
+# hilo): descarga reanudable con Range, verificación SHA256 y paso de mirror.
+#
+#   python -m pytest core/utils/test_model_store.py
+
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.utils.model_store import ModelStore
+
+BLOB = os.urandom(3 * 1024 * 1024 + 123)   # más de un CHUNK
+SHA = hashlib.sha256(BLOB).hexdigest()
+
+
+class Mirror:
+    """
+    Servidor HTTP local que sirve `blob` en cualquier ruta. Atiende Range
+    (206 / 416 con Content-Range) salvo con ranges=False; con cut=N corta la
+    conexión tras N bytes anunciando el Content-Length completo.
+    """
+
+    def __init__(self, blob=BLOB, ranges=True, cut=None):
+        self.blob, self.ranges, self.cut = blob, ranges, cut
+        self.requests = []   # cabecera Range de cada petición (None si no hubo)
+        mirror = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                mirror.requests.append(self.headers.get("Range"))
+                mirror.serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/model.pt"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def serve(self, handler):
+        blob, start = self.blob, 0
+        rng = handler.headers.get("Range")
+        if rng and self.ranges:
+            start = int(rng.removeprefix("bytes=").rstrip("-"))
+            if start >= len(blob):
+                handler.send_response(416)
+                handler.send_header("Content-Range", f"bytes */{len(blob)}")
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{len(blob) - 1}/{len(blob)}")
+        else:
+            handler.send_response(200)
+        body = blob[start:]
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body if self.cut is None else body[:self.cut])
+        handler.close_connection = True
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def mirrors():
+    started = []
+
+    def start(**kwargs):
+        started.append(Mirror(**kwargs))
+        return started[-1]
+
+    yield start
+    for m in started:
+        m.close()
+
+
+def _store(tmp_path, urls, sha256=SHA):
+    manifest = {"model": {"path": str(tmp_path / "models" / "model.pt"), "sha256": sha256, "mirrors": urls}}
+    return ModelStore(manifest, cache_path=str(tmp_path / "verified.json"), timeout=10)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_is_verified_and_published(tmp_path, mirrors):
+    m = mirrors()
+    store = _store(tmp_path, [m.url])
+    path = store.ensure("model")
+    assert _read(path) == BLOB
+    assert not os.path.exists(path + ".part")
+    assert m.requests == [None]
+
+
+def test_resumes_from_existing_part(tmp_path, mirrors):
+    m = mirrors()
+    store = _store(tmp_path, [m.url])
+    dest = store.manifest["model"]["path"]
+    os.makedirs(os.path.dirname(dest))
+    with open(dest + ".part", "wb") as f:
+        f.write(BLOB[:1000])
+    assert _read(store.ensure("model")) == BLOB
+    assert m.requests == ["bytes=1000-"]
+
+
+def test_complete_part_is_published_after_416(tmp_path, mirrors):
+    m = mirrors()
+    store = _store(tmp_path, [m.url])
+    dest = store.manifest["model"]["path"]
+    os.makedirs(os.path.dirname(dest))
+    with open(dest + ".part", "wb") as f:
+        f.write(BLOB)
+    assert _read(store.ensure("model")) == BLOB
+    assert m.requests == [f"bytes={len(BLOB)}-"]
+
+
+def test_server_ignoring_range_restarts_from_zero(tmp_path, mirrors):
+    m = mirrors(ranges=False)
+    store = _store(tmp_path, [m.url])
+    dest = store.manifest["model"]["path"]
+    os.makedirs(os.path.dirname(dest))
+    with open(dest + ".part", "wb") as f:
+        f.write(b"x" * 500)   # basura: si se concatenara, el hash fallaría
+    assert _read(store.ensure("model")) == BLOB
+
+
+def test_truncated_transfer_keeps_part_and_resumes_on_next_mirror(tmp_path, mirrors):
+    cut = 2 * 1024 * 1024
+    broken, good = mirrors(cut=cut), mirrors()
+    store = _store(tmp_path, [broken.url, good.url])
+    path = store.ensure("model")
+    assert _read(path) == BLOB
+    assert broken.requests == [None]
+    assert good.requests == [f"bytes={cut}-"]   # sigue donde se cortó
+
+
+def test_bad_hash_discards_part_and_tries_next_mirror(tmp_path, mirrors):
+    wrong, good = mirrors(blob=BLOB[::-1]), mirrors()
+    store = _store(tmp_path, [wrong.url, good.url])
+    assert _read(store.ensure("model")) == BLOB
+    assert good.requests == [None]   # el .part con hash incorrecto no se reanuda
+
+
+def test_all_mirrors_failing_raises(tmp_path, mirrors):
+    wrong = mirrors(blob=b"otro modelo")
+    store = _store(tmp_path, [wrong.url])
+    with pytest.raises(RuntimeError, match="SHA256 incorrecto"):
+        store.ensure("model")
+    dest = store.manifest["model"]["path"]
+    assert not os.path.exists(dest) and not os.path.exists(dest + ".part")
+    with pytest.raises(RuntimeError, match="sin mirrors"):
+        _store(tmp_path, []).ensure("model")
+
+
+def test_verified_cache_avoids_rehash_and_download(tmp_path, mirrors, monkeypatch):
+    m = mirrors()
+    store = _store(tmp_path, [m.url])
+    path = store.ensure("model")
+    # Store nuevo (otro arranque): la caché en disco evita hashear y descargar
+    again = _store(tmp_path, [m.url])
+    monkeypatch.setattr("core.utils.model_store._hash_into", lambda *a: pytest.fail("se volvió a hashear"))
+    assert again.ensure("model") == path
+    assert m.requests == [None]
+
+
+def test_corrupted_model_is_downloaded_again(tmp_path, mirrors):
+    m = mirrors()
+    store = _store(tmp_path, [m.url])
+    path = store.ensure("model")
+    with open(path, "r+b") as f:
+        f.write(b"\0" * 16)   # cambia el mtime: la caché ya no vale
+    os.utime(path, ns=(0, 0))
+    assert _read(_store(tmp_path, [m.url]).ensure("model")) == BLOB
+    assert len(m.requests) == 2
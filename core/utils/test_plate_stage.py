@@ -0,0 +1,151 @@
+# Pruebas de la lectura asíncrona de placas con un reconocedor stub (sin OCR real).
+#
+#   python -m pytest core/utils/test_plate_stage.py
+
+import csv
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from core.utils.events import EventLogger
+from core.utils.plate_stage import PlateOCRStage
+
+
+class StubRecognizer:
+    """recognize(crop) -> (texto, conf); registra los recortes recibidos y puede bloquear o fallar."""
+
+    def __init__(self, text="ABC123", conf=0.9, delay=0.0, error=None, gate=None):
+        self.text, self.conf, self.delay, self.error, self.gate = text, conf, delay, error, gate
+        self.crops = []
+        self.threads = set()
+
+    def recognize(self, crop):
+        self.threads.add(threading.current_thread().name)
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(self.delay)
+        self.crops.append(crop)
+        if self.error:
+            raise self.error
+        return self.text, self.conf
+
+
+def _frame(blur=0, seed=0):
+    img = (np.random.default_rng(seed).random((240, 320, 3)) * 255).astype(np.uint8)
+    return cv2.GaussianBlur(img, (blur, blur), 0) if blur else img
+
+
+BBOX = [40, 40, 200, 200]
+TRACK = [{"id": 7, "bbox": BBOX, "label": "car"}]
+
+
+def test_sharpest_candidate_goes_to_ocr_once():
+    rec = StubRecognizer()
+    stage = PlateOCRStage(rec, candidates=4)
+    assert stage.request(7, _frame(blur=9), BBOX) is None
+    sharp = _frame(blur=0, seed=1)
+    for frame in (_frame(blur=7), sharp, _frame(blur=5)):   # 4 candidatos en total
+        stage.observe(frame, TRACK)
+    plates = stage.close()
+    assert plates == {"7": "ABC123"}
+    assert len(rec.crops) == 1
+    # Mitad inferior del bbox del frame nítido
+    np.testing.assert_array_equal(rec.crops[0], sharp[120:200, 40:200])
+    assert rec.threads == {"plate-ocr_0"}
+
+
+def test_cached_plate_is_returned_without_new_ocr():
+    rec = StubRecognizer()
+    stage = PlateOCRStage(rec, candidates=1)
+    stage.request("7", _frame(), BBOX)
+    deadline = time.monotonic() + 5
+    while stage.queue_depth()["ocr"] and time.monotonic() < deadline:   # lectura en curso
+        time.sleep(0.01)
+    assert stage.request(7, _frame(), BBOX) == "ABC123"
+    assert stage.ocr_calls == 1
+
+
+def test_frame_loop_does_not_wait_for_ocr():
+    gate = threading.Event()
+    rec = StubRecognizer(gate=gate)
+    stage = PlateOCRStage(rec, candidates=1, workers=1)
+    t0 = time.perf_counter()
+    for vid in range(5):
+        stage.request(vid, _frame(seed=vid), BBOX)
+        stage.observe(_frame(seed=vid), [{"id": vid, "bbox": BBOX, "label": "car"}])
+    assert time.perf_counter() - t0 < 1.0
+    assert stage.queue_depth()["ocr"] == 5
+    gate.set()
+    assert len(stage.close()) == 5
+
+
+def test_missing_track_is_read_with_available_crop():
+    rec = StubRecognizer()
+    stage = PlateOCRStage(rec, candidates=10, max_missing=2)
+    stage.request(7, _frame(), BBOX)
+    for _ in range(3):
+        stage.observe(_frame(), [])
+    assert stage.queue_depth()["candidates"] == 0   # ya enviado al OCR
+    assert stage.close() == {"7": "ABC123"}
+
+
+def test_low_confidence_and_errors_give_empty_plate():
+    low = PlateOCRStage(StubRecognizer(conf=0.1), candidates=1, min_conf=0.3)
+    low.request(1, _frame(), BBOX)
+    assert low.close() == {"1": ""}
+    broken = PlateOCRStage(StubRecognizer(error=RuntimeError("sin modelo")), candidates=1)
+    broken.request(2, _frame(), BBOX)
+    assert broken.close() == {"2": ""}
+
+
+def test_logger_fills_plate_column_after_run(tmp_path):
+    logger = EventLogger(str(tmp_path), str(tmp_path / "evidence"), evidence_cfg={"thumbnail_px": 0})
+    logger.plate_stage = PlateOCRStage(StubRecognizer(delay=0.05), candidates=3)
+    logger.frame_idx = 1
+    frame = _frame()
+    logger.log("overspeed", 1.0, 7, BBOX, extra={"kmh": 60}, frame=frame)
+    logger.log("no_helmet", 1.0, 3, [60, 20, 100, 120], extra={"moto_id": 7}, frame=frame)
+    for i in range(2, 5):
+        logger.frame_idx = i
+        logger.plate_stage.observe(frame, TRACK)
+    logger.close()
+    with open(tmp_path / "events.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["placa"] for r in rows] == ["ABC123", "ABC123"]
+
+
+def test_resume_from_checkpoint_keeps_csv_and_fills_plates(tmp_path):
+    # Ejecución cancelada: checkpoint con dos filas esperando placa (una en el
+    # OCR, otra reuniendo candidatos) y una fila posterior que se descarta
+    gate = threading.Event()
+    logger = EventLogger(str(tmp_path), str(tmp_path / "evidence"), evidence_cfg={"thumbnail_px": 0})
+    logger.plate_stage = PlateOCRStage(StubRecognizer(gate=gate), candidates=3)
+    frame = _frame()
+    logger.frame_idx = 1
+    logger.log("overspeed", 1.0, 7, BBOX, frame=frame)
+    logger.log("overspeed", 1.0, 8, BBOX, frame=frame)
+    for i in range(2, 4):
+        logger.frame_idx = i
+        logger.plate_stage.observe(frame, TRACK)   # el 7 completa candidatos; el 8 no se ve
+    ckpt = {"logger": logger.state_dict(), "plates": logger.plate_stage.state_dict()}
+    assert set(ckpt["plates"]["pending"]) == {"7", "8"}
+    logger.log("red_light", 2.0, 9, BBOX, frame=frame)
+    logger.close(rewrite=False)
+    gate.set()
+    assert os.path.getsize(logger.csv_path) > ckpt["logger"]["csv_bytes"]
+
+    resumed = EventLogger(str(tmp_path), str(tmp_path / "evidence"), evidence_cfg={"thumbnail_px": 0})
+    resumed.load_state_dict(ckpt["logger"])
+    resumed.plate_stage = PlateOCRStage(StubRecognizer(text="XYZ789"), candidates=3)
+    resumed.plate_stage.load_state_dict(ckpt["plates"])
+    resumed.frame_idx = 4
+    resumed.log("red_light", 2.0, 9, BBOX, frame=frame)
+    resumed.close()
+    with open(tmp_path / "events.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["tipo_infraccion"], r["id_objeto"]) for r in rows] == [
+        ("overspeed", "7"), ("overspeed", "8"), ("red_light", "9")]
+    assert all(r["placa"] == "XYZ789" for r in rows)
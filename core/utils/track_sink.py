@@ -0,0 +1,202 @@
+"""Exportación columnar de tracks por frame (para analítica de tráfico).
+
+Cada frame añade una fila por track confirmado a un buffer NumPy
+preasignado de `chunk_rows` filas (sin listas ni dicts que crezcan). Al
+llenarse, el buffer pasa a un hilo escritor y el frame loop sigue con el
+otro: sólo hay dos buffers, así que si el disco no da abasto el loop espera
+en vez de acumular memoria.
+
+Formato en disco (<dir>/):
+    tracks_000000.parquet | tracks_000000.npy   un archivo por chunk
+    meta.json                                   etiquetas (código -> nombre), fps, columnas
+
+Parquet requiere `pyarrow` (opcional); sin él los chunks son arrays
+estructurados .npy. iter_track_chunks() lee ambos, chunk a chunk; las
+consultas agregadas están en core/track_analytics.py.
+
+Checkpoints: flush() escribe el chunk parcial y espera al disco; state_dict()
+guarda el número del siguiente chunk. Al reanudar, load_state_dict() borra
+los chunks posteriores al checkpoint (sus frames se vuelven a procesar).
+"""
+
+import logging
+import glob
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+TRACK_ROW = np.dtype([
+    ("frame", "<i4"), ("ts", "<f8"), ("id", "<i4"), ("label", "u1"),
+    ("x1", "<f4"), ("y1", "<f4"), ("x2", "<f4"), ("y2", "<f4"),
+    ("cx", "<f4"), ("cy", "<f4"),
+    ("speed_kmh", "<f4"),   # NaN si no se conoce (sin homografía o sin regla de velocidad)
+])
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class TrackSink:
+    def __init__(self, out_dir, chunk_rows=65536, fmt="auto", meta=None):
+        """fmt: "parquet", "npy" o "auto" (parquet si hay pyarrow)."""
+        if fmt == "auto":
+            fmt = "parquet" if _has_pyarrow() else "npy"
+        elif fmt == "parquet" and not _has_pyarrow():
+            log.warning("pyarrow no instalado; los chunks se guardan como .npy")
+            fmt = "npy"
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.chunk_rows = max(1024, int(chunk_rows))
+        self.meta = dict(meta or {})
+        os.makedirs(out_dir, exist_ok=True)
+        # Al reanudar se continúa la numeración de chunks existentes
+        self._chunk_idx = len(_chunk_paths(out_dir))
+        self._labels = {}
+        if self._chunk_idx and os.path.exists(os.path.join(out_dir, "meta.json")):
+            self._labels = {name: c for c, name in read_track_meta(out_dir)["labels"].items()}
+        self._free = queue.Queue()
+        for _ in range(2):
+            self._free.put(np.empty(self.chunk_rows, dtype=TRACK_ROW))
+        self._buf = self._free.get()
+        self._n = 0
+        self._pending = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._writer, name="track-sink", daemon=True)
+        self._thread.start()
+        self.rows = 0
+
+    @classmethod
+    def from_config(cls, output_dir, tcfg, meta=None):
+        """Sink según la sección `tracks_export:` (None si está deshabilitada)."""
+        tcfg = tcfg or {}
+        if not tcfg.get("enabled"):
+            return None
+        return cls(os.path.join(output_dir, "tracks"), chunk_rows=tcfg.get("chunk_rows", 65536),
+                   fmt=tcfg.get("format", "auto"), meta=meta)
+
+    def _label(self, name):
+        code = self._labels.get(name)
+        if code is None:
+            code = self._labels[name] = len(self._labels)
+        return code
+
+    def write(self, frame_idx, ts, tracks, speeds=None):
+        """Añade una fila por track. speeds: {track_id: km/h} opcional."""
+        speeds = speeds or {}
+        for t in tracks:
+            if self._n == self.chunk_rows:
+                self._rotate()
+            x1, y1, x2, y2 = t["bbox"]
+            self._buf[self._n] = (frame_idx, ts, int(t["id"]), self._label(t["label"]),
+                                  x1, y1, x2, y2, (x1 + x2) / 2.0, (y1 + y2) / 2.0,
+                                  speeds.get(t["id"], np.nan))
+            self._n += 1
+        self.rows += len(tracks)
+
+    def _rotate(self):
+        # Entrega el buffer lleno al escritor y toma el libre (espera si ambos están ocupados)
+        self._pending.put((self._chunk_idx, self._buf, self._n, dict(self._labels)))
+        self._chunk_idx += 1
+        self._buf, self._n = self._free.get(), 0
+
+    def _writer(self):
+        while (item := self._pending.get()) is not None:
+            idx, buf, n, labels = item
+            try:
+                self._write_chunk(idx, buf[:n], labels)
+            except Exception as e:
+                log.error(f"Error al escribir el chunk {idx}: {e}")
+            self._free.put(buf)
+            self._pending.task_done()
+
+    def _write_chunk(self, idx, rows, labels):
+        base = os.path.join(self.out_dir, f"tracks_{idx:06d}")
+        tmp = base + ".tmp"
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table({name: rows[name] for name in TRACK_ROW.names}), tmp)
+            os.replace(tmp, base + ".parquet")
+        else:
+            with open(tmp, "wb") as f:
+                np.save(f, rows)
+            os.replace(tmp, base + ".npy")
+        # Etiquetas vistas hasta este chunk (los lectores pueden leer mientras se escribe)
+        meta = {**self.meta, "labels": {str(c): name for name, c in labels.items()},
+                "columns": list(TRACK_ROW.names)}
+        with open(os.path.join(self.out_dir, "meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(self.out_dir, "meta.json.tmp"), os.path.join(self.out_dir, "meta.json"))
+
+    def queue_depth(self):
+        """Chunks llenos esperando al hilo escritor (telemetría)."""
+        return self._pending.qsize()
+
+    def flush(self):
+        """Cierra el chunk parcial (si hay filas) y espera a que todo esté en disco."""
+        if self._n:
+            self._rotate()
+        self._pending.join()
+
+    def state_dict(self):
+        """Posición del sink (para checkpoints; llamar tras flush())."""
+        return {"chunk_idx": self._chunk_idx, "labels": dict(self._labels)}
+
+    def load_state_dict(self, state):
+        """
+        Vuelve a la posición del checkpoint: borra los chunks escritos después
+        (sus frames se procesan de nuevo al reanudar) y sigue la numeración.
+        """
+        self.flush()
+        for path in _chunk_paths(self.out_dir):
+            idx = int(os.path.basename(path).split("_")[1].split(".")[0])
+            if idx >= state["chunk_idx"]:
+                os.remove(path)
+        self._chunk_idx = state["chunk_idx"]
+        self._labels = dict(state["labels"])
+
+    def close(self):
+        """Escribe el último chunk parcial y espera al hilo escritor."""
+        if self._thread is None:
+            return
+        if self._n:
+            self._rotate()
+        self._pending.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+def _chunk_paths(track_dir):
+    return sorted(p for p in glob.glob(os.path.join(track_dir, "tracks_*.*")) if p.endswith((".parquet", ".npy")))
+
+
+def read_track_meta(track_dir):
+    with open(os.path.join(track_dir, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["labels"] = {int(c): name for c, name in meta.get("labels", {}).items()}
+    return meta
+
+
+def iter_track_chunks(track_dir, columns=None):
+    """
+    Genera un dict {columna: ndarray} por chunk, en orden. Con `columns` sólo
+    se leen esas columnas (Parquet lee sólo esas del disco; .npy se mapea en memoria).
+    """
+    columns = list(columns or TRACK_ROW.names)
+    for path in _chunk_paths(track_dir):
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            table = pq.read_table(path, columns=columns)
+            yield {c: table.column(c).to_numpy() for c in columns}
+        else:
+            rows = np.load(path, mmap_mode="r")
+            yield {c: np.asarray(rows[c]) for c in columns}
@@ -0,0 +1,122 @@
+"""Trayectorias recientes por track en ring buffers NumPy preasignados.
+
+Guarda los últimos N centros (t, x, y) de hasta `max_tracks` tracks en
+arreglos fijos: no hay listas que crezcan ni memoria por frame. Cuando se
+llena, se recicla el slot del track visto hace más tiempo.
+
+La velocidad se calcula vectorizada para todos los tracks a la vez:
+los puntos de imagen se proyectan al plano del suelo con una homografía
+(metros) y se divide el desplazamiento por el Δt de la ventana.
+"""
+
+import logging
+import cv2
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def homography_from_config(hcfg):
+    """Homografía imagen→suelo desde {'image_points', 'ground_points'} (≥4 pares) o None."""
+    if not hcfg:
+        return None
+    src = np.asarray(hcfg.get("image_points") or [], dtype=np.float64)
+    dst = np.asarray(hcfg.get("ground_points") or [], dtype=np.float64)
+    if len(src) < 4 or src.shape != dst.shape:
+        log.warning("Homografía inválida: se requieren ≥4 pares image_points/ground_points")
+        return None
+    H, _ = cv2.findHomography(src, dst)
+    return H
+
+
+def to_ground(H, pts):
+    """Proyecta puntos (..., 2) de imagen al plano del suelo con la homografía H."""
+    pts = np.asarray(pts, dtype=np.float64)
+    flat = pts.reshape(-1, 2)
+    ph = flat @ H[:, :2].T + H[:, 2]
+    return (ph[:, :2] / ph[:, 2:3]).reshape(pts.shape)
+
+
+class TrajectoryStore:
+    def __init__(self, capacity=32, max_tracks=256):
+        self.capacity = int(capacity)
+        self.max_tracks = int(max_tracks)
+        self.t = np.zeros((self.max_tracks, self.capacity), dtype=np.float64)
+        self.xy = np.zeros((self.max_tracks, self.capacity, 2), dtype=np.float32)
+        self.head = np.zeros(self.max_tracks, dtype=np.int64)   # próxima posición de escritura
+        self.count = np.zeros(self.max_tracks, dtype=np.int64)  # muestras válidas (≤ capacity)
+        self.last_seen = np.full(self.max_tracks, -np.inf)
+        self.slot_of = {}                                       # track_id -> slot
+        self.id_of = [None] * self.max_tracks                   # slot -> track_id
+
+    def _slot(self, tid):
+        slot = self.slot_of.get(tid)
+        if slot is not None:
+            return slot
+        if len(self.slot_of) < self.max_tracks:
+            slot = self.id_of.index(None)
+        else:
+            # Recicla el slot menos recientemente visto
+            slot = int(np.argmin(self.last_seen))
+            del self.slot_of[self.id_of[slot]]
+        self.slot_of[tid] = slot
+        self.id_of[slot] = tid
+        self.head[slot] = 0
+        self.count[slot] = 0
+        return slot
+
+    def update(self, tracks, ts):
+        """Añade el centro actual de cada track (una vez por frame)."""
+        for t in tracks:
+            x1, y1, x2, y2 = t["bbox"]
+            slot = self._slot(t["id"])
+            h = self.head[slot]
+            self.t[slot, h] = ts
+            self.xy[slot, h, 0] = (x1 + x2) / 2.0
+            self.xy[slot, h, 1] = (y1 + y2) / 2.0
+            self.head[slot] = (h + 1) % self.capacity
+            self.count[slot] = min(self.count[slot] + 1, self.capacity)
+            self.last_seen[slot] = ts
+
+    def last(self, tid, k=1):
+        """(t, xy) de la muestra k-ésima más reciente (k=1 última) o None."""
+        slot = self.slot_of.get(tid)
+        if slot is None or self.count[slot] < k:
+            return None
+        i = (self.head[slot] - k) % self.capacity
+        return float(self.t[slot, i]), self.xy[slot, i].astype(np.float64)
+
+    def speeds(self, H=None, window=8, ts=None, min_samples=3):
+        """
+        Velocidad (unidades de H por segundo; px/s sin H) de todos los tracks
+        con ≥ min_samples muestras, usando la más reciente y la de `window`
+        muestras atrás. Si se pasa `ts`, sólo tracks vistos en ese instante.
+        Devuelve {track_id: velocidad}.
+        """
+        valid = self.count >= max(2, min_samples)
+        if ts is not None:
+            valid &= self.last_seen == ts
+        slots = np.flatnonzero(valid)
+        if slots.size == 0:
+            return {}
+        back = np.minimum(self.count[slots], window)
+        i_new = (self.head[slots] - 1) % self.capacity
+        i_old = (self.head[slots] - back) % self.capacity
+        p_new = self.xy[slots, i_new].astype(np.float64)
+        p_old = self.xy[slots, i_old].astype(np.float64)
+        if H is not None:
+            p_new = to_ground(H, p_new)
+            p_old = to_ground(H, p_old)
+        dt = self.t[slots, i_new] - self.t[slots, i_old]
+        dist = np.linalg.norm(p_new - p_old, axis=1)
+        v = np.where(dt > 0, dist / np.maximum(dt, 1e-9), 0.0)
+        return {self.id_of[s]: float(vi) for s, vi in zip(slots, v)}
+
+    def state_dict(self):
+        return {k: getattr(self, k) for k in ("t", "xy", "head", "count", "last_seen", "slot_of", "id_of")}
+
+    def load_state_dict(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+        self.capacity = self.t.shape[1]
+        self.max_tracks = self.t.shape[0]
@@ -1,16 +1,250 @@
 # core/utils/video_io.py
 # Utilidades para abrir lectores y escritores de video con fallbacks de códecs.
 # En Windows, H.264 (avc1) puede requerir la DLL de OpenH264.
+import logging
 import cv2, os, platform
+import numpy as np
 
-def open_video_reader(path):
-    cap = cv2.VideoCapture(path)
-    if not cap.isOpened():
-        raise RuntimeError(f"No se pudo abrir el video: {path}")
-    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0  # fallback si FPS=0
-    return cap, w, h, fps
+log = logging.getLogger(__name__)
+
+class OpenCVReader:
+    """
+    Lector por defecto (cv2.VideoCapture) con la interfaz común de lectores:
+    read(image=None), grab(), seek_frame(), seek_time(), release() y
+    `timestamp` (segundos del último frame leído según el contenedor).
+    get()/set() se delegan al VideoCapture para código existente.
+    """
+    backend = "opencv"
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"No se pudo abrir el video: {path}")
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0  # fallback si FPS=0
+        self.frame_count = max(0, int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0))
+        self.timestamp = None
+        self._next_idx = 0  # índice (0-based) del próximo frame a leer
+
+    def _update_timestamp(self):
+        # POS_MSEC es el pts del frame recién decodificado; algunos backends
+        # (cámaras, ciertos streams) devuelven siempre 0 -> se estima por índice
+        pos = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        self.timestamp = pos if pos > 0 or self._next_idx == 0 else self._next_idx / self.fps
+        self._next_idx += 1
+
+    def read(self, image=None):
+        ok, frame = self.cap.read(image) if image is not None else self.cap.read()
+        if ok:
+            self._update_timestamp()
+        return ok, frame
+
+    def grab(self):
+        ok = self.cap.grab()
+        if ok:
+            self._update_timestamp()
+        return ok
+
+    def retrieve(self, image=None):
+        """Convierte a BGR el último frame de grab() (sólo cuando se necesita la imagen)."""
+        return self.cap.retrieve(image) if image is not None else self.cap.retrieve()
+
+    def seek_frame(self, frame_idx):
+        """Posiciona el lector para que el próximo read() devuelva el frame `frame_idx` (0-based)."""
+        if frame_idx <= 0:
+            return
+        if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx):
+            # Algunos backends no soportan seek: se descartan frames hasta llegar
+            while self._next_idx < frame_idx and self.grab():
+                pass
+        self._next_idx = frame_idx
+
+    def seek_time(self, seconds):
+        self.seek_frame(int(round(seconds * self.fps)))
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVReader:
+    """
+    Lector FFmpeg vía PyAV (opcional: `pip install av`):
+      - Decodificación multihilo del códec (thread_type AUTO, `threads` hilos;
+        0 = los que elija FFmpeg).
+      - Seek por timestamp preciso: salta al keyframe anterior y descarta
+        frames hasta el instante pedido (sin decodificar desde el inicio).
+      - keyframes_only=True: el decodificador salta todo lo que no sea
+        keyframe (skip_frame NONKEY), útil para barridos rápidos.
+      - `timestamp` sale del pts del contenedor (correcto con VFR).
+    """
+    backend = "pyav"
+
+    def __init__(self, path, threads=0, keyframes_only=False):
+        import av  # dependencia opcional
+        self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        self.stream.thread_count = int(threads or 0)
+        if keyframes_only:
+            self.stream.codec_context.skip_frame = "NONKEY"
+        self.keyframes_only = bool(keyframes_only)
+        cc = self.stream.codec_context
+        self.width, self.height = int(cc.width), int(cc.height)
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 25.0
+        self.frame_count = int(self.stream.frames or 0)
+        if not self.frame_count and self.stream.duration and self.stream.time_base:
+            self.frame_count = int(float(self.stream.duration * self.stream.time_base) * self.fps)
+        self._start = float(self.stream.start_time * self.stream.time_base) if self.stream.start_time else 0.0
+        self._frames = self.container.decode(self.stream)
+        self._pending = None   # frame ya decodificado por seek_time(), pendiente de entregar
+        self._grabbed = None   # último frame de grab(), pendiente de retrieve()
+        self.timestamp = None
+
+    def _next(self):
+        if self._pending is not None:
+            frame, self._pending = self._pending, None
+            return frame
+        try:
+            return next(self._frames)
+        except (StopIteration, EOFError):
+            return None
+
+    def _frame_time(self, frame):
+        t = frame.time if frame.time is not None else (self.timestamp or 0.0) + 1.0 / self.fps
+        return max(0.0, t - self._start)
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def grab(self):
+        frame = self._next()
+        if frame is None:
+            self._grabbed = None
+            return False
+        self.timestamp = self._frame_time(frame)
+        self._grabbed = frame
+        return True
+
+    def retrieve(self, image=None):
+        if self._grabbed is None:
+            return False, None
+        img = self._grabbed.to_ndarray(format="bgr24")
+        if image is not None and image.shape == img.shape:
+            np.copyto(image, img)
+            img = image
+        return True, img
+
+    def seek_time(self, seconds):
+        """El próximo read() devuelve el primer frame con timestamp >= seconds."""
+        if seconds <= 0:
+            return
+        tb = self.stream.time_base
+        self.container.seek(int((seconds + self._start) / tb), stream=self.stream, backward=True)
+        self._frames = self.container.decode(self.stream)
+        self._pending = None
+        eps = 0.5 / self.fps
+        while (frame := self._next()) is not None:
+            if self._frame_time(frame) >= seconds - eps:
+                self._pending = frame
+                break
+
+    def seek_frame(self, frame_idx):
+        if frame_idx > 0:
+            self.seek_time(frame_idx / self.fps)
+
+    def get(self, prop):
+        return {
+            cv2.CAP_PROP_FRAME_WIDTH: self.width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+            cv2.CAP_PROP_FPS: self.fps,
+            cv2.CAP_PROP_FRAME_COUNT: self.frame_count,
+            cv2.CAP_PROP_POS_MSEC: (self.timestamp or 0.0) * 1000.0,
+        }.get(prop, 0.0)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.seek_frame(int(value))
+            return True
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            self.seek_time(value / 1000.0)
+            return True
+        return False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        self.container.close()
+
+
+READERS = {"opencv": OpenCVReader, "pyav": PyAVReader}
+
+
+def reader_options(cfg):
+    """Opciones de lector desde la sección `video:` del YAML (reader, decode_threads, keyframes_only)."""
+    vcfg = (cfg or {}).get("video") or {}
+    return {
+        "backend": vcfg.get("reader", "opencv"),
+        "threads": vcfg.get("decode_threads", 0),
+        "keyframes_only": vcfg.get("keyframes_only", False),
+    }
+
+
+def open_video_reader(path, backend="opencv", threads=0, keyframes_only=False):
+    """
+    Abre un lector del backend pedido ('opencv' o 'pyav') y devuelve
+    (reader, ancho, alto, fps). Si PyAV no está instalado se usa OpenCV.
+    keyframes_only sólo lo soporta PyAV (con OpenCV se decodifica todo).
+    """
+    if backend == "pyav":
+        try:
+            reader = PyAVReader(path, threads=threads, keyframes_only=keyframes_only)
+        except ImportError:
+            log.warning("PyAV no instalado (pip install av); se usa el lector OpenCV")
+            reader = None
+        except Exception as e:
+            raise RuntimeError(f"No se pudo abrir el video: {path} ({e})")
+        if reader is not None:
+            return reader, reader.width, reader.height, reader.fps
+    elif backend not in READERS:
+        log.warning(f"Lector '{backend}' desconocido; se usa el lector OpenCV")
+    if keyframes_only:
+        log.warning("keyframes_only requiere el lector 'pyav'; se decodifican todos los frames")
+    reader = OpenCVReader(path)
+    return reader, reader.width, reader.height, reader.fps
+
+def video_frame_count(cap):
+    """Número total de frames según el contenedor (0 si es desconocido, p.ej. streams)."""
+    return max(0, int(getattr(cap, "frame_count", 0) or 0))
+
+def seek_frame(cap, frame_idx):
+    """Posiciona el lector para que el próximo read() devuelva el frame `frame_idx` (0-based)."""
+    cap.seek_frame(frame_idx)
+
+def scaled_size(size, scale):
+    """(ancho, alto) reescalado por `scale`, en pares (requisito de varios códecs)."""
+    if scale == 1.0:
+        return tuple(size)
+    w, h = size
+    return max(2, int(round(w * scale)) // 2 * 2), max(2, int(round(h * scale)) // 2 * 2)
+
+def frame_timestamp(cap, frame_idx, fps):
+    """Timestamp (s) del último frame leído según el contenedor; frame_idx/fps si no hay."""
+    ts = getattr(cap, "timestamp", None)
+    return ts if ts is not None else frame_idx / fps
 
 def _try_writer(out_path, fps, size, fourcc_str, container_ext):
     """
@@ -33,14 +267,14 @@ def _try_writer(out_path, fps, size, fourcc_str, container_ext):
 
     # Log de diagnóstico amigable
     if writer.isOpened():
-        print(f"[video_io] OK -> fourcc={fourcc_str} container={container_ext} path={out}")
+        log.info(f"OK -> fourcc={fourcc_str} container={container_ext} path={out}")
     else:
-        print(f"[video_io] FAIL -> fourcc={fourcc_str} container={container_ext} path={out}")
+        log.error(f"FAIL -> fourcc={fourcc_str} container={container_ext} path={out}")
         # Hint específico para H.264 en Windows
         if platform.system() == 'Windows' and fourcc_str == 'avc1':
-            print("[video_io] H.264 en Windows requiere la DLL de OpenH264.\n"
-                  "          Descarga 'openh264-1.8.0-win64.dll' (versión del log)\n"
-                  "          y colócala en el directorio del proyecto o en una ruta del PATH.")
+            log.warning("H.264 en Windows requiere la DLL de OpenH264: descarga "
+                        "'openh264-1.8.0-win64.dll' (versión del log) y colócala en el "
+                        "directorio del proyecto o en una ruta del PATH.")
     return writer, out
 
 def open_video_writer(out_path, fps, size):
@@ -0,0 +1,146 @@
+# -----------------------------------------------------------------------------
+# Worker de la cola de trabajos (core/job_queue.py).
+#
+# Cada worker mantiene UN Pipeline por escena durante toda su vida (los
+# modelos se cargan una sola vez) y, por cada trabajo arrendado:
+#   1) Pipeline.reset(<output_root>/job_<id>) -> estado limpio y salida propia
+#   2) analiza el video mientras un hilo renueva el lease (heartbeat); si el
+#      lease se pierde (otro worker lo tomó) se cancela el análisis
+#   3) complete() con el resumen, o fail() -> reintento tras `retry_delay`
+# Varios workers (procesos o máquinas) pueden compartir la misma base SQLite.
+# -----------------------------------------------------------------------------
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from core.job_queue import JobQueue
+from core.utils.telemetry import setup_logging
+
+log = logging.getLogger(__name__)
+
+
+class QueueWorker:
+    def __init__(self, db_path, output_root="data/output/jobs", worker_id=None, lease_seconds=120.0,
+                 heartbeat_seconds=20.0, retry_delay=30.0, poll_seconds=2.0, pipeline_factory=None):
+        """
+        pipeline_factory(scene) -> Pipeline; por defecto core.pipeline.Pipeline
+        (import diferido: el proceso sólo carga modelos al tomar su primer trabajo).
+        """
+        self.db_path = db_path
+        self.queue = JobQueue(db_path)
+        self.output_root = output_root
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = float(lease_seconds)
+        self.heartbeat_seconds = float(heartbeat_seconds)
+        self.retry_delay = float(retry_delay)
+        self.poll_seconds = float(poll_seconds)
+        self.pipeline_factory = pipeline_factory
+        self._pipelines = {}   # escena -> Pipeline (modelos cargados una vez)
+        self.stop_event = threading.Event()
+        self.jobs_done = 0
+
+    @classmethod
+    def from_config(cls, qcfg, **kwargs):
+        """Worker según la sección `queue:` del YAML (kwargs tienen prioridad)."""
+        qcfg = qcfg or {}
+        opts = {
+            "output_root": qcfg.get("output_dir", "data/output/jobs"),
+            "lease_seconds": qcfg.get("lease_seconds", 120.0),
+            "heartbeat_seconds": qcfg.get("heartbeat_seconds", 20.0),
+            "retry_delay": qcfg.get("retry_delay_seconds", 30.0),
+            "poll_seconds": qcfg.get("poll_seconds", 2.0),
+        }
+        opts.update({k: v for k, v in kwargs.items() if v is not None})
+        return cls(qcfg.get("db", "data/queue/jobs.db"), **opts)
+
+    def _pipeline(self, scene):
+        pipe = self._pipelines.get(scene)
+        if pipe is None:
+            if self.pipeline_factory is not None:
+                pipe = self.pipeline_factory(scene)
+            else:
+                from core.pipeline import Pipeline
+                pipe = Pipeline(scene)
+            self._pipelines[scene] = pipe
+        return pipe
+
+    def _heartbeat(self, job_id, lost, done):
+        # Conexión propia: los objetos sqlite3 no se comparten entre hilos
+        queue = JobQueue(self.db_path)
+        try:
+            while not done.wait(self.heartbeat_seconds):
+                if not queue.heartbeat(job_id, self.worker_id, self.lease_seconds):
+                    log.warning(f"Worker {self.worker_id}: lease del trabajo {job_id} perdido; se cancela")
+                    lost.set()
+                    return
+        finally:
+            queue.close()
+
+    def run_job(self, job):
+        """Procesa un trabajo arrendado y lo marca como terminado o fallido."""
+        out_dir = job["output_dir"] or os.path.join(self.output_root, f"job_{job['id']:06d}")
+        os.makedirs(out_dir, exist_ok=True)
+        lost, done = threading.Event(), threading.Event()
+        hb = threading.Thread(target=self._heartbeat, args=(job["id"], lost, done), daemon=True)
+        hb.start()
+        t0 = time.perf_counter()
+        try:
+            pipe = self._pipeline(job["scene"])
+            pipe.reset(out_dir)
+            res = pipe.process_video(job["video"], os.path.join(out_dir, "annotated.mp4"),
+                                     clean_previous=True, cancel_event=lost)
+            if lost.is_set():
+                return   # otro worker tiene el trabajo: no se toca su estado
+            df = res.get("events_df")
+            self.queue.complete(job["id"], self.worker_id, {
+                "out_path": res.get("out_path_final"),
+                "events": 0 if df is None else len(df),
+                "frames": res.get("frames"),
+                "processing_seconds": round(time.perf_counter() - t0, 3),
+                "processing_fps": res.get("processing_fps"),
+            })
+            self.jobs_done += 1
+            log.info(f"Worker {self.worker_id}: trabajo {job['id']} terminado en {time.perf_counter() - t0:.1f}s")
+        except Exception as e:
+            log.warning(f"Worker {self.worker_id}: trabajo {job['id']} falló (intento {job['attempts']}): {e}")
+            self.queue.fail(job["id"], self.worker_id, f"{type(e).__name__}: {e}", retry_delay=self.retry_delay)
+        finally:
+            done.set()
+            hb.join()
+
+    def run(self, max_jobs=None, exit_when_empty=False):
+        """
+        Bucle principal: arrienda y procesa trabajos hasta stop_event (o
+        max_jobs). Con exit_when_empty sale cuando no queda nada en cola ni
+        arrendado; los reintentos pendientes (available_at futuro) y los
+        leases de otros workers (que pueden vencer) se esperan.
+        """
+        log.info(f"Worker {self.worker_id}: escuchando {self.db_path}")
+        try:
+            while not self.stop_event.is_set():
+                if max_jobs is not None and self.jobs_done >= max_jobs:
+                    break
+                job = self.queue.lease(self.worker_id, self.lease_seconds)
+                if job is None:
+                    next_at = self.queue.next_available_at()
+                    if exit_when_empty and next_at is None:
+                        break
+                    # Hasta el próximo trabajo disponible, sin pasar de poll_seconds
+                    # (pueden llegar trabajos nuevos en cualquier momento)
+                    wait = self.poll_seconds if next_at is None else min(self.poll_seconds, next_at - time.time())
+                    self.stop_event.wait(max(0.01, wait))
+                    continue
+                self.run_job(job)
+        finally:
+            self.queue.close()
+        return self.jobs_done
+
+
+def run_worker_process(db_path, qcfg, worker_id=None, exit_when_empty=False, max_jobs=None):
+    """Punto de entrada de un proceso worker (scripts/job_queue.py worker --processes N)."""
+    setup_logging()   # los procesos spawn no heredan la configuración de logging
+    worker = QueueWorker.from_config({**(qcfg or {}), "db": db_path}, worker_id=worker_id)
+    return worker.run(max_jobs=max_jobs, exit_when_empty=exit_when_empty)
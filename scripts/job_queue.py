@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Cola de trabajos en SQLite para repartir videos entre workers (varias máquinas).
+
+La base (`queue.db` del YAML o --db) puede estar en un disco compartido; cada
+máquina ejecuta uno o más workers apuntando a ella.
+
+Encolar videos:
+  python scripts/job_queue.py enqueue data/samples/*.mp4 --scene app/config/scenes/demo_intersection.yaml
+
+Workers (N procesos en esta máquina; cada uno carga los modelos una vez):
+  python scripts/job_queue.py worker --processes 2
+  python scripts/job_queue.py worker --exit-when-empty     # termina al vaciarse la cola
+
+Estado y reintentos:
+  python scripts/job_queue.py status
+  python scripts/job_queue.py retry-failed
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from core.job_queue import JobQueue
+from core.utils.config import load_config
+from core.worker import run_worker_process
+from core.utils.telemetry import setup_logging
+
+
+def main():
+    setup_logging()
+    p = argparse.ArgumentParser()
+    p.add_argument('command', choices=['enqueue', 'worker', 'status', 'retry-failed'])
+    p.add_argument('videos', nargs='*', help='Videos a encolar (enqueue)')
+    p.add_argument('--scene', default='app/config/scenes/demo_intersection.yaml')
+    p.add_argument('--db', default=None, help='Base SQLite de la cola (por defecto queue.db del YAML)')
+    p.add_argument('--max-attempts', type=int, default=None, help='Intentos por trabajo (enqueue)')
+    p.add_argument('--processes', type=int, default=1, help='Procesos worker en esta máquina')
+    p.add_argument('--exit-when-empty', action='store_true', help='Los workers terminan al vaciarse la cola')
+    p.add_argument('--limit', type=int, default=20, help='Trabajos a listar (status)')
+    args = p.parse_args()
+
+    qcfg = load_config(args.scene).get("queue") or {}
+    db = args.db or qcfg.get("db", "data/queue/jobs.db")
+
+    if args.command == 'enqueue':
+        if not args.videos:
+            p.error('enqueue requiere al menos un video')
+        queue = JobQueue(db)
+        attempts = args.max_attempts or qcfg.get("max_attempts", 3)
+        ids = [queue.enqueue(v, args.scene, max_attempts=attempts) for v in args.videos]
+        print(f"Encolados {len(ids)} trabajos ({ids[0]}..{ids[-1]}) en {db}")
+    elif args.command == 'worker':
+        t0 = time.perf_counter()
+        if args.processes <= 1:
+            n = run_worker_process(db, qcfg, exit_when_empty=args.exit_when_empty)
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(args.processes) as pool:
+                n = sum(pool.starmap(run_worker_process,
+                                     [(db, qcfg, None, args.exit_when_empty)] * args.processes))
+        print(f"{n} trabajos procesados en {time.perf_counter() - t0:.1f}s")
+    elif args.command == 'status':
+        queue = JobQueue(db)
+        print('Estado:', queue.counts())
+        for j in queue.jobs(limit=args.limit):
+            extra = j['error'] if j['status'] != 'done' and j['error'] else (j['result'] or '')
+            print(f"{j['id']:>6}  {j['status']:<7} intentos={j['attempts']}/{j['max_attempts']}  "
+                  f"{j['worker'] or '-':<20} {os.path.basename(j['video'])}  {extra}")
+    else:
+        print('Reencolados:', JobQueue(db).retry_failed())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""Consultas sobre la exportación de tracks (`tracks_export.enabled: true`).
+
+  python scripts/query_tracks.py counts --tracks data/output/tracks
+  python scripts/query_tracks.py flows  --tracks data/output/tracks --scene app/config/scenes/demo_intersection.yaml
+  python scripts/query_tracks.py speeds --tracks data/output/tracks
+"""
+
+import argparse
+
+from core.track_analytics import counts_per_minute, line_flows, scene_lines, speed_histogram
+from core.utils.config import load_config
+from core.utils.telemetry import setup_logging
+
+
+def main():
+    setup_logging()
+    p = argparse.ArgumentParser()
+    p.add_argument('query', choices=['counts', 'flows', 'speeds'])
+    p.add_argument('--tracks', default='data/output/tracks', help='Directorio de chunks de tracks')
+    p.add_argument('--scene', default='app/config/scenes/demo_intersection.yaml', help='Líneas para flows')
+    p.add_argument('--bucket', type=float, default=60.0, help='Segundos por intervalo (counts)')
+    p.add_argument('--csv', default=None, help='Guardar el resultado en CSV')
+    args = p.parse_args()
+
+    if args.query == 'counts':
+        df = counts_per_minute(args.tracks, bucket_seconds=args.bucket)
+    elif args.query == 'flows':
+        df = line_flows(args.tracks, scene_lines(load_config(args.scene)))
+    else:
+        df = speed_histogram(args.tracks)
+    print(df.to_string(index=False))
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Replay de reglas sobre una grabación de detecciones/tracks (sin modelos).
+
+Grabar una vez (inferencia completa):
+  python scripts/run_pipeline.py --input video.mp4 --output out.mp4 --record data/output/rec.bin
+
+Replay con otra config de escena:
+  python scripts/replay_rules.py replay --recording data/output/rec.bin \
+      --scene app/config/scenes/demo_intersection.yaml --output-dir data/output/replay
+
+Barrido de parámetros en paralelo (YAML con claves con puntos y listas de valores):
+  # grid.yaml
+  #   helmet.helmet_iou_thresh: [0.05, 0.08, 0.12]
+  #   lane.persistence_frames: [3, 5, 8]
+  python scripts/replay_rules.py sweep --recording data/output/rec.bin \
+      --scene app/config/scenes/demo_intersection.yaml --grid grid.yaml --output-dir data/output/sweep
+"""
+
+import argparse
+import os
+
+import yaml
+
+from core.replay import replay_recording, sweep_recording
+from core.utils.config import load_config
+from core.utils.telemetry import setup_logging
+
+
+def main():
+    setup_logging()
+    p = argparse.ArgumentParser()
+    p.add_argument('mode', choices=['replay', 'sweep'])
+    p.add_argument('--recording', required=True, help='Archivo grabado con --record')
+    p.add_argument('--scene', default='app/config/scenes/demo_intersection.yaml')
+    p.add_argument('--output-dir', default=None, help='Por defecto <output_dir de la escena>/replay o /sweep')
+    p.add_argument('--grid', default=None, help='YAML {clave.con.puntos: [valores]} (modo sweep)')
+    p.add_argument('--workers', type=int, default=None, help='Procesos en paralelo (modo sweep)')
+    args = p.parse_args()
+
+    cfg = load_config(args.scene)
+    output_dir = args.output_dir or os.path.join(cfg["video"]["output_dir"], args.mode)
+    if args.mode == 'replay':
+        res = replay_recording(args.recording, cfg, output_dir)
+        print(f"OK. {res['frames']} frames en {res['processing_seconds']:.2f}s -> "
+              f"{len(res['events_df'])} eventos ({os.path.join(output_dir, 'events.csv')})")
+    else:
+        if not args.grid:
+            p.error('--grid es obligatorio en modo sweep')
+        with open(args.grid, 'r') as f:
+            grid = yaml.safe_load(f)
+        df = sweep_recording(args.recording, args.scene, grid, output_dir, workers=args.workers)
+        print(df.to_string(index=False))
+        print('Comparación:', os.path.join(output_dir, 'sweep.csv'))
+
+
+if __name__ == '__main__':
+    main()
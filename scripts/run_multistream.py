@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""Varias cámaras en un solo proceso con un detector YOLO compartido.
+
+Uso:
+  python scripts/run_multistream.py \
+      --stream norte app/config/scenes/demo_intersection.yaml data/samples/norte.mp4 \
+      --stream sur   app/config/scenes/demo_intersection.yaml rtsp://camara-sur/stream
+
+Cada stream escribe su CSV, evidencias y video anotado en
+data/output/streams/<nombre>/.
+"""
+
+import argparse
+from core.multistream import MultiStreamRunner
+from core.utils.telemetry import setup_logging
+
+
+def main():
+    setup_logging()
+    p = argparse.ArgumentParser()
+    p.add_argument('--stream', nargs=3, action='append', required=True,
+                   metavar=('NOMBRE', 'ESCENA', 'FUENTE'), help='Nombre, YAML de escena y video/URL del stream')
+    p.add_argument('--output-dir', default='data/output/streams')
+    args = p.parse_args()
+
+    streams = [{"name": n, "scene": sc, "source": src} for n, sc, src in args.stream]
+    runner = MultiStreamRunner(streams, output_dir=args.output_dir)
+    res = runner.run()
+    print(f"OK. {res.get('processing_fps', 0.0):.1f} FPS agregados")
+    for name, info in res.get('streams', {}).items():
+        print(f"  {name}: {info['frames']} frames -> {info['out_path_final']} ({info['events_csv']})")
+
+
+if __name__ == '__main__':
+    main()
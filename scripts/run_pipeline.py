@@ -6,23 +6,84 @@ Uso:
       --scene app/config/scenes/demo_intersection.yaml \
       --output data/output/annotated_videos/resultado.mp4
 
+Ventana de tiempo y paralelismo (un video largo repartido en procesos):
+  python scripts/run_pipeline.py --input largo.mp4 --output out.mp4 \
+      --start 3600 --end 7200 --workers 4 --overlap 5
+
+Etapas en procesos separados (detector / reglas / escritor) con frames en
+memoria compartida:
+  python scripts/run_pipeline.py --input video.mp4 --output out.mp4 --multiprocess
+
+Videos con poca actividad: primera pasada barata para encontrar intervalos con
+vehículos en la geometría de la escena y análisis completo sólo en ellos:
+  python scripts/run_pipeline.py --input archivo.mp4 --output out.mp4 --triage
+
+Con --record se graban detecciones y tracks para ajustar reglas sin volver a
+ejecutar los modelos (ver scripts/replay_rules.py).
+
+Con --resume continúa desde data/output/checkpoint.pkl si la ejecución
+anterior sobre el mismo video se interrumpió.
+
 Env vars opcionales (para el modelo de casco):
   HELMET_MODEL_URL, HELMET_MODEL_PATH
 """
 
 import argparse
 from core.pipeline import Pipeline
+from core.parallel import process_video_parallel
+from core.mp_pipeline import process_video_multiprocess
+from core.triage import process_video_triage
+from core.utils.telemetry import setup_logging
 
 
 def main():
+    setup_logging()
     p = argparse.ArgumentParser()
     p.add_argument('--input', required=True, help='Ruta del video de entrada')
     p.add_argument('--output', required=True, help='Ruta del video de salida deseada (.mp4 recomendado)')
     p.add_argument('--scene', default='app/config/scenes/demo_intersection.yaml')
+    p.add_argument('--resume', action='store_true', help='Reanudar desde el último checkpoint del mismo video')
+    p.add_argument('--start', type=float, default=None, help='Segundo inicial de la ventana a procesar')
+    p.add_argument('--end', type=float, default=None, help='Segundo final de la ventana a procesar')
+    p.add_argument('--workers', type=int, default=1, help='Procesos en paralelo (segmentos de tiempo)')
+    p.add_argument('--overlap', type=float, default=5.0, help='Solape entre segmentos en segundos')
+    p.add_argument('--multiprocess', action='store_true',
+                   help='Detector, reglas y escritura en procesos separados (frames en memoria compartida)')
+    p.add_argument('--slots', type=int, default=8, help='Slots del anillo de frames compartido (--multiprocess)')
+    p.add_argument('--record', default=None,
+                   help='Grabar detecciones/tracks por frame en este archivo (replay de reglas)')
+    p.add_argument('--triage', action='store_true',
+                   help='Dos pasadas: detector barato para hallar actividad y análisis sólo en esos intervalos')
     args = p.parse_args()
 
-    pipe = Pipeline(args.scene)
-    res = pipe.process_video(args.input, args.output, clean_previous=True)
+    # Opciones que sólo entiende el pipeline de un proceso (--start/--end
+    # también el modo por segmentos): se rechazan en vez de ignorarlas
+    window = [f for f, v in (('--start', args.start), ('--end', args.end)) if v is not None]
+    single = [f for f, v in (('--resume', args.resume), ('--record', args.record)) if v]
+    modes = [(flag, unsupported) for flag, on, unsupported in (
+        ('--triage', args.triage, single + window),
+        ('--multiprocess', args.multiprocess, single + window),
+        ('--workers > 1', args.workers > 1, single)) if on]
+    if len(modes) > 1:
+        p.error(f"{' y '.join(flag for flag, _ in modes)} son excluyentes")
+    if modes and modes[0][1]:
+        p.error(f"{', '.join(modes[0][1])} no se admite con {modes[0][0]}")
+
+    if args.triage:
+        res = process_video_triage(args.scene, args.input, args.output)
+        print(f"Omitido: {res['skipped_fraction']:.1%} del video ({len(res['intervals'])} intervalos)")
+    elif args.multiprocess:
+        res = process_video_multiprocess(args.scene, args.input, args.output, slots=args.slots)
+    elif args.workers > 1:
+        try:
+            res = process_video_parallel(args.scene, args.input, args.output, workers=args.workers,
+                                         overlap_s=args.overlap, start_s=args.start or 0.0, end_s=args.end)
+        except ValueError as e:   # ventana vacía o duración desconocida sin --end
+            p.error(str(e))
+    else:
+        pipe = Pipeline(args.scene)
+        res = pipe.process_video(args.input, args.output, clean_previous=True, resume=args.resume,
+                                 start_s=args.start, end_s=args.end, record_path=args.record)
     df = res.get('events_df')
     print('OK. Salida:', res.get('out_path_final'))
     print('Eventos detectados:', 0 if df is None else len(df))